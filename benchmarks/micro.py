@@ -0,0 +1,266 @@
+"""
+micro.py
+
+Per-component microbenchmarks (offline, seeded inputs).
+Covers:
+- LogParser.parse_line on every EMS template in src/patterns.py
+- every StorageParser / NetworkParser handler
+- CorrelationEngine._handle_event with 100 .. 1M events in the window
+- FeatureEngineer.aggregate_window on 10k .. 10M rows (needs pandas)
+- OntapLogGenerator.generate_log
+- codecs for cross-process transport (core/codec.py), against pickle
+
+Each benchmark is calibrated to a minimum run time, repeated with GC disabled, and
+reported as median ns/op with its spread (MAD %), plus tracemalloc figures:
+peak transient bytes per op and bytes retained per op.
+
+Run with: python -m benchmarks.micro --filter parse --json micro.json
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import logging
+import pickle
+import random
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from src.log_generator import OntapLogGenerator
+from src.parser import LogParser
+from src.patterns import TEMPLATES
+
+SEED = 42
+FIXED_TS = datetime.datetime(2026, 1, 22, 12, 0, 0)
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], object]] # Returns the operation to time
+    ops_per_call: int = 1 # For per-row style reporting (e.g. aggregate_window)
+
+
+# --- Inputs ---
+def sample_lines() -> Dict[str, str]:
+    """One deterministic line per template."""
+    random.seed(SEED)
+    gen = OntapLogGenerator()
+    return {pid: gen.generate_log(pid, timestamp=FIXED_TS) for pid in TEMPLATES}
+
+def make_unified(event_name="callhome.snmp.trap.sent", node="ontap-cluster-01-01", ts=FIXED_TS):
+    from ontap_intelligence.parsers.base import UnifiedEvent
+    return UnifiedEvent(
+        timestamp=ts, timestamp_str=ts.strftime("%b %d %H:%M:%S"), node=node,
+        subsystem='system', event_name=event_name, severity='INFO', impact_level=0,
+        raw_message="", parsed_fields={}, asset_id=None
+    )
+
+
+# --- Benchmark definitions ---
+def parser_benchmarks() -> List[Benchmark]:
+    parser = LogParser()
+    benches = []
+    for pid, line in sample_lines().items():
+        benches.append(Benchmark(
+            f"parse_line[{pid}:{TEMPLATES[pid]['event']}]",
+            lambda line=line: (lambda: parser.parse_line(line))
+        ))
+    return benches
+
+def domain_parser_benchmarks() -> List[Benchmark]:
+    from ontap_intelligence.parsers.storage import StorageParser
+    from ontap_intelligence.parsers.network import NetworkParser
+
+    raw_parser = LogParser()
+    by_event = {raw['event']: raw for raw in map(raw_parser.parse_line, sample_lines().values())}
+    benches = []
+    for dp in (StorageParser(), NetworkParser()):
+        for event_name, handler in dp.patterns.items():
+            raw = by_event[event_name]
+            benches.append(Benchmark(
+                f"{type(dp).__name__}.{handler.__name__}",
+                lambda handler=handler, raw=raw: (lambda: handler(raw))
+            ))
+    return benches
+
+def correlation_benchmarks(sizes: List[int]) -> List[Benchmark]:
+    from ontap_intelligence.intelligence.correlation import CorrelationEngine
+
+    def setup(size, event_name):
+        def _setup():
+            engine = CorrelationEngine(window_seconds=3600)
+            nodes = [f"ontap-cluster-01-0{i}" for i in range(1, 5)]
+            engine.buffers = {"ontap-cluster-01": [make_unified(node=nodes[i % 4], ts=FIXED_TS) for i in range(size)]}
+            event = make_unified(event_name, node=nodes[0])
+            def op():
+                engine._handle_event("event.unified", event)
+                engine.buffers["ontap-cluster-01"].pop() # Keep the window at `size` across loops
+            return op
+        return _setup
+
+    benches = []
+    for size in sizes:
+        benches.append(Benchmark(f"CorrelationEngine._handle_event[noise,window={size}]", setup(size, "callhome.snmp.trap.sent")))
+        benches.append(Benchmark(f"CorrelationEngine._handle_event[raid,window={size}]", setup(size, "raid.aggr.degraded")))
+    return benches
+
+def feature_benchmarks(rows: List[int]) -> List[Benchmark]:
+    def setup(n):
+        def _setup():
+            from src.feature_engine import FeatureEngineer
+            parser = LogParser()
+            parsed = [parser.parse_line(l) for l in sample_lines().values()]
+            engine = FeatureEngineer()
+            # Spread rows over time so resampling produces many windows
+            for i in range(n):
+                row = dict(parsed[i % len(parsed)])
+                row['timestamp'] = FIXED_TS + datetime.timedelta(milliseconds=100 * i)
+                engine.buffer.append(row)
+            return lambda: engine.aggregate_window(freq="1min")
+        return _setup
+    return [Benchmark(f"FeatureEngineer.aggregate_window[rows={n}]", setup(n), ops_per_call=n) for n in rows]
+
+def generator_benchmarks() -> List[Benchmark]:
+    def _random():
+        random.seed(SEED)
+        gen = OntapLogGenerator()
+        return lambda: gen.generate_log(timestamp=FIXED_TS)
+    def _fixed():
+        random.seed(SEED)
+        gen = OntapLogGenerator()
+        return lambda: gen.generate_log("W01", timestamp=FIXED_TS)
+    return [Benchmark("OntapLogGenerator.generate_log[random]", _random),
+            Benchmark("OntapLogGenerator.generate_log[W01]", _fixed)]
+
+
+def codec_benchmarks() -> List[Benchmark]:
+    from ontap_intelligence.core.codec import decode_event, decode_lines, encode_event, encode_lines
+
+    # Distinct lines: pickle memoizes repeated strings, which real batches don't have
+    lines = [f"{line} #{i}" for i, line in enumerate(list(sample_lines().values()) * 8)]
+    ts = [float(i) for i in range(len(lines))]
+    event = make_unified("qos.latency.high")
+    event.parsed_fields = {'latency': 45, 'workload': "policy_group_1"}
+    event.ingest_ts = 1.0
+
+    def fixed(op):
+        return lambda: op
+    lines_blob, lines_pickle = encode_lines(lines, ts), pickle.dumps((lines, ts))
+    event_blob, event_pickle = encode_event(event), pickle.dumps(event)
+    n = len(lines)
+    return [
+        Benchmark(f"codec.encode_lines[{n}]", fixed(lambda: encode_lines(lines, ts)), ops_per_call=n),
+        Benchmark(f"codec.decode_lines[{n}]", fixed(lambda: decode_lines(lines_blob)), ops_per_call=n),
+        Benchmark(f"pickle.dumps[lines,{n}]", fixed(lambda: pickle.dumps((lines, ts))), ops_per_call=n),
+        Benchmark(f"pickle.loads[lines,{n}]", fixed(lambda: pickle.loads(lines_pickle)), ops_per_call=n),
+        Benchmark("codec.encode_event", fixed(lambda: encode_event(event))),
+        Benchmark("codec.decode_event", fixed(lambda: decode_event(event_blob))),
+        Benchmark("pickle.dumps[event]", fixed(lambda: pickle.dumps(event))),
+        Benchmark("pickle.loads[event]", fixed(lambda: pickle.loads(event_pickle))),
+    ]
+
+
+# --- Runner ---
+def _time_calls(op, n: int) -> float:
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            op()
+        return time.perf_counter_ns() - t0
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+def measure(bench: Benchmark, min_time: float = 0.2, repeat: int = 7) -> Dict:
+    op = bench.setup()
+    op() # Warm-up (caches, lazy imports)
+
+    # 1. Calibrate loop count so one sample takes >= min_time
+    n = 1
+    while True:
+        elapsed = _time_calls(op, n)
+        if elapsed >= min_time * 1e9 or n >= 10_000_000:
+            break
+        n = max(n * 2, int(n * min_time * 1e9 / max(elapsed, 1) * 1.2))
+
+    # 2. Samples
+    samples = [_time_calls(op, n) / n for _ in range(repeat)]
+    median = statistics.median(samples)
+    mad = statistics.median(abs(s - median) for s in samples)
+
+    # 3. Memory: transient peak of one call, and net growth over several calls
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    op()
+    _, peak = tracemalloc.get_traced_memory()
+    mem_calls = min(n, 1000)
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(mem_calls):
+        op()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per = bench.ops_per_call
+    return {
+        'name': bench.name,
+        'loops': n,
+        'repeat': repeat,
+        'ns_per_call': median,
+        'ns_per_op': median / per,
+        'mad_pct': 100.0 * mad / median if median else 0.0,
+        'min_ns_per_call': min(samples),
+        'alloc_peak_bytes_per_call': peak - base,
+        'retained_bytes_per_call': (after - before) / mem_calls,
+    }
+
+
+def collect(args) -> List[Benchmark]:
+    benches = parser_benchmarks() + domain_parser_benchmarks()
+    benches += correlation_benchmarks(args.window_sizes)
+    if not args.no_pandas:
+        benches += feature_benchmarks(args.feature_rows)
+    benches += generator_benchmarks()
+    benches += codec_benchmarks()
+    if args.filter:
+        benches = [b for b in benches if any(f.lower() in b.name.lower() for f in args.filter)]
+    return benches
+
+def main():
+    ap = argparse.ArgumentParser(description="Component microbenchmarks.")
+    ap.add_argument("--filter", nargs="+", help="Run only benchmarks whose name contains any of these")
+    ap.add_argument("--window-sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000, 1000000])
+    ap.add_argument("--feature-rows", type=int, nargs="+", default=[10000, 100000, 1000000],
+                    help="Add 10000000 for the full range (several GB of RAM)")
+    ap.add_argument("--no-pandas", action="store_true", help="Skip FeatureEngineer benchmarks")
+    ap.add_argument("--min-time", type=float, default=0.2, help="Seconds per sample")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--json", help="Write results to this path")
+    args = ap.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    print(f"{'benchmark':<62} {'ns/op':>14} {'±MAD':>7} {'peak B/call':>12} {'kept B/call':>12}")
+    for bench in collect(args):
+        r = measure(bench, min_time=args.min_time, repeat=args.repeat)
+        results.append(r)
+        print(f"{r['name']:<62} {r['ns_per_op']:>14,.0f} {r['mad_pct']:>6.1f}% "
+              f"{r['alloc_peak_bytes_per_call']:>12,} {r['retained_bytes_per_call']:>12,.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'results': results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+pipeline.py
+
+End-to-end throughput / latency benchmark.
+Drives LogIngestor (replay) -> ParserService -> CorrelationEngine -> MLService over
+fixed, seeded corpora of several sizes and event mixes, and records per case:
+- sustained lines/s
+- per-stage CPU time (exclusive, from EventBus handler timing)
+- p50/p99 end-to-end latency per line (ingest publish -> last subscriber returns)
+- peak RSS
+Each case runs in a fresh subprocess so peak RSS and bus subscriptions don't leak
+between cases. Results are JSON, tagged with the git commit, for comparing releases.
+
+Run with:   python -m benchmarks.pipeline --sizes 10000 100000 --mixes default failure_storm
+Compare:    python -m benchmarks.pipeline --compare bench_results/old.json bench_results/new.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.detection import percentile
+
+CORPUS_DIR = "bench_corpora"
+RESULTS_DIR = "bench_results"
+CORPUS_SEED = 1234
+CORPUS_RATE = 100.0 # Simulated lines/s (affects window density, not benchmark speed)
+
+# Event mixes (class weights for N/W/F patterns)
+MIXES = {
+    "default": {"N": 0.90, "W": 0.09, "F": 0.01},
+    "warning_heavy": {"N": 0.60, "W": 0.35, "F": 0.05},
+    "failure_storm": {"N": 0.50, "W": 0.30, "F": 0.20},
+}
+
+# Handler -> pipeline stage
+STAGES = {
+    "ParserService._handle_raw_log": "parse",
+    "CorrelationEngine._handle_event": "correlate",
+    "MLService._handle_event": "ml",
+}
+
+
+def corpus_path(mix: str, size: int) -> str:
+    """Builds (once) and returns the path of a seeded corpus."""
+    path = os.path.join(CORPUS_DIR, f"{mix}_{size}_s{CORPUS_SEED}.log")
+    if os.path.exists(path):
+        return path
+
+    from src.history_generator import HistoryGenerator
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    gen = HistoryGenerator(seed=CORPUS_SEED, rate=CORPUS_RATE, mix=MIXES[mix])
+    # Generous duration (the diurnal curve can halve the rate); truncate to `size` lines
+    duration = datetime.timedelta(seconds=3 * size / CORPUS_RATE + 60)
+    lines = itertools.islice(gen.iter_lines(duration, scenarios_per_hour=2), size)
+    tmp = path + ".tmp"
+    with open(tmp, "w", buffering=1 << 20) as f:
+        for line in lines:
+            f.write(line + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def run_case(path: str, use_ml: bool = True, model_path: str = "models/iso_forest.pkl") -> Dict:
+    """Runs one corpus through the pipeline in this process."""
+    from ontap_intelligence.core.bus import bus
+    from ontap_intelligence.core.ingestion import LogIngestor
+    from ontap_intelligence.parsers.service import parser_service
+    from ontap_intelligence.intelligence.correlation import CorrelationEngine
+
+    # Latency probes: subscribed before the pipeline, so _mark_start is the first handler
+    # on 'log.raw' and stamps the line; global subscribers run after all topic handlers
+    # (and everything they published) have returned.
+    latencies: List[float] = []
+    started = [0.0]
+
+    def _mark_start(topic, payload):
+        started[0] = time.perf_counter()
+
+    def _mark_end(topic, payload):
+        if topic == "log.raw":
+            latencies.append(time.perf_counter() - started[0])
+
+    bus.subscribe("log.raw", _mark_start)
+    bus.subscribe_all(_mark_end)
+    bus.enable_timing()
+
+    parser_service.start()
+    CorrelationEngine().start()
+    if use_ml:
+        from ontap_intelligence.intelligence.ml_models import MLService
+        MLService(model_path=model_path, clock="event").start()
+
+    config = {'ingestion': {'source_file': path, 'mode': 'replay', 'poll_interval': 0.5}}
+    ingestor = LogIngestor(config)
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    ingestor.start()
+    ingestor.join()
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+
+    stages: Dict[str, float] = {}
+    handlers = {}
+    handler_cpu = 0.0
+    for key, st in bus.handler_stats.items():
+        name = key.split(":", 1)[1]
+        handlers[key] = {'calls': st.calls, 'cpu_exclusive_s': st.cpu_exclusive, 'errors': st.errors}
+        handler_cpu += st.cpu_exclusive
+        stage = STAGES.get(name, "probes")
+        stages[stage] = stages.get(stage, 0.0) + st.cpu_exclusive
+    stages["ingest"] = max(0.0, cpu - handler_cpu) # Reading/stripping lines + bus dispatch
+
+    lat_us = [l * 1e6 for l in latencies]
+    return {
+        'lines': len(latencies),
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'lines_per_s': len(latencies) / wall if wall else None,
+        'latency_us': {'p50': percentile(lat_us, 50), 'p99': percentile(lat_us, 99), 'max': max(lat_us, default=None)},
+        'stage_cpu_s': stages,
+        'handlers': handlers,
+        # Linux reports KB, macOS bytes
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_suite(sizes: List[int], mixes: List[str], use_ml: bool, model_path: str) -> Dict:
+    cases = []
+    for mix in mixes:
+        for size in sizes:
+            path = corpus_path(mix, size)
+            cmd = [sys.executable, "-m", "benchmarks.pipeline", "--single", path, "--model", model_path]
+            if not use_ml:
+                cmd.append("--no-ml")
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            result.update({'mix': mix, 'size': size})
+            cases.append(result)
+            print(f"{mix:<14} {size:>9,} lines  {result['lines_per_s']:>10,.0f} lines/s  "
+                  f"p50={result['latency_us']['p50']:.0f}us p99={result['latency_us']['p99']:.0f}us  "
+                  f"rss={result['peak_rss_mb']:.0f}MB  "
+                  + " ".join(f"{k}={v:.2f}s" for k, v in sorted(result['stage_cpu_s'].items())))
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'ml': use_ml,
+        'cases': cases,
+    }
+
+
+def compare(base_path: str, new_path: str):
+    """Prints per-case deltas between two result files."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    base_cases = {(c['mix'], c['size']): c for c in base['cases']}
+    print(f"{base['commit']} -> {new['commit']}")
+    for c in new['cases']:
+        b = base_cases.get((c['mix'], c['size']))
+        if not b:
+            continue
+        rate = (c['lines_per_s'] / b['lines_per_s'] - 1) * 100
+        p99 = (c['latency_us']['p99'] / b['latency_us']['p99'] - 1) * 100
+        print(f"{c['mix']:<14} {c['size']:>9,}  lines/s {rate:+6.1f}%  p99 {p99:+6.1f}%")
+        for stage, cpu in sorted(c['stage_cpu_s'].items()):
+            old = b['stage_cpu_s'].get(stage)
+            if old:
+                print(f"    {stage:<10} cpu {(cpu / old - 1) * 100:+6.1f}%")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="End-to-end pipeline benchmark.")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    ap.add_argument("--mixes", nargs="+", default=["default", "failure_storm"], choices=list(MIXES))
+    ap.add_argument("--no-ml", action="store_true", help="Skip MLService (no pandas/sklearn needed)")
+    ap.add_argument("--model", default="models/iso_forest.pkl")
+    ap.add_argument("--out", help="Results path (default: bench_results/pipeline-<commit>-<time>.json)")
+    ap.add_argument("--single", help=argparse.SUPPRESS) # Internal: run one corpus, print JSON
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    args = ap.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.single:
+        print(json.dumps(run_case(args.single, use_ml=not args.no_ml, model_path=args.model)))
+        return
+
+    results = run_suite(args.sizes, args.mixes, use_ml=not args.no_ml, model_path=args.model)
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"pipeline-{results['commit']}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+
+if __name__ == "__main__":
+    main()
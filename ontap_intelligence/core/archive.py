@@ -0,0 +1,373 @@
+"""
+archive.py
+
+Compressed columnar archive of UnifiedEvents (Parquet, requires pyarrow).
+- Layout: <dir>/date=YYYY-MM-DD/cluster=<cluster>/<prefix>-<seq>.parquet (hive partitions).
+- Columns are dictionary-encoded in the file (node, event_name and the other
+  categoricals shrink to a few bits per row), zstd-compressed, with per row group
+  statistics; parsed_fields is JSON text. Categoricals are plain Arrow strings:
+  pyarrow only prunes row groups by the statistics of non-dictionary fields
+  (to_pandas(strings_to_categorical=True) restores categoricals).
+- Events are buffered per (day, cluster) and written once the event clock is
+  late_sec past the day or buffer_sec past the buffer's start (or
+  file_rows events are buffered, or on close). Each file is sorted by
+  (event_name, node, timestamp), so a row group's statistics cover few event
+  names and nodes and a narrow time span.
+- Checkpoints (core/checkpoint.py) write every buffer. Restoring a checkpoint
+  drops the files this writer wrote after it: the pipeline reads their events again.
+Readers push time/cluster/node/event filters down: date and cluster prune whole
+directories, row group statistics skip row groups, and only the requested
+columns are decoded. Analyses read the archive instead of re-parsing raw logs,
+e.g. read_table("archive", columns=["timestamp", "node", "event_name"],
+start=..., event_names=["disk.outOfService"]).to_pandas().
+
+Archive a journal with: python -m ontap_intelligence.core.archive import archive --journal journal
+Read with: python -m ontap_intelligence.core.archive read archive --from-time 2026-01-22T12:00:00 --event disk.outOfService
+Backtest with: python -m ontap_intelligence.core.archive replay archive --from-time 2026-01-22T12:00:00 --correlate 300 --ml models/iso_forest.pkl
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ontap_intelligence.core.clusters import cluster_of
+from ontap_intelligence.parsers.base import UnifiedEvent
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("us")),
+    ("timestamp_str", pa.string()),
+    ("node", pa.string()),
+    ("subsystem", pa.string()),
+    ("event_name", pa.string()),
+    ("severity", pa.string()),
+    ("impact_level", pa.int8()),
+    ("asset_id", pa.string()),
+    ("raw_message", pa.string()),
+    ("parsed_fields", pa.string()),
+])
+_SORT = [("event_name", "ascending"), ("node", "ascending"), ("timestamp", "ascending")]
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("cluster", pa.string())]), flavor="hive")
+_SEQ = re.compile(r"-(\d+)\.parquet$")
+
+
+def _seq_of(path: str) -> int:
+    return int(_SEQ.search(path).group(1))
+
+
+class _Partition:
+    """Buffered events of one (day, cluster), column by column."""
+
+    def __init__(self, closes: datetime.datetime):
+        self.closes = closes # Event time at which the buffer is written
+        self.columns: Dict[str, list] = {name: [] for name in SCHEMA.names}
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def add(self, event: UnifiedEvent):
+        c = self.columns
+        c['timestamp'].append(event.timestamp)
+        c['timestamp_str'].append(event.timestamp_str)
+        c['node'].append(event.node)
+        c['subsystem'].append(event.subsystem)
+        c['event_name'].append(event.event_name)
+        c['severity'].append(event.severity)
+        c['impact_level'].append(event.impact_level)
+        c['asset_id'].append(event.asset_id)
+        c['raw_message'].append(event.raw_message)
+        c['parsed_fields'].append(json.dumps(event.parsed_fields, default=str) if event.parsed_fields else None)
+
+    def table(self) -> pa.Table:
+        table = pa.table(self.columns, schema=SCHEMA)
+        return table.take(pc.sort_indices(table, sort_keys=_SORT))
+
+
+class EventArchive:
+    def __init__(self, directory: str = "archive", row_group_rows: int = 50_000, file_rows: int = 1_000_000,
+                 late_sec: float = 300, buffer_sec: float = 3600, compression: str = "zstd", prefix: str = "part"):
+        """
+        :param buffer_sec: Longest span of event time a buffer holds before it is written
+                           (fewer, larger files the longer; a crash without checkpoints loses it).
+        :param prefix: File name prefix, unique per writer (sharded runs write shard-<n>-<seq>.parquet).
+        """
+        self.directory = directory
+        self.row_group_rows = row_group_rows
+        self.file_rows = file_rows
+        self.late = datetime.timedelta(seconds=late_sec)
+        self.buffer = datetime.timedelta(seconds=buffer_sec)
+        self.compression = compression
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._partitions: Dict[tuple, _Partition] = {} # (date, cluster) -> buffer
+        self.clock: Optional[datetime.datetime] = None # Newest event time seen
+        self._close_at: Optional[datetime.datetime] = None # When the oldest buffered day is written
+        self.appended = 0
+        self.files_written = 0
+        self.rows_written = 0
+        os.makedirs(directory, exist_ok=True)
+        existing = glob.glob(os.path.join(directory, "**", f"{prefix}-*.parquet"), recursive=True)
+        self._seq = max((_seq_of(p) for p in existing if _SEQ.search(p)), default=-1) + 1
+
+    @classmethod
+    def from_config(cls, cfg: dict, prefix: str = "part") -> 'EventArchive':
+        """Builds an archive from the settings.yaml 'archive' section."""
+        return cls(cfg.get('dir', "archive"), row_group_rows=cfg.get('row_group_rows', 50_000),
+                   file_rows=cfg.get('file_rows', 1_000_000), late_sec=cfg.get('late_sec', 300),
+                   buffer_sec=cfg.get('buffer_sec', 3600), compression=cfg.get('compression', "zstd"),
+                   prefix=prefix)
+
+    def append(self, event: UnifiedEvent):
+        key = (event.timestamp.date(), event.cluster)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition(self._closes(key, event.timestamp))
+                if self._close_at is None or partition.closes < self._close_at:
+                    self._close_at = partition.closes
+            partition.add(event)
+            self.appended += 1
+            if len(partition) >= self.file_rows:
+                self._write(key)
+
+            if self.clock is None or event.timestamp > self.clock:
+                self.clock = event.timestamp
+                if self._close_at is not None and self.clock >= self._close_at:
+                    self._write_closed()
+
+    def _handle_event(self, topic, event: UnifiedEvent):
+        self.append(event)
+
+    def attach(self, bus, topic: str = "event.unified", stage: Optional[str] = None):
+        """Archives every event published on `topic`."""
+        bus.subscribe(topic, self._handle_event, stage=stage)
+
+    def _closes(self, key: tuple, first: datetime.datetime) -> datetime.datetime:
+        """Event time at which a (day, cluster) buffer whose first event is at `first` is written."""
+        day_closes = datetime.datetime.combine(key[0], datetime.time()) + datetime.timedelta(days=1) + self.late
+        return min(day_closes, max(first, self.clock or first) + self.buffer)
+
+    def _write_closed(self):
+        for key in [k for k, p in self._partitions.items() if p.closes <= self.clock]:
+            self._write(key)
+        self._close_at = min((p.closes for p in self._partitions.values()), default=None)
+
+    def _write(self, key: tuple):
+        day, cluster = key
+        table = self._partitions.pop(key).table()
+        directory = os.path.join(self.directory, f"date={day.isoformat()}", f"cluster={cluster}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"{self.prefix}-{self._seq:06d}.parquet"
+        self._seq += 1
+        tmp = os.path.join(directory, f".{name}.tmp") # Hidden from dataset discovery until renamed
+        pq.write_table(table, tmp, row_group_size=self.row_group_rows, compression=self.compression,
+                       use_dictionary=True, write_statistics=True)
+        os.replace(tmp, os.path.join(directory, name))
+        self.files_written += 1
+        self.rows_written += len(table)
+        logger.debug(f"Archive: wrote {len(table)} events to {directory}/{name}")
+
+    def flush(self):
+        """Writes every buffered partition."""
+        with self._lock:
+            for key in list(self._partitions):
+                self._write(key)
+            self._close_at = None
+
+    def close(self):
+        self.flush()
+
+    # --- Checkpoints ---
+    def checkpoint_state(self) -> Dict:
+        """Writes every buffer: every event before the checkpoint is on disk."""
+        self.flush()
+        with self._lock:
+            return {'seq': self._seq}
+
+    def restore_state(self, saved: Dict):
+        """Drops the files this writer wrote after the checkpoint (their events are read again)."""
+        pattern = os.path.join(self.directory, "**", f"{self.prefix}-*.parquet")
+        for path in glob.glob(pattern, recursive=True):
+            if _SEQ.search(path) and _seq_of(path) >= saved['seq']:
+                os.remove(path)
+                logger.info(f"Archive: dropped {path} (written after the checkpoint)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'appended': self.appended,
+                'buffered': sum(len(p) for p in self._partitions.values()),
+                'files_written': self.files_written,
+                'rows_written': self.rows_written,
+            }
+
+
+# --- Reading ---
+def _any_of(field: str, values: Optional[Iterable[str]]) -> Optional[ds.Expression]:
+    if values is None:
+        return None
+    values = [values] if isinstance(values, str) else list(values)
+    expr = None
+    for value in values: # ORed equalities simplify against row group min/max statistics
+        term = ds.field(field) == value
+        expr = term if expr is None else expr | term
+    return expr if expr is not None else ds.scalar(False)
+
+
+def make_filter(start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                clusters: Optional[Iterable[str]] = None, nodes: Optional[Iterable[str]] = None,
+                event_names: Optional[Iterable[str]] = None, severities: Optional[Iterable[str]] = None
+                ) -> Optional[ds.Expression]:
+    """Dataset filter for start <= timestamp <= end and the given values (None = any)."""
+    if nodes is not None and clusters is None:
+        # A node's events live in its cluster's directories only
+        clusters = {cluster_of(n) for n in ([nodes] if isinstance(nodes, str) else nodes)}
+    terms: List[ds.Expression] = []
+    if start is not None:
+        terms.append(ds.field("date") >= start.date().isoformat())
+        terms.append(ds.field("timestamp") >= pa.scalar(start, pa.timestamp("us")))
+    if end is not None:
+        terms.append(ds.field("date") <= end.date().isoformat())
+        terms.append(ds.field("timestamp") <= pa.scalar(end, pa.timestamp("us")))
+    for field, values in (("cluster", clusters), ("node", nodes), ("event_name", event_names),
+                          ("severity", severities)):
+        term = _any_of(field, values)
+        if term is not None:
+            terms.append(term)
+    expr = None
+    for term in terms:
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def open_dataset(directory: str) -> ds.Dataset:
+    return ds.dataset(directory, format="parquet", partitioning=PARTITIONING)
+
+
+def read_table(directory: str, columns: Optional[List[str]] = None, **filters) -> pa.Table:
+    """
+    Archived events matching the filters (see make_filter), in time order.
+    Only `columns` are read (None = all, plus the 'date' and 'cluster' partition columns);
+    timestamp is read for the ordering even when not requested.
+    """
+    dataset = open_dataset(directory)
+    read = columns if columns is None or "timestamp" in columns else list(columns) + ["timestamp"]
+    table = dataset.to_table(columns=read, filter=make_filter(**filters)).sort_by("timestamp")
+    return table if read is columns else table.select(columns)
+
+
+def iter_events(directory: str, **filters) -> Iterator[UnifiedEvent]:
+    """Archived events as UnifiedEvents, in time order (e.g. to replay into detectors)."""
+    table = read_table(directory, columns=list(SCHEMA.names), **filters)
+    for batch in table.to_batches():
+        for row in batch.to_pylist():
+            fields = row.pop('parsed_fields')
+            yield UnifiedEvent(parsed_fields=json.loads(fields) if fields else {}, **row)
+
+
+def replay_to(bus, directory: str, topic: str = "event.unified", **filters) -> int:
+    """Publishes the archived events matching the filters on `bus`, in time order; returns how many."""
+    n = 0
+    for event in iter_events(directory, **filters):
+        bus.publish(topic, event)
+        n += 1
+    return n
+
+
+def scan_plan(directory: str, **filters) -> Dict:
+    """Files, row groups and rows a read with these filters touches, out of the archive's total."""
+    dataset = open_dataset(directory)
+    expr = make_filter(**filters)
+    plan = {'files': 0, 'row_groups': 0, 'rows': 0, 'total_row_groups': 0, 'total_rows': 0}
+    selected = {f.path for f in dataset.get_fragments(filter=expr)}
+    for fragment in dataset.get_fragments():
+        metadata = fragment.metadata
+        plan['total_row_groups'] += metadata.num_row_groups
+        plan['total_rows'] += metadata.num_rows
+        if fragment.path not in selected:
+            continue
+        groups = fragment.split_by_row_group(expr, schema=dataset.schema) if expr is not None else [fragment]
+        groups = [g for g in groups if g.row_groups is None or g.row_groups]
+        if groups:
+            plan['files'] += 1
+        for group in groups:
+            for rg in group.row_groups or ():
+                plan['row_groups'] += 1
+                plan['rows'] += rg.num_rows
+    return plan
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Archive journaled events to Parquet, or read the archive.")
+    ap.add_argument("command", choices=["import", "read", "plan", "replay"])
+    ap.add_argument("directory")
+    ap.add_argument("--journal", help="import: journal directory to read events from")
+    ap.add_argument("--from-time", type=datetime.datetime.fromisoformat)
+    ap.add_argument("--to-time", type=datetime.datetime.fromisoformat)
+    ap.add_argument("--cluster", action="append")
+    ap.add_argument("--node", action="append")
+    ap.add_argument("--event", action="append")
+    ap.add_argument("--severity", action="append")
+    ap.add_argument("--columns", help="read: comma-separated columns (default: all)")
+    ap.add_argument("--correlate", type=int, metavar="WINDOW_SEC",
+                    help="replay: run CorrelationEngine over the archived events")
+    ap.add_argument("--ml", metavar="MODEL", help="replay: run MLService (event clock) with this model")
+    args = ap.parse_args()
+
+    if args.command == "import":
+        from ontap_intelligence.core.journal import EventJournal
+        archive = EventArchive(args.directory, buffer_sec=86400) # A batch: whole days per file
+        for _, event in EventJournal(args.journal, read_only=True).replay(from_time=args.from_time):
+            archive.append(event)
+        archive.close()
+        print(archive.stats())
+        return
+
+    filters = dict(start=args.from_time, end=args.to_time, clusters=args.cluster, nodes=args.node,
+                   event_names=args.event, severities=args.severity)
+    if args.command == "plan":
+        print(scan_plan(args.directory, **filters))
+        return
+    if args.command == "replay":
+        _replay(args, filters)
+        return
+    table = read_table(args.directory, columns=args.columns.split(",") if args.columns else None, **filters)
+    for row in table.to_pylist():
+        print(" ".join(str(v) for v in row.values()))
+    print(f"{len(table)} events")
+
+def _replay(args, filters: Dict):
+    from ontap_intelligence.core.bus import bus
+    alerts = Counter()
+    if args.correlate:
+        from ontap_intelligence.intelligence.correlation import CorrelationEngine
+        CorrelationEngine(window_seconds=args.correlate).start()
+    if args.ml:
+        from ontap_intelligence.intelligence.ml_models import MLService
+        MLService(model_path=args.ml, clock="event").start()
+    bus.subscribe("event.incident", lambda t, p: alerts.update(["incident"]))
+    bus.subscribe("event.anomaly", lambda t, p: alerts.update(["anomaly"]))
+
+    t0 = time.perf_counter()
+    n = replay_to(bus, args.directory, **filters)
+    elapsed = time.perf_counter() - t0
+    print(f"Replayed {n} events in {elapsed:.2f}s ({n / elapsed if elapsed else 0:,.0f} events/s)")
+    print(f"Incidents: {alerts['incident']}  Anomalies: {alerts['anomaly']}")
+
+if __name__ == "__main__":
+    main()
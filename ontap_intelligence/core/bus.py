@@ -3,15 +3,32 @@ bus.py
 
 Internal Event Bus for the ONTAP Intelligence Platform.
 Decouples ingestion, parsing, and analysis components.
+Delivery is synchronous by default; handlers subscribed with a stage name run on
+that stage's worker threads once the stage is configured (see stages.py).
 """
 
-from typing import Callable, List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional
+from dataclasses import dataclass
+import threading
+import time
 import logging
+from ontap_intelligence.core.stages import StageExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
+def handler_name(handler: Callable) -> str:
+    """Readable handler name, e.g. 'ParserService._handle_raw_log'."""
+    return getattr(handler, '__qualname__', None) or repr(handler)
+
+@dataclass
+class HandlerStats:
+    calls: int = 0
+    errors: int = 0
+    cpu_inclusive: float = 0.0 # Thread CPU seconds including nested publishes
+    cpu_exclusive: float = 0.0 # Minus time spent in handlers it triggered
+
 class EventBus:
     """
     Singleton-style Event Bus.
@@ -20,23 +37,113 @@ class EventBus:
     def __init__(self):
         self._subscribers: Dict[str, List[Callable]] = {}
         self._all_subscribers: List[Callable] = []
+        # Optional per-handler CPU accounting (off by default: adds two clock reads per call)
+        self._timing = False
+        self.handler_stats: Dict[str, HandlerStats] = {}
+        self._local = threading.local()
+        # Queued stages: handler -> stage name, stage name -> executor
+        self._handler_stages: Dict[Callable, str] = {}
+        self._stages: Dict[str, StageExecutor] = {}
 
-    def subscribe(self, topic: str, handler: Callable):
-        """Subscribe to a specific topic."""
+    def subscribe(self, topic: str, handler: Callable, stage: Optional[str] = None):
+        """
+        Subscribe to a specific topic.
+        If `stage` is given and configured, the handler runs on that stage's workers.
+        """
         if topic not in self._subscribers:
             self._subscribers[topic] = []
         self._subscribers[topic].append(handler)
+        if stage:
+            self._handler_stages[handler] = stage
         logger.debug(f"Subscribed to topic '{topic}'")
 
+    def subscribed_stages(self) -> set:
+        """Stage names that subscribed handlers run on (whether configured yet or not)."""
+        return set(self._handler_stages.values())
+
     def subscribe_all(self, handler: Callable):
         """Subscribe to ALL events."""
         self._all_subscribers.append(handler)
 
+    def enable_timing(self, enabled: bool = True):
+        """Turn per-handler CPU accounting on/off (see handler_stats)."""
+        self._timing = enabled
+
+    def reset_timing(self):
+        self.handler_stats = {}
+
+    # --- Queued stages ---
+    def configure_stage(self, name: str, workers: int = 1, queue_size: int = 10000, batch_size: int = 1,
+                        partition_by: Optional[Callable[[Any], str]] = None):
+        """Creates and starts the executor for a stage name used in subscribe()."""
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already configured")
+        executor = StageExecutor(name, self.call, workers=workers, queue_size=queue_size, batch_size=batch_size,
+                                 partition_by=partition_by)
+        executor.start()
+        self._stages[name] = executor
+        return executor
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Waits until every stage queue is empty and idle. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            # Upstream stages feed downstream ones, so require all idle at once
+            if all(ex.pending() == 0 for ex in self._stages.values()):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def shutdown_stages(self, timeout: float = 5.0) -> Dict[str, Dict]:
+        """
+        Stops every stage's workers (each after what is queued, within `timeout`);
+        handlers then run inline again. Returns each stage's final stats.
+        """
+        for executor in self._stages.values():
+            executor.shutdown(timeout)
+        final = {name: ex.stats() for name, ex in self._stages.items()}
+        self._stages = {}
+        return final
+
+    def stats(self) -> Dict:
+        return {
+            'topics': {topic: len(handlers) for topic, handlers in self._subscribers.items()},
+            'stages': {name: ex.stats() for name, ex in self._stages.items()},
+        }
+
+    def call(self, topic: str, handler: Callable, payload: Any):
+        """Delivers one payload to one handler (errors are logged, never raised)."""
+        if self._timing:
+            self._call_timed(topic, handler, payload)
+            return
+        try:
+            handler(topic, payload)
+        except Exception as e:
+            logger.error(f"Error in handler for topic '{topic}': {e}")
+
+    def _publish_staged(self, topic: str, payload: Any):
+        for handler in self._subscribers.get(topic, []):
+            executor = self._stages.get(self._handler_stages.get(handler))
+            if executor is not None:
+                executor.submit(topic, handler, payload)
+            else:
+                self.call(topic, handler, payload)
+        for handler in self._all_subscribers:
+            self.call(topic, handler, payload)
+
     def publish(self, topic: str, payload: Any):
         """
         Publish an event to a topic.
         Payload can be any object (dict, dataclass, etc).
         """
+        if self._stages:
+            self._publish_staged(topic, payload)
+            return
+
+        if self._timing:
+            self._publish_timed(topic, payload)
+            return
+
         # Notify specific subscribers
         if topic in self._subscribers:
             for handler in self._subscribers[topic]:
@@ -52,5 +159,39 @@ class EventBus:
             except Exception as e:
                 logger.error(f"Error in global handler: {e}")
 
+    def _publish_timed(self, topic: str, payload: Any):
+        for handler in self._subscribers.get(topic, []):
+            self._call_timed(topic, handler, payload)
+        for handler in self._all_subscribers:
+            self._call_timed(topic, handler, payload)
+
+    def _call_timed(self, topic: str, handler: Callable, payload: Any):
+        # Handlers publish synchronously, so nested calls are charged to the
+        # child and subtracted from the parent's exclusive time via a per-thread stack.
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+
+        key = f"{topic}:{handler_name(handler)}"
+        stats = self.handler_stats.get(key)
+        if stats is None:
+            stats = self.handler_stats.setdefault(key, HandlerStats())
+
+        start = time.thread_time()
+        try:
+            handler(topic, payload)
+        except Exception as e:
+            stats.errors += 1
+            logger.error(f"Error in handler for topic '{topic}': {e}")
+        finally:
+            elapsed = time.thread_time() - start
+            child = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            stats.calls += 1
+            stats.cpu_inclusive += elapsed
+            stats.cpu_exclusive += elapsed - child
+
 # Global instance
 bus = EventBus()
@@ -0,0 +1,241 @@
+"""
+checkpoint.py
+
+Checkpoints of in-memory pipeline state for fast restart.
+A checkpoint is taken while the pipeline is quiescent (the supervisor pauses
+LogIngestor at a line boundary and drains the stages), so it is consistent with
+the ingestion position stored alongside it: every line before that offset has
+been fully processed, none after it.
+
+On disk (one directory per process; shards use <dir>/shard-<n>):
+- topology-<gen>.log: JSON lines of Asset records, later lines win. Each
+  checkpoint appends only the assets changed since the previous one
+  (AssetManager.changes_since()); a new generation holding a full snapshot is
+  started when the log outgrows the live graph by compact_ratio, or when the
+  change log no longer reaches back to the previous checkpoint.
+- checkpoint-<id>.ckpt: pickle of the ingestion position, the topology log
+  (generation, length) it covers, and each registered component's
+  checkpoint_state(). Written to a temp file, fsync'ed and renamed, so a crash
+  mid-checkpoint leaves the previous one intact.
+Restore replays topology up to the recorded length and hands each component its
+state; the pipeline then resumes reading at the stored offset.
+"""
+
+import dataclasses
+import glob
+import json
+import logging
+import os
+import pickle
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from ontap_intelligence.core.state import Asset, AssetManager, state
+
+logger = logging.getLogger(__name__)
+
+_CKPT_RE = re.compile(r"checkpoint-(\d+)\.ckpt$")
+_TOPO_RE = re.compile(r"topology-(\d+)\.log$")
+
+
+class CheckpointManager:
+    def __init__(self, directory: str = "checkpoints", keep: int = 3, compact_ratio: float = 4.0,
+                 assets: AssetManager = state):
+        """
+        :param keep: Checkpoints retained (older ones and unreferenced topology generations are removed).
+        :param compact_ratio: Start a new topology generation once the log holds this many
+                              records per live asset.
+        """
+        self.directory = directory
+        self.keep = keep
+        self.compact_ratio = compact_ratio
+        self.assets = assets
+        self.components: Dict[str, Any] = {}
+        os.makedirs(directory, exist_ok=True)
+
+        self._topo = None # Open topology log of the current generation
+        self._topo_gen: Optional[int] = None
+        self._topo_records = 0
+        self._topo_version = 0 # AssetManager.version covered by the topology log
+        self._generations: Dict[int, int] = {} # checkpoint id -> topology generation
+        self.written = 0
+        self.last_id: Optional[int] = None
+        self.last_duration = 0.0
+        self.last_bytes = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict, subdir: str = "") -> 'CheckpointManager':
+        """Builds a manager from the settings.yaml 'checkpoint' section."""
+        return cls(os.path.join(cfg.get('dir', "checkpoints"), subdir),
+                   keep=cfg.get('keep', 3),
+                   compact_ratio=cfg.get('compact_ratio', 4.0))
+
+    def register(self, name: str, component):
+        """component provides checkpoint_state() -> picklable and restore_state(state)."""
+        self.components[name] = component
+
+    # --- Paths ---
+    def _ckpt_path(self, ckpt_id: int) -> str:
+        return os.path.join(self.directory, f"checkpoint-{ckpt_id:010d}.ckpt")
+
+    def _topo_path(self, gen: int) -> str:
+        return os.path.join(self.directory, f"topology-{gen:010d}.log")
+
+    def checkpoint_ids(self) -> List[int]:
+        ids = []
+        for path in glob.glob(os.path.join(self.directory, "checkpoint-*.ckpt")):
+            m = _CKPT_RE.search(path)
+            if m:
+                ids.append(int(m.group(1)))
+        return sorted(ids)
+
+    def next_id(self) -> int:
+        ids = self.checkpoint_ids()
+        return max(ids[-1] if ids else 0, self.last_id or 0) + 1
+
+    # --- Writing ---
+    def _write_topology(self, ckpt_id: int):
+        changes = self.assets.changes_since(self._topo_version) if self._topo else None
+        snap = self.assets.snapshot()
+        if changes is None or self._topo_records + len(changes) > self.compact_ratio * max(len(snap), 64):
+            # New generation: a full snapshot
+            if self._topo:
+                self._topo.close()
+            self._topo_gen = ckpt_id
+            self._topo = open(self._topo_path(ckpt_id), "wb")
+            self._topo_records = 0
+            records = [dataclasses.asdict(a) for a in snap.assets.values()]
+            self._topo_version = snap.version
+        else:
+            latest = {c.asset.id: c for c in changes} # Last change per asset
+            records = [{'id': c.asset.id, 'removed': True} if c.kind == 'remove' else dataclasses.asdict(c.asset)
+                       for c in latest.values()]
+            if changes:
+                self._topo_version = changes[-1].version
+        if records:
+            self._topo.write(b"".join(json.dumps(r).encode('utf-8') + b"\n" for r in records))
+            self._topo_records += len(records)
+        self._topo.flush()
+        os.fsync(self._topo.fileno())
+        return self._topo_gen, self._topo.tell()
+
+    def write(self, position: Optional[Dict] = None, ckpt_id: Optional[int] = None,
+              extra: Optional[Dict] = None) -> int:
+        """
+        Snapshots topology and every registered component. The caller guarantees
+        nothing is mutating them. Returns the checkpoint id.
+        """
+        start = time.perf_counter()
+        ckpt_id = self.next_id() if ckpt_id is None else ckpt_id
+        topo_gen, topo_len = self._write_topology(ckpt_id)
+        record = {
+            'id': ckpt_id,
+            'created': time.time(),
+            'position': position,
+            'topology': (topo_gen, topo_len),
+            'components': {name: c.checkpoint_state() for name, c in self.components.items()},
+            **(extra or {}),
+        }
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+        path = self._ckpt_path(ckpt_id)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._generations[ckpt_id] = topo_gen
+        self._apply_retention()
+
+        self.written += 1
+        self.last_id = ckpt_id
+        self.last_bytes = len(data) + topo_len
+        self.last_duration = time.perf_counter() - start
+        logger.debug(f"Checkpoint {ckpt_id} written ({self.last_bytes} bytes, {self.last_duration * 1000:.1f} ms)")
+        return ckpt_id
+
+    def _apply_retention(self):
+        ids = self.checkpoint_ids()
+        for old in ids[:-self.keep] if self.keep else []:
+            os.remove(self._ckpt_path(old))
+        referenced = {self._topo_gen}
+        for ckpt_id in self.checkpoint_ids():
+            if ckpt_id not in self._generations:
+                self._generations[ckpt_id] = self._read(ckpt_id)['topology'][0]
+            referenced.add(self._generations[ckpt_id])
+        for path in glob.glob(os.path.join(self.directory, "topology-*.log")):
+            m = _TOPO_RE.search(path)
+            if m and int(m.group(1)) not in referenced:
+                os.remove(path)
+
+    # --- Restoring ---
+    def _read(self, ckpt_id: int) -> Dict:
+        with open(self._ckpt_path(ckpt_id), "rb") as f:
+            return pickle.load(f)
+
+    def restore(self, ckpt_id: Optional[int] = None) -> Optional[Dict]:
+        """
+        Restores topology and components from a checkpoint (default: the latest).
+        Returns its record ('id', 'position', ...) or None if there is none.
+        Newer checkpoints (never committed by the supervisor) are discarded.
+        """
+        start = time.perf_counter()
+        ids = self.checkpoint_ids()
+        if ckpt_id is None:
+            ckpt_id = ids[-1] if ids else None
+        if ckpt_id is None or ckpt_id not in ids:
+            if ckpt_id is not None:
+                logger.warning(f"Checkpoint {ckpt_id} not found in {self.directory}")
+            return None
+        record = self._read(ckpt_id)
+        for newer in ids:
+            if newer > ckpt_id:
+                os.remove(self._ckpt_path(newer))
+
+        # 1. Topology: replay the log up to what this checkpoint covered, drop the rest
+        gen, length = record['topology']
+        path = self._topo_path(gen)
+        with open(path, "r+b") as f:
+            data = f.read(length)
+            f.truncate(length)
+        assets: Dict[str, Asset] = {}
+        for line in data.splitlines():
+            fields = json.loads(line)
+            if fields.get('removed'):
+                assets.pop(fields['id'], None)
+            else:
+                assets[fields['id']] = Asset(**fields)
+        self.assets.load_assets(assets.values())
+        self._topo_version = self.assets.version
+        self._topo = open(path, "ab")
+        self._topo_gen = gen
+        self._topo_records = data.count(b"\n")
+
+        # 2. Components
+        for name, component_state in record['components'].items():
+            component = self.components.get(name)
+            if component is None:
+                logger.warning(f"Checkpoint {ckpt_id}: no component '{name}' registered; skipped")
+                continue
+            component.restore_state(component_state)
+
+        self.last_id = ckpt_id
+        logger.info(f"Restored checkpoint {ckpt_id} ({len(assets)} assets, "
+                    f"{', '.join(record['components'])}) in {time.perf_counter() - start:.2f}s")
+        return record
+
+    def close(self):
+        if self._topo:
+            self._topo.close()
+            self._topo = None
+
+    def stats(self) -> Dict:
+        return {
+            'directory': self.directory,
+            'written': self.written,
+            'last_id': self.last_id,
+            'last_bytes': self.last_bytes,
+            'last_duration_s': self.last_duration,
+        }
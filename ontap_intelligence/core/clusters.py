@@ -0,0 +1,59 @@
+"""
+clusters.py
+
+Cluster identity for multi-cluster collectors.
+ONTAP node names are '<cluster>-<NN>' ('ontap-cluster-01-02' is node 02 of
+'ontap-cluster-01'), so an event's cluster is derived from its node. Names that
+don't end in '-NN' are a single-node cluster of their own.
+Asset names (aggr1, vol_finance_1, disk 1.2) repeat across clusters, so asset ids
+are cluster-qualified: '<cluster>:<name>'. Node names are already unique and
+are used as-is.
+Per-cluster state (correlation buffers, window features, stage workers, shards)
+is partitioned by cluster_of(node) / partition_key(payload).
+"""
+
+import re
+from functools import lru_cache
+from typing import Tuple
+
+SEPARATOR = ":"
+
+_NODE_SUFFIX = re.compile(r"-\d+$")
+
+
+@lru_cache(maxsize=4096)
+def cluster_of(node: str) -> str:
+    """'ontap-cluster-01-02' -> 'ontap-cluster-01'."""
+    return _NODE_SUFFIX.sub("", node) or node
+
+
+def qualify(node: str, name: str) -> str:
+    """Cluster-qualified id of an asset named `name` reported by `node`."""
+    return f"{cluster_of(node)}{SEPARATOR}{name}"
+
+
+def split_id(asset_id: str) -> Tuple[str, str]:
+    """(cluster, name) of an asset id; a node id is (its cluster, itself)."""
+    cluster, sep, name = asset_id.partition(SEPARATOR)
+    if not sep:
+        return cluster_of(asset_id), asset_id
+    return cluster, name
+
+
+def node_of(line: str) -> str:
+    """Node name from a raw EMS line ('<134>Jan 22 12:10:00 [node1:event:SEV]: ...')."""
+    start = line.find('[')
+    if start < 0:
+        return ""
+    end = line.find(':', start)
+    return line[start + 1:end] if end > 0 else ""
+
+
+def partition_key(payload) -> str:
+    """Cluster of a bus payload: a UnifiedEvent (or anything with .cluster) or a raw line."""
+    cluster = getattr(payload, 'cluster', None)
+    if cluster is not None:
+        return cluster
+    if isinstance(payload, str):
+        return cluster_of(node_of(payload))
+    return ""
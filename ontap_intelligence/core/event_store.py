@@ -0,0 +1,572 @@
+"""
+event_store.py
+
+Searchable store of UnifiedEvents (topic 'event.unified') with inverted indexes
+on node, event_name, subsystem, severity and asset_id, and a trigram index of
+raw_message for substring and regex search.
+- Events are partitioned by event time (partition_minutes). A partition's events
+  collect in an open, in-memory segment that is sealed to disk once the event
+  clock is late_sec past the partition's end (or it holds segment_events).
+  Late events for a sealed partition open a new segment of that partition.
+- A sealed segment ('<partition start>-<seq>.seg') is immutable and memory-mapped:
+  [header][records sorted by event time][timestamp column][record positions]
+  [posting lists: sorted row numbers per field value][JSON term directory].
+  Records are core/codec.py-encoded events, decoded straight from the map.
+- A query picks the segments whose time span overlaps the range, bisects the
+  timestamp column to a row range, intersects the posting lists of the filtered
+  fields within it and decodes only the matching rows, merged in time order.
+- Text search (text= substring, case-insensitive; pattern= regex) intersects the
+  postings of the lower-cased trigrams the match must contain (for a regex, those
+  of its required literal runs), then verifies each candidate's raw_message.
+Checkpoints (core/checkpoint.py) seal the open segments, so a partition may span
+several segments. Restoring a checkpoint drops the segments sealed after it: the
+pipeline reads their events again. Without checkpoints, open segments are lost on
+a crash ('import' builds a new store from a journal).
+Sealed segments are dropped after retention_days of event time.
+
+Query with: python -m ontap_intelligence.core.event_store query events --asset ontap-cluster-01:vol_finance_12 --last 3600
+            python -m ontap_intelligence.core.event_store query events --text "Transfer stalled" --newest-first --limit 20
+"""
+
+import argparse
+import bisect
+import datetime
+import glob
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from ontap_intelligence.core.codec import EPOCH, decode_event, encode_event
+from ontap_intelligence.parsers.base import UnifiedEvent
+
+try:
+    from re import _constants as _sre, _parser as _sre_parse
+except ImportError: # Python < 3.11
+    import sre_constants as _sre
+    import sre_parse as _sre_parse
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('node', 'event_name', 'subsystem', 'severity', 'asset_id')
+TRIGRAMS = 'trigram' # Postings of the lower-cased trigrams of raw_message
+
+MAGIC = b"EVSTSEG1"
+_HEADER = struct.Struct("<8sIqqQI") # magic, rows, min ts, max ts (us since epoch), directory position, directory length
+_LEN = struct.Struct("<I")
+
+Terms = Union[str, Iterable[str]]
+
+
+def _ts_us(ts: datetime.datetime) -> int:
+    delta = ts - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _seq_of(path: str) -> int:
+    """Seal sequence number of a '<partition start>-<seq>.seg' file."""
+    return int(os.path.basename(path)[:-4].rsplit("-", 1)[1])
+
+
+def _trigrams(text: str) -> Set[str]:
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _required_literals(parsed) -> List[str]:
+    """Literal runs any match of a parsed regex must contain (top-level sequence only)."""
+    runs, run = [], []
+    for op, av in parsed:
+        if op is _sre.LITERAL:
+            run.append(chr(av))
+        elif op is _sre.AT: # Anchors match no characters: the run continues
+            continue
+        elif op is _sre.SUBPATTERN and not av[1] and not av[2]: # Plain group: (?:abc) or (abc)
+            runs.append("".join(run))
+            runs.extend(_required_literals(av[-1]))
+            run = []
+        else:
+            runs.append("".join(run))
+            run = []
+    runs.append("".join(run))
+    return [r for r in runs if len(r) >= 3]
+
+
+def _intersect(lists: List[Sequence[int]]) -> Sequence[int]:
+    """Intersection of sorted row lists, smallest first."""
+    lists = sorted(lists, key=len)
+    rows = lists[0]
+    for other in lists[1:]:
+        if not rows:
+            break
+        if len(other) > 16 * len(rows):
+            # Much longer list: bisect into it, each search starting where the last ended
+            out, lo, n = [], 0, len(other)
+            for row in rows:
+                lo = bisect.bisect_left(other, row, lo)
+                if lo == n:
+                    break
+                if other[lo] == row:
+                    out.append(row)
+            rows = out
+        else:
+            members = set(other)
+            rows = [row for row in rows if row in members]
+    return rows
+
+
+def _union(postings: List[Sequence[int]]) -> Sequence[int]:
+    if len(postings) == 1:
+        return postings[0]
+    return sorted(set(itertools.chain.from_iterable(postings)))
+
+
+class _OpenSegment:
+    """A partition's events in arrival order, with postings kept as they arrive."""
+
+    def __init__(self, partition: int, text_index: bool = True):
+        self.partition = partition
+        self.payloads: List[bytes] = []
+        self.ts = array('q')
+        self.postings: Dict[str, Dict[str, array]] = {field: {} for field in FIELDS}
+        if text_index:
+            self.postings[TRIGRAMS] = {}
+        self.min_ts: Optional[int] = None
+        self.max_ts: Optional[int] = None
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def add(self, event: UnifiedEvent, ts: int):
+        row = len(self.payloads)
+        self.payloads.append(encode_event(event))
+        self.ts.append(ts)
+        for field in FIELDS:
+            term = getattr(event, field)
+            if term is not None:
+                postings = self.postings[field].get(term)
+                if postings is None:
+                    postings = self.postings[field][term] = array('I')
+                postings.append(row)
+        trigrams = self.postings.get(TRIGRAMS)
+        if trigrams is not None and event.raw_message:
+            for trigram in _trigrams(event.raw_message):
+                postings = trigrams.get(trigram)
+                if postings is None:
+                    postings = trigrams[trigram] = array('I')
+                postings.append(row)
+        if self.min_ts is None or ts < self.min_ts:
+            self.min_ts = ts
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+
+    def match(self, start: Optional[int], end: Optional[int], terms: List[Tuple[str, List[str]]]) -> List[int]:
+        """Rows matching the query, in time order."""
+        lists = []
+        for field, values in terms:
+            postings = self.postings.get(field)
+            if postings is None:
+                continue # Not indexed: candidates are verified after decoding
+            found = [postings[v] for v in values if v in postings]
+            if not found:
+                return []
+            lists.append(_union(found))
+        rows = _intersect(lists) if lists else range(len(self.ts))
+        ts = self.ts
+        rows = [r for r in rows if (start is None or ts[r] >= start) and (end is None or ts[r] <= end)]
+        rows.sort(key=ts.__getitem__)
+        return rows
+
+    def event(self, row: int) -> UnifiedEvent:
+        return decode_event(self.payloads[row])[0]
+
+    def write(self, path: str):
+        """Writes the segment sorted by event time (atomically: temp file, then rename)."""
+        order = sorted(range(len(self.ts)), key=self.ts.__getitem__)
+        rank = array('I', bytes(4 * len(order)))
+        for new, old in enumerate(order):
+            rank[old] = new
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(bytes(_HEADER.size))
+            positions = array('Q')
+            pos = _HEADER.size
+            for old in order:
+                payload = self.payloads[old]
+                positions.append(pos)
+                f.write(_LEN.pack(len(payload)))
+                f.write(payload)
+                pos += _LEN.size + len(payload)
+
+            def put(data: array) -> int:
+                nonlocal pos
+                pad = -pos % 8 # Keeps every column aligned for memoryview casts
+                f.write(bytes(pad))
+                f.write(data.tobytes())
+                start = pos + pad
+                pos = start + len(data) * data.itemsize
+                return start
+
+            directory = {
+                'ts': put(array('q', (self.ts[old] for old in order))),
+                'positions': put(positions),
+                'fields': {field: {term: [put(array('I', sorted(rank[r] for r in rows))), len(rows)]
+                                   for term, rows in postings.items()}
+                           for field, postings in self.postings.items()},
+            }
+            data = json.dumps(directory, separators=(",", ":")).encode('utf-8')
+            f.write(data)
+            f.seek(0)
+            f.write(_HEADER.pack(MAGIC, len(order), self.min_ts, self.max_ts, pos, len(data)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+class _Segment:
+    """A sealed, memory-mapped segment."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, self.min_ts, self.max_ts, dir_pos, dir_len = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path}: not an event store segment")
+        directory = json.loads(self._map[dir_pos:dir_pos + dir_len])
+        self._view = memoryview(self._map)
+        self.ts = self._column(directory['ts'], 'q', self.rows)
+        self.positions = self._column(directory['positions'], 'Q', self.rows)
+        self.fields: Dict[str, Dict[str, List[int]]] = directory['fields']
+
+    def _column(self, pos: int, fmt: str, count: int) -> memoryview:
+        return self._view[pos:pos + struct.calcsize(fmt) * count].cast(fmt)
+
+    def __len__(self):
+        return self.rows
+
+    def overlaps(self, start: Optional[int], end: Optional[int]) -> bool:
+        return (start is None or self.max_ts >= start) and (end is None or self.min_ts <= end)
+
+    def match(self, start: Optional[int], end: Optional[int], terms: List[Tuple[str, List[str]]]) -> List[int]:
+        """Rows matching the query, in time order (rows are stored in time order)."""
+        lo = 0 if start is None else bisect.bisect_left(self.ts, start)
+        hi = self.rows if end is None else bisect.bisect_right(self.ts, end)
+        if lo >= hi:
+            return []
+        lists = []
+        for field, values in terms:
+            entries = self.fields.get(field)
+            if entries is None:
+                continue # Not indexed (segment written without a text index): verified after decoding
+            found = []
+            for value in values:
+                entry = entries.get(value)
+                if entry is not None:
+                    postings = self._column(entry[0], 'I', entry[1])
+                    found.append(postings[bisect.bisect_left(postings, lo):bisect.bisect_left(postings, hi)])
+            found = [p for p in found if len(p)]
+            if not found:
+                return []
+            lists.append(_union(found))
+        if not lists:
+            return list(range(lo, hi))
+        return list(_intersect(lists))
+
+    def event(self, row: int) -> UnifiedEvent:
+        return decode_event(self._map, self.positions[row] + _LEN.size)[0]
+
+    def close(self):
+        self.ts.release()
+        self.positions.release()
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass # A running query still holds a posting view; the map closes with it
+
+
+class EventStore:
+    def __init__(self, directory: str = "events", partition_minutes: float = 60, segment_events: int = 200_000,
+                 late_sec: float = 300, retention_days: Optional[float] = None, text_index: bool = True,
+                 read_only: bool = False):
+        """
+        :param late_sec: How far (event time) past its end a partition stays open for late events.
+        :param text_index: Index raw_message trigrams (without it, text search verifies every row in range).
+        :param read_only: Only query (e.g. while a live pipeline appends, or over the
+                          shard-<n> stores of a sharded run): new segments are picked up per query.
+        """
+        self.directory = directory
+        self.partition_us = int(partition_minutes * 60 * 1_000_000)
+        self.segment_events = segment_events
+        self.late_us = int(late_sec * 1_000_000)
+        self.retention_us = int(retention_days * 86400 * 1_000_000) if retention_days else None
+        self.text_index = text_index
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._open: Dict[int, _OpenSegment] = {}
+        self._seal_at: Optional[int] = None # Event time at which the oldest open partition closes
+        self.clock: Optional[int] = None # Newest event time seen (us since epoch)
+        self.segments: List[_Segment] = []
+        self.appended = 0
+        self.sealed = 0
+
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+            for tmp in glob.glob(os.path.join(directory, "*.seg.tmp")):
+                os.remove(tmp) # Interrupted seal
+        self._seq = 0
+        self._scan()
+
+    @classmethod
+    def from_config(cls, cfg: dict, subdir: str = "") -> 'EventStore':
+        """Builds a store from the settings.yaml 'event_store' section."""
+        return cls(os.path.join(cfg.get('dir', "events"), subdir),
+                   partition_minutes=cfg.get('partition_minutes', 60),
+                   segment_events=cfg.get('segment_events', 200_000),
+                   late_sec=cfg.get('late_sec', 300),
+                   retention_days=cfg.get('retention_days'),
+                   text_index=cfg.get('text_index', True))
+
+    def _scan(self):
+        """Opens sealed segments not yet open (read-only stores include shard-<n> subdirectories)."""
+        pattern = os.path.join(self.directory, "**", "*.seg") if self.read_only else os.path.join(self.directory, "*.seg")
+        known = {s.path for s in self.segments}
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            self._seq = max(self._seq, _seq_of(path) + 1)
+            if path not in known:
+                try:
+                    self.segments.append(_Segment(path))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Event store: skipping {path}: {e}")
+        self.segments.sort(key=lambda s: s.min_ts)
+
+    # --- Writing ---
+    def append(self, event: UnifiedEvent):
+        ts = _ts_us(event.timestamp)
+        partition = ts - ts % self.partition_us
+        with self._lock:
+            segment = self._open.get(partition)
+            if segment is None:
+                segment = self._open[partition] = _OpenSegment(partition, self.text_index)
+                closes = partition + self.partition_us + self.late_us
+                if self._seal_at is None or closes < self._seal_at:
+                    self._seal_at = closes
+            segment.add(event, ts)
+            self.appended += 1
+            if len(segment) >= self.segment_events:
+                self._seal(partition)
+
+            if self.clock is None or ts > self.clock:
+                self.clock = ts
+                if self._seal_at is not None and ts >= self._seal_at:
+                    self._seal_closed()
+
+    def _handle_event(self, topic, event: UnifiedEvent):
+        self.append(event)
+
+    def attach(self, bus, topic: str = "event.unified", stage: Optional[str] = None):
+        """Stores every event published on `topic`."""
+        bus.subscribe(topic, self._handle_event, stage=stage)
+
+    def _seal_closed(self):
+        for partition in sorted(self._open):
+            if partition + self.partition_us + self.late_us <= self.clock:
+                self._seal(partition)
+        self._apply_retention()
+
+    def _seal(self, partition: int):
+        segment = self._open.pop(partition)
+        self._seal_at = min((p + self.partition_us + self.late_us for p in self._open), default=None)
+        path = os.path.join(self.directory, f"{partition // 1_000_000:012d}-{self._seq:06d}.seg")
+        self._seq += 1
+        segment.write(path)
+        sealed = _Segment(path)
+        bisect.insort(self.segments, sealed, key=lambda s: s.min_ts)
+        self.sealed += 1
+        logger.debug(f"Event store: sealed {len(segment)} events to {path}")
+
+    def _apply_retention(self):
+        if self.retention_us is None:
+            return
+        cutoff = self.clock - self.retention_us
+        for segment in [s for s in self.segments if s.max_ts < cutoff]:
+            # Not closed: a running query may still read it (the map outlives the file)
+            os.remove(segment.path)
+            self.segments.remove(segment)
+            logger.info(f"Event store: dropped {segment.path}")
+
+    def flush(self):
+        """Seals every open segment (queries see open segments regardless)."""
+        with self._lock:
+            for partition in sorted(self._open):
+                self._seal(partition)
+
+    def close(self):
+        if not self.read_only:
+            self.flush()
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+
+    # --- Checkpoints ---
+    def checkpoint_state(self) -> Dict:
+        """Seals the open segments: every event before the checkpoint is on disk."""
+        self.flush()
+        with self._lock:
+            return {'seq': self._seq}
+
+    def restore_state(self, saved: Dict):
+        """Drops segments sealed after the checkpoint (their events are read again)."""
+        with self._lock:
+            for segment in [s for s in self.segments if _seq_of(s.path) >= saved['seq']]:
+                segment.close()
+                os.remove(segment.path)
+                self.segments.remove(segment)
+                logger.info(f"Event store: dropped {segment.path} (sealed after the checkpoint)")
+
+    # --- Reading ---
+    def _plan(self, start: Optional[datetime.datetime], end: Optional[datetime.datetime],
+              text: Optional[str], pattern: Optional[str], filters: Dict[str, Optional[Terms]]):
+        """Candidate (segment, rows) pairs, rows in time order, and the check candidates must pass."""
+        terms = []
+        for field, values in filters.items():
+            if field not in FIELDS:
+                raise ValueError(f"Unknown event store field: {field!r} (expected one of {FIELDS})")
+            if values is not None:
+                terms.append((field, [values] if isinstance(values, str) else list(values)))
+
+        checks: List[Callable[[str], bool]] = []
+        literals: List[str] = []
+        if text:
+            needle = text.lower()
+            checks.append(lambda message: needle in message.lower())
+            literals.append(text)
+        if pattern:
+            regex = re.compile(pattern)
+            checks.append(lambda message: regex.search(message) is not None)
+            literals.extend(_required_literals(_sre_parse.parse(pattern, regex.flags)))
+        trigrams = set()
+        for literal in literals:
+            trigrams |= _trigrams(literal)
+        terms += [(TRIGRAMS, [t]) for t in sorted(trigrams)]
+        check = None
+        if checks:
+            check = lambda event: bool(event.raw_message) and all(c(event.raw_message) for c in checks)
+
+        start_us = None if start is None else _ts_us(start)
+        end_us = None if end is None else _ts_us(end)
+        with self._lock:
+            if self.read_only:
+                self._scan()
+            # Open segments are matched under the lock; their rows are append-only
+            sources = [s for s in self.segments if s.overlaps(start_us, end_us)]
+            sources += [s for s in self._open.values()
+                        if (start_us is None or s.max_ts >= start_us) and (end_us is None or s.min_ts <= end_us)]
+            return [(s, s.match(start_us, end_us, terms)) for s in sources], check
+
+    def query(self, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+              limit: Optional[int] = None, newest_first: bool = False, text: Optional[str] = None,
+              pattern: Optional[str] = None, **filters: Optional[Terms]) -> Iterator[UnifiedEvent]:
+        """
+        Events with start <= timestamp <= end matching every given field filter
+        (node=, event_name=, subsystem=, severity=, asset_id=; a collection matches
+        any of its values), whose raw_message contains `text` (case-insensitive)
+        and matches the regex `pattern`, in time order.
+        """
+        plan, check = self._plan(start, end, text, pattern, filters)
+
+        def rows(segment, matched):
+            ts = segment.ts
+            for row in (reversed(matched) if newest_first else matched):
+                yield ts[row], segment, row
+
+        merged = heapq.merge(*(rows(s, m) for s, m in plan if m), key=itemgetter(0), reverse=newest_first)
+        events = (segment.event(row) for _, segment, row in merged)
+        if check is not None:
+            events = filter(check, events)
+        yield from itertools.islice(events, limit)
+
+    def count(self, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+              text: Optional[str] = None, pattern: Optional[str] = None, **filters: Optional[Terms]) -> int:
+        """Number of events query() would return (decoding only text search candidates)."""
+        plan, check = self._plan(start, end, text, pattern, filters)
+        if check is None:
+            return sum(len(m) for _, m in plan)
+        return sum(1 for segment, matched in plan for row in matched if check(segment.event(row)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'segments': len(self.segments),
+                'open_segments': len(self._open),
+                'events': sum(len(s) for s in self.segments) + sum(len(s) for s in self._open.values()),
+                'bytes': sum(os.path.getsize(s.path) for s in self.segments if os.path.exists(s.path)),
+                'appended': self.appended,
+                'sealed': self.sealed,
+            }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query an event store, or build one from a journal.")
+    ap.add_argument("command", choices=["stats", "query", "import"])
+    ap.add_argument("directory")
+    ap.add_argument("--journal", help="import: journal directory to read events from")
+    ap.add_argument("--from-time", type=datetime.datetime.fromisoformat)
+    ap.add_argument("--to-time", type=datetime.datetime.fromisoformat)
+    ap.add_argument("--last", type=float, metavar="SECONDS", help="Relative to the newest stored event")
+    ap.add_argument("--node", action="append")
+    ap.add_argument("--event", action="append", dest="event_name")
+    ap.add_argument("--subsystem", action="append")
+    ap.add_argument("--severity", action="append")
+    ap.add_argument("--asset", action="append", dest="asset_id")
+    ap.add_argument("--text", help="Substring of the message (case-insensitive)")
+    ap.add_argument("--regex", help="Regular expression the message must match")
+    ap.add_argument("--limit", type=int)
+    ap.add_argument("--newest-first", action="store_true")
+    ap.add_argument("--count", action="store_true", help="query: print only the number of matches")
+    args = ap.parse_args()
+
+    if args.command == "import":
+        from ontap_intelligence.core.journal import EventJournal
+        store = EventStore(args.directory)
+        n = 0
+        for _, event in EventJournal(args.journal, read_only=True).replay(from_time=args.from_time):
+            store.append(event)
+            n += 1
+        store.close()
+        print(f"Imported {n} events")
+        return
+
+    store = EventStore(args.directory, read_only=True)
+    if args.command == "stats":
+        print(store.stats())
+        return
+
+    start = args.from_time
+    if args.last is not None:
+        newest = max((s.max_ts for s in store.segments), default=0)
+        start = EPOCH + datetime.timedelta(microseconds=newest) - datetime.timedelta(seconds=args.last)
+    filters = {f: getattr(args, f) for f in FIELDS}
+    if args.count:
+        print(store.count(start, args.to_time, text=args.text, pattern=args.regex, **filters))
+        return
+    for event in store.query(start, args.to_time, limit=args.limit, newest_first=args.newest_first,
+                             text=args.text, pattern=args.regex, **filters):
+        print(f"{event.timestamp.isoformat()} {event.node} {event.severity:5} {event.event_name} "
+              f"{event.asset_id or '-'}: {event.raw_message}")
+
+if __name__ == "__main__":
+    main()
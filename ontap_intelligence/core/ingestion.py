@@ -3,17 +3,33 @@ ingestion.py
 
 Handles data ingestion from various sources (File, UDP).
 Publishes raw log lines to the Event Bus under topic 'log.raw'.
+Each line is a RawLine: a str tagged with the monotonic time it was read,
+so downstream stages can measure their lag from ingestion.
+File modes track the byte offset of the last published line (position()) and
+can resume from one; pause()/resume() hold publishing at a line boundary
+(used for consistent checkpoints, see checkpoint.py).
+With ingestion.time_index enabled, file modes also extend the source file's
+time -> offset index as they read (see log_index.py).
 """
 
 import time
 import os
+import socket
 import threading
-from typing import Optional
+from typing import Dict, Optional
 from ontap_intelligence.core.bus import bus
+from ontap_intelligence.core.log_index import LogTimeIndex
 import logging
 
 logger = logging.getLogger(__name__)
 
+class RawLine(str):
+    """A raw log line tagged with its ingest time (time.monotonic())."""
+    def __new__(cls, value: str, ingest_ts: Optional[float] = None):
+        obj = super().__new__(cls, value)
+        obj.ingest_ts = time.monotonic() if ingest_ts is None else ingest_ts
+        return obj
+
 class LogIngestor:
     def __init__(self, config: dict):
         self.config = config
@@ -21,10 +37,22 @@ class LogIngestor:
         self.mode = config['ingestion']['mode']
         self._stop_event = threading.Event()
         self._thread: Optional[threading.Thread] = None
+        # Position in source_file (tail/replay): bytes up to the end of the last published line
+        self.offset: Optional[int] = None
+        self.inode: Optional[int] = None
+        self.start_position: Optional[Dict] = None
+        self.time_index: Optional[LogTimeIndex] = None
+        self._pause_requested = threading.Event()
+        self._paused = threading.Event()
+        self._resume = threading.Event()
 
-    def start(self):
-        """Starts the ingestion loop in a background thread."""
+    def start(self, position: Optional[Dict] = None):
+        """
+        Starts the ingestion loop in a background thread.
+        :param position: Resume point from position() (e.g. a checkpoint). Ignored in udp mode.
+        """
         logger.info(f"Starting LogIngestor in '{self.mode}' mode...")
+        self.start_position = position
         self._stop_event.clear()
         self._thread = threading.Thread(target=self._run, daemon=True)
         self._thread.start()
@@ -36,13 +64,96 @@ class LogIngestor:
         if self._thread:
             self._thread.join(timeout=2.0)
 
+    def is_running(self) -> bool:
+        """True while the ingestion loop has lines left to read (a replay ends at EOF)."""
+        return bool(self._thread and self._thread.is_alive())
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits for the ingestion loop to end (replay: EOF). Returns False on timeout."""
+        if self._thread:
+            self._thread.join(timeout)
+        return not self.is_running()
+
+    def position(self) -> Optional[Dict]:
+        """Resume point after the last published line (None before a file is opened / in udp mode)."""
+        if self.offset is None:
+            return None
+        return {'file': self.source_file, 'inode': self.inode, 'offset': self.offset}
+
+    def pause(self, timeout: float = 5.0) -> bool:
+        """
+        Holds publishing at the next line boundary. Returns True once paused
+        (or if the loop has ended), False if it did not pause within `timeout`.
+        """
+        self._resume.clear()
+        self._pause_requested.set()
+        deadline = time.monotonic() + timeout
+        while not self._paused.wait(0.05):
+            if not (self._thread and self._thread.is_alive()):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+        return True
+
+    def resume(self):
+        self._paused.clear()
+        self._pause_requested.clear()
+        self._resume.set()
+
+    def _check_pause(self):
+        if self._pause_requested.is_set():
+            self._paused.set()
+            while not self._resume.wait(0.1):
+                if self._stop_event.is_set():
+                    break
+
+    def _seek_start(self, f, from_end: bool):
+        """Positions f at the resume point if it still applies, else at the start (or end)."""
+        st = os.fstat(f.fileno())
+        pos = self.start_position
+        if pos and pos.get('file') == self.source_file and pos.get('inode') == st.st_ino \
+                and pos['offset'] <= st.st_size:
+            f.seek(pos['offset'])
+            logger.info(f"Resuming {self.source_file} at byte {pos['offset']}")
+        elif pos:
+            # Rotated or truncated since the checkpoint: the new file is all unread
+            logger.warning(f"{self.source_file} changed since the checkpoint; reading it from the start")
+            f.seek(0)
+        elif from_end:
+            f.seek(0, 2)
+        self.inode = st.st_ino
+        self.offset = f.tell()
+        self._open_time_index()
+
+    def _open_time_index(self):
+        cfg = self.config['ingestion'].get('time_index', {})
+        if not cfg.get('enabled'):
+            return
+        try:
+            self.time_index = LogTimeIndex(self.source_file, bucket_sec=cfg.get('bucket_sec', 10))
+            self.time_index.open_for_append()
+            self.time_index.catch_up(self.offset) # Lines written before we started (a no-op once indexed)
+        except OSError as e:
+            logger.warning(f"Time index disabled for {self.source_file}: {e}")
+            self.time_index = None
+
+    def _close_time_index(self):
+        if self.time_index:
+            self.time_index.close()
+            self.time_index = None
+
     def _run(self):
-        if self.mode == 'tail':
-            self._run_tail()
-        elif self.mode == 'replay':
-            self._run_replay()
-        else:
-            logger.error(f"Unknown ingestion mode: {self.mode}")
+        try:
+            if self.mode == 'tail':
+                self._run_tail()
+            elif self.mode == 'replay':
+                self._run_replay()
+            elif self.mode == 'udp':
+                self._run_udp()
+            else:
+                logger.error(f"Unknown ingestion mode: {self.mode}")
+        finally:
+            self._close_time_index()
 
     def _run_tail(self):
         """
@@ -53,17 +164,23 @@ class LogIngestor:
             while not os.path.exists(self.source_file) and not self._stop_event.is_set():
                 time.sleep(1)
         
-        # Open file
-        with open(self.source_file, 'r') as f:
-            # Go to end of file to start reading only NEW logs
-            f.seek(0, 2)
+        # Open file (binary, so positions are byte offsets)
+        with open(self.source_file, 'rb') as f:
+            # Go to end of file to start reading only NEW logs (unless resuming)
+            self._seek_start(f, from_end=True)
             
             while not self._stop_event.is_set():
+                self._check_pause()
                 line = f.readline()
-                if line:
+                if line.endswith(b"\n"):
+                    if self.time_index:
+                        self.time_index.observe(self.offset, line)
+                    self.offset += len(line)
                     # Publish stripped line
-                    bus.publish("log.raw", line.strip())
+                    bus.publish("log.raw", RawLine(line.decode('utf-8', errors='replace').strip()))
                 else:
+                    if line:
+                        f.seek(self.offset) # Partial line: re-read once the writer finishes it
                     time.sleep(self.config['ingestion']['poll_interval'])
 
     def _run_replay(self):
@@ -75,10 +192,38 @@ class LogIngestor:
              logger.error("Source file not found for replay.")
              return
 
-        with open(self.source_file, 'r') as f:
+        with open(self.source_file, 'rb') as f:
+            self._seek_start(f, from_end=False)
             for line in f:
                 if self._stop_event.is_set():
                     break
-                bus.publish("log.raw", line.strip())
+                self._check_pause()
+                if self.time_index and line.endswith(b"\n"):
+                    self.time_index.observe(self.offset, line)
+                self.offset += len(line)
+                bus.publish("log.raw", RawLine(line.decode('utf-8', errors='replace').strip()))
                 # Simulate processing speed if needed
                 # time.sleep(0.01) 
+
+    def _run_udp(self):
+        """
+        Syslog over UDP: one log line per datagram (a datagram of several lines
+        is published line by line).
+        """
+        host = self.config['ingestion'].get('udp_host', '0.0.0.0')
+        port = self.config['ingestion'].get('udp_port', 514)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((host, port))
+        sock.settimeout(self.config['ingestion']['poll_interval'])
+        logger.info(f"UDP mode: listening on {host}:{port}")
+
+        with sock:
+            while not self._stop_event.is_set():
+                self._check_pause()
+                try:
+                    data = sock.recv(65535)
+                except socket.timeout:
+                    continue
+                ingest_ts = time.monotonic()
+                for line in data.decode('utf-8', errors='replace').splitlines():
+                    bus.publish("log.raw", RawLine(line.strip(), ingest_ts))
@@ -0,0 +1,412 @@
+"""
+log_index.py
+
+Sparse time -> byte offset index for raw EMS log files, and time-range reads
+across a rotated file set (ontap_ems.log.N ... ontap_ems.log.1, ontap_ems.log).
+- An index entry (bucket start, offset) is recorded whenever a line's time
+  bucket (bucket_sec) is newer than every line before it. So every line at or
+  after bucket b lies at or past the entry for b: a read seeks straight to it.
+  Lines a little out of order (several nodes, one file) are caught by reading up
+  to max_lag_sec past the end of the range.
+- Sidecars live in '<dir>/.<log name>.tidx/<inode>.tidx' ([header][entries]),
+  keyed by inode so they follow their file through rotation renames; a digest of
+  the file's first line guards against inode reuse.
+- The ingestor extends the live file's index as it reads (observe()); any other
+  file is indexed on first use and the sidecar saved, so later reads only scan
+  what was appended since.
+Syslog timestamps have no year: it is inferred like src/parser.py (the
+reference year, or the one before for dates more than two days ahead), with the
+file's mtime as the reference (now, for the file being ingested).
+LogTail follows one growing file by byte offset (the complete lines appended
+since its last read; rotation and truncation restart it) and can start at the
+newest N seconds of the file through its index. The dashboards read through it.
+
+Read with: python -m ontap_intelligence.core.log_index read logs/ontap_ems.log --last 600
+"""
+
+import argparse
+import bisect
+import calendar
+import datetime
+import glob
+import hashlib
+import logging
+import os
+import re
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ontap_intelligence.core.codec import EPOCH
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EMSTIDX1"
+_HEADER = struct.Struct("<8sIQ16s") # magic, bucket_sec, inode, first-line digest
+_ENTRY = struct.Struct("<qQ") # bucket start (seconds since epoch), byte offset of its first line
+_MONTHS = {m.encode(): i for i, m in enumerate(calendar.month_abbr) if m}
+_AHEAD = 2 * 86400 # Dates further ahead than this belong to the previous year
+_ROTATED = re.compile(r"\.\d+$")
+
+
+def _seconds(ts: datetime.datetime) -> int:
+    return int((ts - EPOCH).total_seconds())
+
+
+def _first_line_digest(path: str) -> bytes:
+    with open(path, "rb") as f:
+        line = f.readline()
+    return hashlib.blake2b(line if line.endswith(b"\n") else b"", digest_size=16).digest()
+
+
+def rotated_files(path: str) -> List[str]:
+    """The rotation set of `path`, oldest first (path.N, ..., path.1, path)."""
+    files = []
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        files.append(f"{path}.{n}")
+        n += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+class LogTimeIndex:
+    def __init__(self, path: str, bucket_sec: int = 10, index_dir: Optional[str] = None,
+                 reference: Optional[float] = None):
+        """
+        :param index_dir: Sidecar directory (default '<dir>/.<log name>.tidx', shared by the rotation set).
+        :param reference: Epoch time that resolves the year of timestamps (default: now).
+        """
+        self.path = path
+        self.bucket_sec = bucket_sec
+        base = _ROTATED.sub("", os.path.basename(path))
+        self.index_dir = index_dir or os.path.join(os.path.dirname(path), f".{base}.tidx")
+        self.inode = os.stat(path).st_ino
+        self.index_path = os.path.join(self.index_dir, f"{self.inode}.tidx")
+        self.reference = reference
+        self.buckets: List[int] = []
+        self.offsets: List[int] = []
+        self.indexed_to = 0 # Bytes of the file covered
+        self.max_ts: Optional[int] = None # Newest line time seen (seconds since epoch)
+        self._minutes: Dict[bytes, int] = {} # 'Oct 19 03:35' -> seconds since epoch
+        self._last_ts = b""
+        self._persist = False # Entries are appended to the sidecar as they are created
+        self._sidecar = None
+        self._load()
+
+    # --- Sidecar ---
+    def _load(self):
+        self._digest = _first_line_digest(self.path)
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if len(data) >= _HEADER.size:
+            magic, bucket_sec, inode, digest = _HEADER.unpack_from(data)
+            if (magic, bucket_sec, inode, digest) == (MAGIC, self.bucket_sec, self.inode, self._digest):
+                end = len(data) - (len(data) - _HEADER.size) % _ENTRY.size
+                for pos in range(_HEADER.size, end, _ENTRY.size):
+                    bucket, offset = _ENTRY.unpack_from(data, pos)
+                    self.buckets.append(bucket)
+                    self.offsets.append(offset)
+        if self.buckets:
+            # Re-scan from the last entry: its bucket is seen again, nothing is duplicated
+            self.indexed_to = self.offsets[-1]
+            self.max_ts = self.buckets[-1]
+
+    def save(self):
+        """Rewrites the sidecar atomically."""
+        self._digest = _first_line_digest(self.path)
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, self.bucket_sec, self.inode, self._digest))
+            f.write(b"".join(_ENTRY.pack(b, o) for b, o in zip(self.buckets, self.offsets)))
+        os.replace(tmp, self.index_path)
+
+    def open_for_append(self):
+        """
+        Makes this the sidecar's writer (the ingestor of the file): observe()
+        persists entries as they are created. An empty file gets its sidecar with
+        its first line (the digest needs it).
+        """
+        self._persist = True
+        if self.buckets:
+            self._create_sidecar()
+
+    def _create_sidecar(self):
+        self.save()
+        self._sidecar = open(self.index_path, "ab")
+
+    def _add(self, bucket: int, offset: int):
+        self.buckets.append(bucket)
+        self.offsets.append(offset)
+        if not self._persist:
+            return
+        if self._sidecar is None:
+            self._create_sidecar()
+        else:
+            self._sidecar.write(_ENTRY.pack(bucket, offset))
+            self._sidecar.flush()
+
+    def close(self):
+        if self._sidecar is not None:
+            self._sidecar.close()
+            self._sidecar = None
+
+    # --- Building ---
+    @staticmethod
+    def _timestamp(line: bytes) -> bytes:
+        """'Mon DD HH:MM:SS' of a '<PRI>Mon DD HH:MM:SS [...' line (b'' if there is none)."""
+        i = line.find(b">", 0, 6) + 1
+        return line[i:i + 15] if i > 0 else b""
+
+    def _line_time(self, line: bytes) -> Optional[int]:
+        """Seconds since epoch of a line's timestamp (None if it has none)."""
+        return self._ts_seconds(self._timestamp(line))
+
+    def _ts_seconds(self, ts: bytes) -> Optional[int]:
+        minute = self._minutes.get(ts[:12])
+        if minute is None:
+            try:
+                month = _MONTHS[ts[:3]]
+                day, hour, mins = int(ts[4:6]), int(ts[7:9]), int(ts[10:12])
+                ref = datetime.datetime.fromtimestamp(self.reference or time.time())
+                minute = calendar.timegm((ref.year, month, day, hour, mins, 0))
+                if minute > _seconds(ref) + _AHEAD:
+                    minute = calendar.timegm((ref.year - 1, month, day, hour, mins, 0))
+            except (KeyError, ValueError):
+                return None
+            if len(self._minutes) > 4096:
+                self._minutes.clear()
+            self._minutes[ts[:12]] = minute
+        try:
+            return minute + int(ts[13:15])
+        except ValueError:
+            return None
+
+    def observe(self, offset: int, line: bytes):
+        """Indexes one complete line starting at `offset` (lines must arrive in file order)."""
+        if offset != self.indexed_to:
+            if offset < self.indexed_to:
+                return # Already indexed (e.g. re-read after a resume)
+            self.catch_up(offset) # Lines skipped by the caller
+        self.indexed_to = offset + len(line)
+        ts = self._timestamp(line)
+        if ts == self._last_ts:
+            return # Same second as the previous line: the fast path for bursts
+        self._last_ts = ts
+        seconds = self._ts_seconds(ts)
+        if seconds is None:
+            return
+        if self.max_ts is None or seconds > self.max_ts:
+            self.max_ts = seconds
+        bucket = seconds - seconds % self.bucket_sec
+        if not self.buckets or bucket > self.buckets[-1]:
+            self._add(bucket, offset)
+
+    def catch_up(self, limit: Optional[int] = None) -> int:
+        """Indexes complete lines from indexed_to up to `limit` (default: EOF). Returns bytes scanned."""
+        start = self.indexed_to
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            pos = start
+            for line in f:
+                if not line.endswith(b"\n") or (limit is not None and pos >= limit):
+                    break
+                self.observe(pos, line)
+                pos += len(line)
+        return self.indexed_to - start
+
+    def refresh(self) -> 'LogTimeIndex':
+        """
+        Brings the index up to the end of the file. A full build is saved for the
+        next reader (a file being ingested already has a sidecar, kept by its writer).
+        """
+        built = not self.buckets
+        self.catch_up()
+        if built and self.buckets and not self._persist:
+            try:
+                self.save()
+            except OSError as e:
+                logger.warning(f"Could not save time index for {self.path}: {e}")
+        return self
+
+    # --- Lookup ---
+    def seek_range(self, start: Optional[int], end: Optional[int], max_lag_sec: int) -> Tuple[int, Optional[int]]:
+        """Byte range that holds every line in [start, end] (seconds since epoch); None = to EOF."""
+        begin = 0
+        if start is not None:
+            i = bisect.bisect_left(self.buckets, start - start % self.bucket_sec)
+            begin = self.offsets[i] if i < len(self.offsets) else self.indexed_to
+        stop = None
+        if end is not None:
+            j = bisect.bisect_right(self.buckets, end + max_lag_sec)
+            stop = self.offsets[j] if j < len(self.offsets) else None
+        return begin, stop
+
+    def stats(self) -> Dict:
+        return {'path': self.path, 'entries': len(self.buckets), 'indexed_bytes': self.indexed_to,
+                'first': self.buckets[0] if self.buckets else None, 'newest': self.max_ts}
+
+
+def _prune_sidecars(index_dir: str, inodes: List[int]):
+    for sidecar in glob.glob(os.path.join(index_dir, "*.tidx")):
+        name = os.path.basename(sidecar)[:-5]
+        if name.isdigit() and int(name) not in inodes:
+            os.remove(sidecar) # Its file was rotated out (deleted)
+
+
+def open_indexes(path: str, bucket_sec: int = 10, index_dir: Optional[str] = None) -> List[LogTimeIndex]:
+    """Up-to-date indexes of the rotation set of `path`, oldest first."""
+    indexes = []
+    for file in rotated_files(path):
+        try:
+            reference = os.stat(file).st_mtime
+            indexes.append(LogTimeIndex(file, bucket_sec, index_dir, reference=reference).refresh())
+        except FileNotFoundError:
+            continue # Rotated away meanwhile
+    if indexes:
+        _prune_sidecars(indexes[0].index_dir, [ix.inode for ix in indexes])
+    return indexes
+
+
+def read_range(path: str, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+               bucket_sec: int = 10, max_lag_sec: int = 60, index_dir: Optional[str] = None) -> Iterator[str]:
+    """
+    Yields the lines of the rotation set whose timestamp is in [start, end], oldest
+    file first, reading only the indexed byte ranges that can hold them.
+    """
+    lo = _seconds(start) if start is not None else None
+    hi = _seconds(end) if end is not None else None
+    for ix in open_indexes(path, bucket_sec, index_dir):
+        if lo is not None and ix.max_ts is not None and ix.max_ts < lo:
+            continue # File ends before the range
+        if hi is not None and ix.buckets and ix.buckets[0] > hi + max_lag_sec:
+            break # This and every newer file start after it
+        begin, stop = ix.seek_range(lo, hi, max_lag_sec)
+        with open(ix.path, "rb") as f:
+            f.seek(begin)
+            pos = begin
+            for line in f:
+                if (stop is not None and pos >= stop) or not line.endswith(b"\n"):
+                    break
+                pos += len(line)
+                seconds = ix._line_time(line)
+                if seconds is None or (lo is not None and seconds < lo) or (hi is not None and seconds > hi):
+                    continue
+                yield line.decode('utf-8', errors='replace').rstrip("\n")
+
+
+def read_last(path: str, seconds: float, **kwargs) -> List[str]:
+    """Lines from the newest `seconds` of the log (relative to its newest timestamp)."""
+    indexes = open_indexes(path, kwargs.get('bucket_sec', 10), kwargs.get('index_dir'))
+    newest = max((ix.max_ts for ix in indexes if ix.max_ts is not None), default=None)
+    if newest is None:
+        return []
+    start = EPOCH + datetime.timedelta(seconds=newest - seconds)
+    return list(read_range(path, start=start, **kwargs))
+
+
+class LogTail:
+    def __init__(self, path: str, max_bytes: Optional[int] = None):
+        """
+        :param max_bytes: Most bytes one read_new() reads; the rest of a larger append
+                          is returned by the following calls. A single line longer than
+                          this is returned cut to its first max_bytes (the rest is dropped).
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.offset = 0 # End of the last complete line returned
+        self.inode: Optional[int] = None # None until the first read (or seek)
+        self.rotated = False # Set by read_new() when it restarted from the top
+        self.rotations = 0
+        self.truncated = 0 # Lines longer than max_bytes, returned cut
+        self._skipping = False # Inside the dropped rest of a cut line
+
+    def seek(self, offset: int, inode: Optional[int] = None):
+        """Continues from `offset` (the start of a line) of the file now at path (or of `inode`)."""
+        self.offset = offset
+        self._skipping = False
+        self.inode = os.stat(self.path).st_ino if inode is None else inode
+
+    def seek_last(self, seconds: float, bucket_sec: int = 10) -> int:
+        """
+        Continues from the first line of the file's newest `seconds` (relative to its
+        newest timestamp; a bucket early at most), found through its time index
+        instead of parsing what comes before. Returns the offset.
+        """
+        ix = LogTimeIndex(self.path, bucket_sec).refresh()
+        begin = 0
+        if ix.max_ts is not None:
+            begin, _ = ix.seek_range(int(ix.max_ts - seconds), None, 0)
+        self.seek(begin, ix.inode)
+        return begin
+
+    def read_new(self) -> List[str]:
+        """Complete lines appended since the last call. A trailing partial line is read again next call."""
+        self.rotated = False
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if self.inode is not None and (st.st_ino != self.inode or st.st_size < self.offset):
+            self.offset = 0
+            self._skipping = False
+            self.rotated = True
+            self.rotations += 1
+        self.inode = st.st_ino
+        if st.st_size == self.offset:
+            return []
+
+        size = st.st_size - self.offset
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(min(size, self.max_bytes) if self.max_bytes else size)
+        if self._skipping: # Drop up to the end of the cut line
+            end = data.find(b"\n") + 1
+            if not end:
+                self.offset += len(data)
+                return []
+            self.offset += end
+            data = data[end:]
+            self._skipping = False
+        complete = data.rfind(b"\n") + 1
+        if not complete and self.max_bytes and len(data) == self.max_bytes:
+            # No line end within max_bytes: waiting for one would stall the tail for good
+            self.offset += len(data)
+            self._skipping = True
+            self.truncated += 1
+            return [data.decode('utf-8', errors='replace')]
+        self.offset += complete
+        return data[:complete - 1].decode('utf-8', errors='replace').split("\n") if complete else []
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build or query the time index of an EMS log rotation set.")
+    ap.add_argument("command", choices=["build", "read"])
+    ap.add_argument("path")
+    ap.add_argument("--from-time", type=datetime.datetime.fromisoformat)
+    ap.add_argument("--to-time", type=datetime.datetime.fromisoformat)
+    ap.add_argument("--last", type=float, metavar="SECONDS")
+    ap.add_argument("--bucket-sec", type=int, default=10)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.command == "build":
+        for ix in open_indexes(args.path, args.bucket_sec):
+            print(ix.stats())
+    else:
+        if args.last is not None:
+            lines = read_last(args.path, args.last, bucket_sec=args.bucket_sec)
+        else:
+            lines = list(read_range(args.path, args.from_time, args.to_time, bucket_sec=args.bucket_sec))
+        for line in lines:
+            print(line)
+    print(f"Done in {time.perf_counter() - t0:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+metrics.py
+
+Lightweight in-process metrics (histograms and counters) for pipeline observability.
+Stage-lag histograms (ingest->parse, parse->correlate, event-time->alert, ...) are
+recorded here and exposed via snapshot() or Prometheus text format.
+"""
+
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Exponential buckets: 10us .. ~45min (doubling), suitable for lags and latencies
+DEFAULT_BUCKETS = tuple(1e-5 * (2 ** i) for i in range(29))
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket histogram with approximate quantiles (upper bound of the bucket)."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1) # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return self.bounds[idx] if idx < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.50),
+            'p90': self.quantile(0.90),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, Counter]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> LabelKey:
+        return tuple(sorted(labels.items()))
+
+    def histogram(self, name: str, help: str = "", **labels) -> Histogram:
+        """Returns (creating on first use) the histogram for name + labels."""
+        key = self._key(labels)
+        family = self._histograms.get(name)
+        if family is None or key not in family:
+            with self._lock:
+                family = self._histograms.setdefault(name, {})
+                family.setdefault(key, Histogram())
+                if help:
+                    self._help.setdefault(name, help)
+        return family[key]
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        key = self._key(labels)
+        family = self._counters.get(name)
+        if family is None or key not in family:
+            with self._lock:
+                family = self._counters.setdefault(name, {})
+                family.setdefault(key, Counter())
+                if help:
+                    self._help.setdefault(name, help)
+        return family[key]
+
+    def snapshot(self) -> Dict:
+        """{'histograms': {'name{k=v}': {...}}, 'counters': {'name{k=v}': value}}"""
+        def label_str(key: LabelKey) -> str:
+            return "{" + ",".join(f"{k}={v}" for k, v in key) + "}" if key else ""
+
+        return {
+            'histograms': {f"{name}{label_str(k)}": h.snapshot()
+                           for name, fam in self._histograms.items() for k, h in fam.items()},
+            'counters': {f"{name}{label_str(k)}": c.value
+                         for name, fam in self._counters.items() for k, c in fam.items()},
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        def labels(key: LabelKey, extra: List[Tuple[str, str]] = ()) -> str:
+            items = list(key) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+        out = []
+        for name, fam in self._counters.items():
+            if name in self._help:
+                out.append(f"# HELP {name} {self._help[name]}")
+            out.append(f"# TYPE {name} counter")
+            for key, c in fam.items():
+                out.append(f"{name}{labels(key)} {c.value}")
+
+        for name, fam in self._histograms.items():
+            if name in self._help:
+                out.append(f"# HELP {name} {self._help[name]}")
+            out.append(f"# TYPE {name} histogram")
+            for key, h in fam.items():
+                cumulative = 0
+                for bound, c in zip(h.bounds, h.counts):
+                    cumulative += c
+                    out.append(f"{name}_bucket{labels(key, [('le', f'{bound:g}')])} {cumulative}")
+                out.append(f"{name}_bucket{labels(key, [('le', '+Inf')])} {h.count}")
+                out.append(f"{name}_sum{labels(key)} {h.sum}")
+                out.append(f"{name}_count{labels(key)} {h.count}")
+        return "\n".join(out) + "\n"
+
+# Global registry
+metrics = MetricsRegistry()
@@ -0,0 +1,267 @@
+"""
+profiling.py
+
+Runtime-toggleable profiling for a running pipeline (no external profiler needed).
+While active it:
+- samples all thread stacks at a fixed interval (collapsed-stack output for flamegraphs)
+- attributes CPU time to bus topics and handlers (EventBus handler timing)
+- tracks growth of registered components (e.g. correlation buffer, the ML
+  window, AssetManager.assets) and tracemalloc allocation growth per source file
+On stop it writes a JSON report plus a .collapsed stack file.
+
+Toggle with: kill -USR1 <pid>   or   bus.publish("control.profiling", "toggle")
+"""
+
+import datetime
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from ontap_intelligence.core.bus import bus as default_bus, EventBus
+
+logger = logging.getLogger(__name__)
+
+CONTROL_TOPIC = "control.profiling"
+
+
+def approx_size(obj: Any, sample: int = 100) -> int:
+    """
+    Approximate deep size of a container: shallow size plus the mean size of a
+    sample of its elements (and their __dict__), extrapolated to all elements.
+    """
+    size = sys.getsizeof(obj)
+    try:
+        n = len(obj)
+    except TypeError:
+        return size
+    if not n:
+        return size
+
+    values = obj.values() if isinstance(obj, dict) else obj
+    total, seen = 0, 0
+    for item in values:
+        total += sys.getsizeof(item)
+        if hasattr(item, '__dict__'):
+            total += sys.getsizeof(item.__dict__)
+        seen += 1
+        if seen >= sample:
+            break
+    return size + int(total / seen * n)
+
+
+class PipelineProfiler:
+    def __init__(self, report_dir: str = "profiles", sample_interval: float = 0.005,
+                 bus: EventBus = default_bus, tracemalloc_frames: int = 1):
+        self.report_dir = report_dir
+        self.sample_interval = sample_interval
+        self.bus = bus
+        self.tracemalloc_frames = tracemalloc_frames
+        self.components: Dict[str, Callable[[], Any]] = {}
+        self.active = False
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reset()
+
+    def _reset(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.started_wall: Optional[datetime.datetime] = None
+        self._cpu_start = 0.0
+        self._owns_tracemalloc = False # start() turned tracemalloc on, so stop() turns it off
+        self._component_start: Dict[str, Dict] = {}
+        self._component_peak: Dict[str, Dict] = {}
+        self._malloc_start: Optional[tracemalloc.Snapshot] = None
+
+    # --- Registration ---
+    def track(self, name: str, getter: Callable[[], Any]):
+        """Track a component's size; getter returns the current container (re-read each time)."""
+        self.components[name] = getter
+
+    def track_defaults(self, correlator=None, ml=None):
+        """
+        Tracks the pipeline's long-lived containers: the correlation buffer (of `correlator`,
+        default the global engine), the open ML window of `ml` (an MLService, if given)
+        and the global AssetManager.
+        """
+        from ontap_intelligence.core.state import state
+        if correlator is None:
+            from ontap_intelligence.intelligence.correlation import correlator
+        self.track("correlation.buffer", lambda: correlator.buffer)
+        if ml is not None:
+            self.track("ml.window", lambda: ml.window.clusters) # Re-read: each closed window is replaced
+        self.track("state.assets", lambda: state.assets)
+        self.track("state.relations", lambda: state.relations)
+
+    # --- Control surfaces ---
+    def install_signal_handler(self, signum: Optional[int] = None):
+        """
+        Toggle profiling on a signal, SIGUSR1 by default (must be called from the main thread).
+        Without SIGUSR1 (Windows) no handler is installed; use the control.profiling topic.
+        """
+        if signum is None:
+            signum = getattr(signal, "SIGUSR1", None)
+            if signum is None:
+                logger.info("No SIGUSR1 on this platform: toggle profiling via the control.profiling topic")
+                return
+        signal.signal(signum, lambda s, f: threading.Thread(target=self.toggle, daemon=True).start())
+        logger.info(f"Profiler toggles on signal {signum}")
+
+    def attach_bus_control(self):
+        """Accepts 'start' | 'stop' | 'toggle' payloads on the control.profiling topic."""
+        def _on_control(topic, payload):
+            {"start": self.start, "stop": self.stop}.get(payload, self.toggle)()
+        self.bus.subscribe(CONTROL_TOPIC, _on_control)
+
+    def toggle(self) -> Optional[str]:
+        if self.active:
+            return self.stop()
+        self.start()
+        return None
+
+    # --- Lifecycle ---
+    def start(self):
+        with self._lock:
+            if self.active:
+                return
+            self._reset()
+            self.active = True
+            self.started_at = time.monotonic()
+            self.started_wall = datetime.datetime.now()
+            self._cpu_start = time.process_time()
+
+            self.bus.reset_timing()
+            self.bus.enable_timing(True)
+
+            self._owns_tracemalloc = not tracemalloc.is_tracing()
+            if self._owns_tracemalloc:
+                tracemalloc.start(self.tracemalloc_frames)
+            self._malloc_start = tracemalloc.take_snapshot()
+            self._component_start = self._measure_components()
+            self._component_peak = dict(self._component_start)
+
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._thread.start()
+        logger.info("Profiling started.")
+
+    def stop(self) -> Optional[str]:
+        """Stops profiling and writes the report. Returns the report path."""
+        with self._lock:
+            if not self.active:
+                return None
+            self._stop_event.set()
+            if self._thread:
+                self._thread.join(timeout=2.0)
+            self.active = False
+            self.bus.enable_timing(False)
+
+            malloc_end = tracemalloc.take_snapshot()
+            if self._owns_tracemalloc: # Leave tracing that was on before us running
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+            path = self._write_report(malloc_end)
+        logger.info(f"Profiling stopped. Report: {path}")
+        return path
+
+    # --- Sampling ---
+    def _sample_loop(self):
+        me = threading.get_ident()
+        names = {}
+        last_components = time.monotonic()
+        while not self._stop_event.wait(self.sample_interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+            # Component sizes: track the peak once a second
+            if time.monotonic() - last_components >= 1.0:
+                last_components = time.monotonic()
+                for name, m in self._measure_components().items():
+                    if m['bytes'] > self._component_peak.get(name, {}).get('bytes', -1):
+                        self._component_peak[name] = m
+
+    def _measure_components(self) -> Dict[str, Dict]:
+        out = {}
+        for name, getter in self.components.items():
+            try:
+                obj = getter()
+                out[name] = {'items': len(obj), 'bytes': approx_size(obj)}
+            except Exception as e:
+                out[name] = {'items': None, 'bytes': None, 'error': str(e)}
+        return out
+
+    # --- Report ---
+    def _write_report(self, malloc_end: tracemalloc.Snapshot) -> str:
+        elapsed = time.monotonic() - self.started_at
+        cpu = time.process_time() - self._cpu_start
+
+        # CPU by bus topic and handler
+        by_topic: Dict[str, float] = {}
+        handlers = []
+        for key, st in sorted(self.bus.handler_stats.items(), key=lambda kv: -kv[1].cpu_exclusive):
+            topic = key.split(":", 1)[0]
+            by_topic[topic] = by_topic.get(topic, 0.0) + st.cpu_exclusive
+            handlers.append({'handler': key, 'calls': st.calls, 'errors': st.errors,
+                             'cpu_exclusive_s': st.cpu_exclusive, 'cpu_inclusive_s': st.cpu_inclusive})
+
+        # Allocation growth by file (component attribution) and top lines
+        by_file = malloc_end.compare_to(self._malloc_start, 'filename')
+        by_line = malloc_end.compare_to(self._malloc_start, 'lineno')
+
+        end_components = self._measure_components()
+        components = {}
+        for name, end in end_components.items():
+            start = self._component_start.get(name, {})
+            components[name] = {
+                'start': start, 'end': end, 'peak': self._component_peak.get(name, end),
+                'growth_bytes': (end.get('bytes') or 0) - (start.get('bytes') or 0),
+                'growth_items': (end.get('items') or 0) - (start.get('items') or 0),
+            }
+
+        report = {
+            'started': self.started_wall.isoformat(timespec='seconds'),
+            'duration_s': elapsed,
+            'process_cpu_s': cpu,
+            'stack_samples': self.samples,
+            'cpu_by_topic_s': by_topic,
+            'handlers': handlers,
+            'components': components,
+            'alloc_growth_by_file': [
+                {'file': str(s.traceback), 'size_diff': s.size_diff, 'count_diff': s.count_diff}
+                for s in by_file[:25]],
+            'alloc_growth_top_lines': [
+                {'line': str(s.traceback), 'size_diff': s.size_diff, 'count_diff': s.count_diff}
+                for s in by_line[:25]],
+            'top_stacks': [{'stack': k, 'samples': v} for k, v in self.stacks.most_common(25)],
+        }
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        base = os.path.join(self.report_dir, f"profile-{datetime.datetime.now():%Y%m%d-%H%M%S}")
+        with open(base + ".json", "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+        return base + ".json"
+
+# Global instance
+profiler = PipelineProfiler()
@@ -0,0 +1,240 @@
+"""
+ringbuffer.py
+
+Shared-memory ring buffer: one producer, N consumers, across processes.
+Records are [u32 length][u32 tag][payload] (8-byte aligned) in a
+multiprocessing.shared_memory segment. Every consumer sees every record
+(like a bus topic) and has its own read cursor; the producer waits for the
+slowest consumer when the ring is full (backpressure, counted in producer_waits).
+Consumers get a zero-copy memoryview of each payload, valid until their next
+read() or commit().
+
+Cursors are 8-byte aligned u64 byte positions that only ever grow; the producer
+publishes write_pos only after the record is written. This relies on aligned
+8-byte stores being atomic and stores not being reordered (x86-64; ARM64 in
+practice for CPython, whose interpreter loop separates the two stores).
+
+Also bridges EventBus topics across processes (forward_topic / pump_topic).
+"""
+
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Callable, List, Optional, Tuple
+
+MAGIC = 0x4F4E544150524E47 # "ONTAPRNG"
+WRAP = 0xFFFFFFFF
+
+# magic, capacity, consumers, closed, write_pos, producer_waits, then read_pos[i]
+_HEADER = struct.Struct("<QQQQQQ")
+_U64 = struct.Struct("<Q")
+_RECORD = struct.Struct("<II")
+_CLOSED_AT, _WRITE_AT, _WAITS_AT, _READS_AT = 24, 32, 40, 48
+
+
+def _align(n: int, to: int = 8) -> int:
+    return (n + to - 1) & ~(to - 1)
+
+
+class _Backoff:
+    """Spin briefly, then sleep with growing intervals (up to 1ms)."""
+    def __init__(self):
+        self.n = 0
+
+    def wait(self):
+        self.n += 1
+        if self.n < 50:
+            time.sleep(0)
+        else:
+            time.sleep(min(1e-3, 5e-5 * (self.n - 49)))
+
+
+class SharedRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        magic, self.capacity, self.consumers, _, _, _ = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory '{shm.name}' is not a ring buffer")
+        self.data_at = _align(_READS_AT + 8 * self.consumers, 64)
+
+    @classmethod
+    def create(cls, capacity: int = 8 << 20, consumers: int = 1, name: Optional[str] = None) -> 'SharedRing':
+        capacity = _align(capacity)
+        data_at = _align(_READS_AT + 8 * consumers, 64)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=data_at + capacity)
+        shm.buf[:data_at] = bytes(data_at)
+        _HEADER.pack_into(shm.buf, 0, MAGIC, capacity, consumers, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedRing':
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _load(self, at: int) -> int:
+        return _U64.unpack_from(self.buf, at)[0]
+
+    def _store(self, at: int, value: int):
+        _U64.pack_into(self.buf, at, value)
+
+    def producer(self) -> 'RingProducer':
+        return RingProducer(self)
+
+    def consumer(self, index: int = 0) -> 'RingConsumer':
+        if not 0 <= index < self.consumers:
+            raise IndexError(f"Consumer {index} out of range (ring has {self.consumers})")
+        return RingConsumer(self, index)
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._load(_CLOSED_AT))
+
+    def stats(self) -> dict:
+        write = self._load(_WRITE_AT)
+        reads = [self._load(_READS_AT + 8 * i) for i in range(self.consumers)]
+        return {
+            'capacity': self.capacity,
+            'used': write - min(reads),
+            'lag': [write - r for r in reads],
+            'producer_waits': self._load(_WAITS_AT),
+            'closed': self.closed,
+        }
+
+    def close(self):
+        """Detaches from the segment (and frees it, for the creator)."""
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            return # A consumer still holds a view; the OS frees the mapping at exit
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingProducer:
+    def __init__(self, ring: SharedRing):
+        self.ring = ring
+        self.write_pos = ring._load(_WRITE_AT)
+        self.waits = 0
+
+    def _min_read(self) -> int:
+        load = self.ring._load
+        return min(load(_READS_AT + 8 * i) for i in range(self.ring.consumers))
+
+    def write(self, payload, tag: int = 0, timeout: Optional[float] = None) -> bool:
+        """
+        Appends one record. Blocks while the ring is full (backpressure).
+        Returns False if `timeout` elapsed first.
+        """
+        ring = self.ring
+        cap = ring.capacity
+        size = len(payload)
+        padded = _align(_RECORD.size + size)
+        if padded > cap // 2:
+            raise ValueError(f"Record of {size} bytes too large for a {cap} byte ring")
+
+        w = self.write_pos
+        idx = w % cap
+        tail = cap - idx
+        need = padded if padded <= tail else tail + padded
+
+        if cap - (w - self._min_read()) < need:
+            # Full: wait for the slowest consumer
+            self.waits += 1
+            ring._store(_WAITS_AT, ring._load(_WAITS_AT) + 1)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            backoff = _Backoff()
+            while cap - (w - self._min_read()) < need:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                backoff.wait()
+
+        buf, base = ring.buf, ring.data_at
+        if padded > tail:
+            _RECORD.pack_into(buf, base + idx, WRAP, 0)
+            w += tail
+            idx = 0
+        _RECORD.pack_into(buf, base + idx, size, tag)
+        start = base + idx + _RECORD.size
+        buf[start:start + size] = payload
+        self.write_pos = w + padded
+        ring._store(_WRITE_AT, self.write_pos) # Publish
+        return True
+
+    def close(self):
+        """Signals end of stream; consumers drain what is left, then read() returns None."""
+        self.ring._store(_CLOSED_AT, 1)
+
+
+class RingConsumer:
+    def __init__(self, ring: SharedRing, index: int):
+        self.ring = ring
+        self.at = _READS_AT + 8 * index
+        self.read_pos = ring._load(self.at)
+        self._next = self.read_pos
+        self.eof = False
+
+    def commit(self):
+        """Releases the last record read (its memoryview must not be used afterwards)."""
+        if self._next != self.read_pos:
+            self.read_pos = self._next
+            self.ring._store(self.at, self.read_pos)
+
+    def read(self, timeout: Optional[float] = None) -> Optional[Tuple[int, memoryview]]:
+        """
+        Returns (tag, payload view) for the next record, or None on timeout or end
+        of stream (then .eof is True). Commits the previously read record.
+        """
+        self.commit()
+        ring = self.ring
+        cap, base = ring.capacity, ring.data_at
+        r = self.read_pos
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = None
+
+        while True:
+            if r < ring._load(_WRITE_AT):
+                idx = r % cap
+                size, tag = _RECORD.unpack_from(ring.buf, base + idx)
+                if size == WRAP:
+                    r += cap - idx
+                    self.read_pos = self._next = r
+                    ring._store(self.at, r)
+                    continue
+                start = base + idx + _RECORD.size
+                self._next = r + _align(_RECORD.size + size)
+                return tag, ring.buf[start:start + size]
+
+            if ring.closed and r >= ring._load(_WRITE_AT):
+                self.eof = True
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            if backoff is None:
+                backoff = _Backoff()
+            backoff.wait()
+
+
+# --- EventBus bridge ---
+def forward_topic(bus, topic: str, producer: RingProducer, encode: Callable[[Any], bytes], tag: int = 0):
+    """Writes every payload published on `topic` into the ring."""
+    bus.subscribe(topic, lambda t, payload: producer.write(encode(payload), tag))
+
+
+def pump_topic(consumer: RingConsumer, bus, topic: str, decode: Callable[[memoryview], Any],
+               stop_event: Optional[threading.Event] = None, poll: float = 0.1):
+    """Publishes each ring record on `topic` until end of stream (or stop_event)."""
+    while not (stop_event and stop_event.is_set()):
+        record = consumer.read(timeout=poll)
+        if record is None:
+            if consumer.eof:
+                break
+            continue
+        bus.publish(topic, decode(record[1]))
+    consumer.commit()
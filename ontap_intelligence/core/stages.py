@@ -0,0 +1,152 @@
+"""
+stages.py
+
+Queued pipeline stages for the EventBus.
+A StageExecutor owns a bounded queue and N worker threads. Handlers subscribed with
+stage='<name>' are called from these workers instead of the publisher's thread,
+in batches of up to batch_size. A full queue blocks the publisher (backpressure).
+Workers share one queue, so with more than one worker events are handled out of
+order. A stage partitioned by key (e.g. core/clusters.partition_key) gives each
+worker its own queue instead and routes every payload by its key: partitions run
+in parallel, and each partition's events stay in order.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class StageExecutor:
+    def __init__(self, name: str, dispatch: Callable[[str, Callable, Any], None],
+                 workers: int = 1, queue_size: int = 10000, batch_size: int = 1,
+                 partition_by: Optional[Callable[[Any], str]] = None):
+        """
+        :param dispatch: Calls one handler (EventBus.call), so error handling and
+                         handler timing are the same as for synchronous delivery.
+        :param partition_by: payload -> partition key. Payloads with the same key
+                             go to the same worker (queue_size is split between them).
+        """
+        self.name = name
+        self.dispatch = dispatch
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.partition_by = partition_by if self.workers > 1 else None
+        if self.partition_by:
+            size = max(1, queue_size // self.workers)
+            self.queues = [queue.Queue(maxsize=size) for _ in range(self.workers)]
+        else:
+            self.queues = [queue.Queue(maxsize=queue_size)]
+        self._routes: Dict[str, queue.Queue] = {} # partition key -> its worker's queue
+        self._threads = []
+        self.submitted = 0
+        self.processed = 0
+        self.blocked = 0 # Times a publisher had to wait on a full queue
+        self.max_depth = 0
+        self.dropped = 0 # Events still queued when shutdown() gave up on the workers
+        self._count_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, args=(self._worker_queue(i),),
+                                 name=f"stage-{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        partitioned = ", partitioned" if self.partition_by else ""
+        logger.info(f"Stage '{self.name}' started: {self.workers} worker(s){partitioned}, "
+                    f"queue {self.capacity()}, batch {self.batch_size}")
+
+    def _worker_queue(self, worker: int) -> queue.Queue:
+        return self.queues[worker % len(self.queues)]
+
+    def _queue_for(self, payload: Any) -> queue.Queue:
+        if self.partition_by is None:
+            return self.queues[0]
+        key = self.partition_by(payload)
+        q = self._routes.get(key)
+        if q is None:
+            # Round-robin over new keys balances a handful of clusters better than hashing
+            q = self._routes.setdefault(key, self.queues[len(self._routes) % len(self.queues)])
+        return q
+
+    def submit(self, topic: str, handler: Callable, payload: Any):
+        item = (topic, handler, payload)
+        q = self._queue_for(payload)
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            self.blocked += 1
+            q.put(item)
+        self.submitted += 1
+        depth = q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _run(self, q: queue.Queue):
+        while True:
+            batch = [q.get()]
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                else:
+                    topic, handler, payload = item
+                    self.dispatch(topic, handler, payload)
+                q.task_done()
+
+            with self._count_lock:
+                self.processed += len(batch) - stop
+            if stop:
+                return
+
+    def pending(self) -> int:
+        return sum(q.unfinished_tasks for q in self.queues)
+
+    def capacity(self) -> int:
+        return sum(q.maxsize for q in self.queues)
+
+    def shutdown(self, timeout: float = 5.0) -> int:
+        """
+        Stops workers after they finish what is already queued. Returns the number of
+        events left unprocessed (queued behind a worker that did not stop in time).
+        """
+        deadline = time.monotonic() + timeout
+        for i in range(len(self._threads)):
+            try:
+                self._worker_queue(i).put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
+        self._threads = [t for t in self._threads if t.is_alive()]
+        if self._threads:
+            self.dropped = sum(1 for q in self.queues for item in list(q.queue) if item is not _STOP)
+            logger.warning(f"Stage '{self.name}': {len(self._threads)} worker(s) did not stop in time; "
+                           f"{self.dropped} queued event(s) dropped")
+        return self.dropped
+
+    def stats(self) -> Dict:
+        return {
+            'workers': self.workers,
+            'alive': sum(1 for t in self._threads if t.is_alive()),
+            'partitions': len(self._routes),
+            'depth': sum(q.qsize() for q in self.queues),
+            'max_depth': self.max_depth,
+            'capacity': self.capacity(),
+            'batch_size': self.batch_size,
+            'submitted': self.submitted,
+            'processed': self.processed,
+            'blocked': self.blocked,
+            'dropped': self.dropped,
+        }
@@ -2,15 +2,38 @@
 state.py
 
 Maintains the system state and topology (Knowledge Graph).
+Assets are immutable: updates replace the Asset object (copy-on-write), so an
+Asset a reader holds never changes under it. Writers serialize on a lock and
+bump a version; readers take a TopologySnapshot (an immutable view of one
+version, shared until the next change) without blocking writers, and can follow
+changes_since(version) to update incrementally.
+Writers also maintain indexes (children, by type, by node) so queries cost
+O(depth) (ancestors) or O(result) (children, descendants, by type/node).
+A node is the root of an asset's parent chain (parsers use node names as parents).
+Asset ids are cluster-qualified ('<cluster>:<name>', see core/clusters.py), so
+one graph holds many clusters without collisions; the by-cluster index partitions
+it, and find(name) / get_by_type() answer cross-cluster queries.
+Memory is bounded by eviction: per-type time-to-live since an asset was last
+seen (add_or_update_asset), and an optional cap that evicts the least recently
+seen assets. Parents of live assets are kept. Evictions appear in the change
+feed as 'remove' and are passed to eviction listeners (dependent indexes).
 """
 
+import dataclasses
+import itertools
 import logging
-from dataclasses import dataclass, field
-from typing import Dict, Set, Optional, List
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Deque, Dict, Iterable, Set, Optional, List
+
+from ontap_intelligence.core.clusters import SEPARATOR, split_id
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(frozen=True)
 class Asset:
     id: str
     type: str # 'node', 'aggr', 'volume', 'disk', 'util'
@@ -18,41 +41,420 @@ class Asset:
     health_score: float = 100.0
     status: str = "ok"
 
+@dataclass(frozen=True)
+class AssetChange:
+    version: int
+    kind: str # 'upsert' or 'remove'
+    asset: Asset # New value (last value for 'remove')
+
+class TopologySnapshot:
+    """Immutable view of the graph at one version; safe to read from any thread."""
+    def __init__(self, version: int, assets: Dict[str, Asset]):
+        self.version = version
+        self.assets = MappingProxyType(assets)
+        self._children: Optional[Dict[str, List[Asset]]] = None
+
+    def __len__(self) -> int:
+        return len(self.assets)
+
+    def get_asset(self, id: str) -> Optional[Asset]:
+        return self.assets.get(id)
+
+    def _children_index(self) -> Dict[str, List[Asset]]:
+        if self._children is None:
+            # Built on first use; a benign race at worst builds it twice
+            children: Dict[str, List[Asset]] = {}
+            for asset in self.assets.values():
+                if asset.parent_id:
+                    children.setdefault(asset.parent_id, []).append(asset)
+            self._children = children
+        return self._children
+
+    def get_children(self, parent_id: str) -> List[Asset]:
+        return list(self._children_index().get(parent_id, ()))
+
+    def get_ancestors(self, id: str) -> List[Asset]:
+        return _ancestors(self.assets, id)
+
+    def get_descendants(self, id: str) -> List[Asset]:
+        index = self._children_index()
+        result: List[Asset] = []
+        stack = [id]
+        while stack:
+            for child in index.get(stack.pop(), ()):
+                result.append(child)
+                stack.append(child.id)
+        return result
+
+    def get_by_type(self, type: str) -> List[Asset]:
+        return [a for a in self.assets.values() if a.type == type]
+
+    def get_by_node(self, node: str) -> List[Asset]:
+        own = self.assets.get(node)
+        return ([own] if own else []) + self.get_descendants(node)
+
+    def get_by_cluster(self, cluster: str) -> List[Asset]:
+        return [a for a in self.assets.values() if split_id(a.id)[0] == cluster]
+
+    def find(self, name: str) -> List[Asset]:
+        """Assets named `name` in any cluster."""
+        return [a for a in self.assets.values() if split_id(a.id)[1] == name]
+
+def _ancestors(assets, id: str) -> List[Asset]:
+    """Parent first, up to the root (O(depth))."""
+    result: List[Asset] = []
+    asset = assets.get(id)
+    while asset is not None and asset.parent_id and len(result) < len(assets):
+        asset = assets.get(asset.parent_id)
+        if asset is None:
+            break
+        result.append(asset)
+    return result
+
 class AssetManager:
     """
-    Simple in-memory graph of assets.
+    In-memory graph of assets, safe for concurrent writers (parser stage workers)
+    and readers (dashboards, correlation).
     """
-    def __init__(self):
-        self.assets: Dict[str, Asset] = {}
+    def __init__(self, change_log_size: int = 100_000, clock: Callable[[], float] = time.time):
+        """
+        :param change_log_size: Changes kept for changes_since(); older readers resync from snapshot().
+        :param clock: Time source for last-seen stamps (TTL eviction).
+        """
+        self.assets: Dict[str, Asset] = {} # Live graph: written under _lock, read via snapshot()
         self.relations: Dict[str, Set[str]] = {} # parent -> children
+        self.by_type: Dict[str, Set[str]] = {}
+        self.by_node: Dict[str, Set[str]] = {} # root of the parent chain -> assets under it
+        self.by_cluster: Dict[str, Set[str]] = {}
+        self._node_of: Dict[str, str] = {}
+        self.version = 0
+        self._lock = threading.Lock()
+        self._changes: Deque[AssetChange] = deque(maxlen=change_log_size)
+        self._snapshot = TopologySnapshot(0, {})
+        # Eviction: per-type last-seen order (oldest first), see configure()
+        self.clock = clock
+        self.ttl_by_type: Dict[str, float] = {}
+        self.max_assets = 0
+        self.sweep_interval = 60.0
+        self._seen: Dict[str, "OrderedDict[str, float]"] = {}
+        self._last_sweep = clock()
+        self._evict_listeners: List[Callable[[List[Asset]], None]] = []
+        self.evicted = 0
+
+    def configure(self, ttl_by_type: Optional[Dict[str, float]] = None, max_assets: int = 0,
+                  sweep_interval: float = 60.0):
+        """
+        :param ttl_by_type: Seconds since last seen after which an asset of that type is evicted
+                            (unlisted types never expire).
+        :param max_assets: Cap on assets; beyond it the least recently seen are evicted (0 = unbounded).
+        :param sweep_interval: Minimum seconds between TTL sweeps (run from the write path).
+        """
+        self.ttl_by_type = dict(ttl_by_type or {})
+        self.max_assets = max_assets
+        self.sweep_interval = sweep_interval
+
+    def configure_from(self, cfg: dict):
+        """Applies the settings.yaml 'topology' section."""
+        self.configure(ttl_by_type=cfg.get('ttl_sec'), max_assets=cfg.get('max_assets', 0),
+                       sweep_interval=cfg.get('sweep_interval_sec', 60.0))
+
+    def add_eviction_listener(self, listener: Callable[[List[Asset]], None]):
+        """listener(evicted_assets) runs after each eviction, outside the lock, on the evicting thread."""
+        self._evict_listeners.append(listener)
+
+    def _put(self, asset: Asset):
+        """Installs a new Asset version (caller holds _lock)."""
+        self.assets[asset.id] = asset
+        self.version += 1
+        self._changes.append(AssetChange(self.version, 'upsert', asset))
+
+    # --- Index maintenance (caller holds _lock) ---
+    def _link(self, id: str, old_parent: Optional[str], new_parent: Optional[str]):
+        if old_parent:
+            siblings = self.relations.get(old_parent)
+            if siblings is not None:
+                siblings.discard(id)
+                if not siblings:
+                    del self.relations[old_parent]
+        if new_parent:
+            self.relations.setdefault(new_parent, set()).add(id)
+
+    def _root_of(self, id: str) -> str:
+        asset = self.assets.get(id)
+        while asset is not None and asset.parent_id:
+            id = asset.parent_id
+            asset = self.assets.get(id)
+        return id
+
+    def _set_node(self, id: str):
+        """Re-files `id` and its subtree under the node at the root of its parent chain."""
+        root = self._root_of(id)
+        stack = [id]
+        while stack:
+            current = stack.pop()
+            old = self._node_of.get(current)
+            if old != root:
+                if old is not None:
+                    members = self.by_node[old]
+                    members.discard(current)
+                    if not members:
+                        del self.by_node[old]
+                self.by_node.setdefault(root, set()).add(current)
+                self._node_of[current] = root
+            stack.extend(self.relations.get(current, ()))
 
-    def add_or_update_asset(self, id: str, type: str, parent_id: Optional[str] = None):
-        if id not in self.assets:
-            self.assets[id] = Asset(id=id, type=type, parent_id=parent_id)
-            logger.debug(f"Discovered new asset: {type}:{id} (Parent: {parent_id})")
-        
-        # Update parent if learned
-        if parent_id:
-            asset = self.assets[id]
-            if asset.parent_id != parent_id:
-                asset.parent_id = parent_id
-                # Add relation
-                if parent_id not in self.relations:
-                    self.relations[parent_id] = set()
-                self.relations[parent_id].add(id)
+    def _reindex(self):
+        self.relations, self.by_type, self.by_node, self._node_of = {}, {}, {}, {}
+        self.by_cluster = {}
+        now = self.clock()
+        self._seen = {}
+        for asset in self.assets.values():
+            self.by_type.setdefault(asset.type, set()).add(asset.id)
+            self.by_cluster.setdefault(split_id(asset.id)[0], set()).add(asset.id)
+            self._seen.setdefault(asset.type, OrderedDict())[asset.id] = now
+            self._link(asset.id, None, asset.parent_id)
+        for asset in self.assets.values():
+            root = self._root_of(asset.id)
+            self.by_node.setdefault(root, set()).add(asset.id)
+            self._node_of[asset.id] = root
 
+    def _touch(self, asset: Asset, now: float):
+        seen = self._seen.get(asset.type)
+        if seen is None:
+            seen = self._seen[asset.type] = OrderedDict()
+        seen[asset.id] = now
+        seen.move_to_end(asset.id)
+
+    def _remove(self, id: str) -> Asset:
+        asset = self.assets.pop(id)
+        self._link(id, asset.parent_id, None)
+        self.relations.pop(id, None)
+        for index, key in ((self.by_type, asset.type), (self.by_cluster, split_id(id)[0])):
+            members = index.get(key)
+            if members is not None:
+                members.discard(id)
+                if not members:
+                    del index[key]
+        node = self._node_of.pop(id, None)
+        if node is not None:
+            members = self.by_node[node]
+            members.discard(id)
+            if not members:
+                del self.by_node[node]
+        self.version += 1
+        self._changes.append(AssetChange(self.version, 'remove', asset))
+        self.evicted += 1
+        return asset
+
+    def _expire(self, now: float) -> List[Asset]:
+        evicted: List[Asset] = []
+        for type, ttl in self.ttl_by_type.items():
+            seen = self._seen.get(type)
+            cutoff = now - ttl
+            while seen:
+                id, last_seen = next(iter(seen.items()))
+                if last_seen >= cutoff:
+                    break
+                del seen[id]
+                if self.relations.get(id):
+                    seen[id] = now # Parent of live assets: alive while they are
+                else:
+                    evicted.append(self._remove(id))
+        self._last_sweep = now
+        return evicted
+
+    def _evict_lru(self, count: int, now: float) -> List[Asset]:
+        evicted: List[Asset] = []
+        attempts = len(self.assets)
+        while count > 0 and attempts > 0:
+            attempts -= 1
+            # Least recently seen overall: the oldest front among the (few) types
+            oldest = None
+            for type, seen in self._seen.items():
+                if seen:
+                    id, last_seen = next(iter(seen.items()))
+                    if oldest is None or last_seen < oldest[2]:
+                        oldest = (seen, id, last_seen)
+            if oldest is None:
+                break
+            seen, id, _ = oldest
+            del seen[id]
+            if self.relations.get(id):
+                seen[id] = now
+            else:
+                evicted.append(self._remove(id))
+                count -= 1
+        return evicted
+
+    def _notify_evicted(self, evicted: List[Asset]):
+        logger.debug(f"Evicted {len(evicted)} assets")
+        for listener in self._evict_listeners:
+            try:
+                listener(evicted)
+            except Exception as e:
+                logger.error(f"Error in eviction listener: {e}")
+
+    # --- Writers ---
+    def add_or_update_asset(self, id: str, type: str, parent_id: Optional[str] = None, keep_parent: bool = False):
+        """
+        Creates or updates an asset; every call also counts as a sighting (TTL).
+        :param keep_parent: parent_id is only a fallback (e.g. the node, for an event that does
+                            not name the aggregate): it is used for a new or parentless asset
+                            and never replaces a parent already learned.
+        """
+        evicted: List[Asset] = []
+        with self._lock:
+            now = self.clock()
+            asset = self.assets.get(id)
+            if asset is None:
+                if parent_id and self._creates_cycle(id, parent_id):
+                    parent_id = None
+                asset = Asset(id=id, type=type, parent_id=parent_id)
+                self._put(asset)
+                self.by_type.setdefault(type, set()).add(id)
+                self.by_cluster.setdefault(split_id(id)[0], set()).add(id)
+                self._link(id, None, parent_id)
+                self._set_node(id)
+                logger.debug(f"Discovered new asset: {type}:{id} (Parent: {parent_id})")
+
+            # Update parent if learned (e.g. a volume first seen under its node, later under its aggregate)
+            elif parent_id and asset.parent_id != parent_id and not (keep_parent and asset.parent_id) \
+                    and not self._creates_cycle(id, parent_id):
+                self._put(dataclasses.replace(asset, parent_id=parent_id))
+                self._link(id, asset.parent_id, parent_id)
+                self._set_node(id)
+            self._touch(asset, now)
+
+            if self.max_assets and len(self.assets) > self.max_assets:
+                evicted += self._evict_lru(len(self.assets) - self.max_assets, now)
+            if self.ttl_by_type and now - self._last_sweep >= self.sweep_interval:
+                evicted += self._expire(now)
+        if evicted:
+            self._notify_evicted(evicted)
+
+    def evict_expired(self) -> List[Asset]:
+        """Runs a TTL sweep now (for idle periods, when no writes trigger one)."""
+        with self._lock:
+            evicted = self._expire(self.clock()) if self.ttl_by_type else []
+        if evicted:
+            self._notify_evicted(evicted)
+        return evicted
+
+    def _creates_cycle(self, id: str, parent_id: str) -> bool:
+        # Walk parent ids, not just assets: `id` may already be named as a parent before it exists
+        current: Optional[str] = parent_id
+        while current is not None and current != id:
+            asset = self.assets.get(current)
+            current = asset.parent_id if asset else None
+        if current == id:
+            logger.warning(f"Ignoring parent {parent_id} of {id}: it would create a cycle")
+            return True
+        return False
+
+    # --- Queries (consistent at the moment of the call; O(depth) or O(result)) ---
     def get_asset(self, id: str) -> Optional[Asset]:
-        return self.assets.get(id)
+        return self.assets.get(id) # Single dict lookup: atomic, and Assets are immutable
 
     def get_children(self, parent_id: str) -> List[Asset]:
-        if parent_id in self.relations:
-            return [self.assets[child_id] for child_id in self.relations[parent_id]]
-        return []
+        with self._lock:
+            return [self.assets[c] for c in self.relations.get(parent_id, ())]
+
+    def get_ancestors(self, id: str) -> List[Asset]:
+        """Parent first, up to the root."""
+        with self._lock:
+            return _ancestors(self.assets, id)
+
+    def get_descendants(self, id: str) -> List[Asset]:
+        """The whole subtree under `id` (excluding it), parents before their children."""
+        with self._lock:
+            result: List[Asset] = []
+            stack = [id]
+            while stack:
+                for child in self.relations.get(stack.pop(), ()):
+                    result.append(self.assets[child])
+                    stack.append(child)
+            return result
+
+    def get_by_type(self, type: str, cluster: Optional[str] = None) -> List[Asset]:
+        """Assets of a type across all clusters, or in one."""
+        with self._lock:
+            ids = self.by_type.get(type, ())
+            if cluster is not None:
+                ids = ids & self.by_cluster.get(cluster, set())
+            return [self.assets[i] for i in ids]
+
+    def get_by_node(self, node: str) -> List[Asset]:
+        """Every asset whose parent chain ends at `node` (and the node's own asset, if any)."""
+        with self._lock:
+            return [self.assets[i] for i in self.by_node.get(node, ())]
+
+    def node_of(self, id: str) -> Optional[str]:
+        return self._node_of.get(id)
+
+    # --- Cross-cluster queries ---
+    def clusters(self) -> List[str]:
+        with self._lock:
+            return sorted(self.by_cluster)
+
+    def get_by_cluster(self, cluster: str) -> List[Asset]:
+        """The cluster's partition of the graph (its nodes and every asset under them)."""
+        with self._lock:
+            return [self.assets[i] for i in self.by_cluster.get(cluster, ())]
+
+    def find(self, name: str) -> List[Asset]:
+        """Assets named `name` (e.g. 'aggr1') in every cluster that has one: O(clusters)."""
+        with self._lock:
+            found = (self.assets.get(f"{cluster}{SEPARATOR}{name}") for cluster in self.by_cluster)
+            return [a for a in found if a is not None]
 
     def set_asset_health(self, id: str, score: float, status: str):
-        if id in self.assets:
-            self.assets[id].health_score = score
-            self.assets[id].status = status
+        with self._lock:
+            asset = self.assets.get(id)
+            if asset is not None and (asset.health_score, asset.status) != (score, status):
+                self._put(dataclasses.replace(asset, health_score=score, status=status))
+
+    def stats(self) -> Dict:
+        return {
+            'assets': len(self.assets),
+            'by_type': {type: len(ids) for type, ids in self.by_type.items()},
+            'clusters': len(self.by_cluster),
+            'version': self.version,
+            'evicted': self.evicted,
+        }
+
+    # --- Readers ---
+    def snapshot(self) -> TopologySnapshot:
+        """
+        Immutable view of the current version. Unchanged graphs return the cached
+        snapshot without locking; otherwise writers wait only for a shallow dict copy.
+        """
+        snap = self._snapshot
+        if snap.version == self.version:
+            return snap
+        with self._lock:
+            if self._snapshot.version != self.version:
+                self._snapshot = TopologySnapshot(self.version, dict(self.assets))
+            return self._snapshot
+
+    def changes_since(self, version: int) -> Optional[List[AssetChange]]:
+        """
+        Changes after `version`, oldest first. None if they are no longer in the
+        change log: the caller should resync from snapshot().
+        """
+        with self._lock:
+            if version >= self.version:
+                return []
+            if not self._changes or self._changes[0].version > version + 1:
+                return None
+            return list(itertools.islice(self._changes, version + 1 - self._changes[0].version, None))
+
+    def load_assets(self, assets: Iterable[Asset]):
+        """Replaces the whole graph (restore from a checkpoint)."""
+        with self._lock:
+            self.assets = {a.id: a for a in assets}
+            self._reindex()
+            self.version += 1
+            self._changes.clear() # Readers behind this point resync from snapshot()
 
 # Global State
 state = AssetManager()
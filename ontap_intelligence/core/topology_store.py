@@ -0,0 +1,190 @@
+"""
+topology_store.py
+
+Persistent topology: an SQLite table of assets behind AssetManager.
+- Writes are incremental: a background thread follows AssetManager.changes_since()
+  every flush_interval and upserts/deletes only the assets that changed, one
+  transaction per batch. If it falls behind the change log it rewrites the table
+  from a snapshot.
+- Startup is a single bulk SELECT into AssetManager.load_assets(), so relations
+  learned from rare events (monitor.volume.nearlyFull) survive restarts.
+Relations are the parent_id column (indexed), so they persist with their asset.
+The schema version is SQLite's user_version. Databases from before asset ids were
+cluster-qualified (version 0: 'vol1' instead of 'ontap-cluster-01:vol1') are
+upgraded in place when opened.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ontap_intelligence.core.clusters import SEPARATOR, qualify
+from ontap_intelligence.core.state import Asset, AssetManager, state
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1 # 1: cluster-qualified asset ids (see core/clusters.py)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    parent_id TEXT,
+    health_score REAL NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_parent ON assets (parent_id);
+"""
+_UPSERT = "INSERT OR REPLACE INTO assets (id, type, parent_id, health_score, status) VALUES (?, ?, ?, ?, ?)"
+_DELETE = "DELETE FROM assets WHERE id = ?"
+_SELECT = "SELECT id, type, parent_id, health_score, status FROM assets"
+
+
+def _row(asset: Asset):
+    return asset.id, asset.type, asset.parent_id, asset.health_score, asset.status
+
+
+def qualify_rows(rows: List[Tuple]) -> List[Tuple]:
+    """
+    Version-0 rows with cluster-qualified ids: each bare asset id (and bare parent)
+    gets the cluster of the node at the root of its parent chain. Node ids and ids
+    that are already qualified are kept. Assets with no node above them cannot be
+    placed in a cluster and are dropped (the logs rediscover them).
+    """
+    by_id = {row[0]: row for row in rows}
+
+    def is_asset(asset_id: str) -> bool:
+        return asset_id in by_id and by_id[asset_id][1] != "node"
+
+    def node_above(asset_id: str) -> Optional[str]:
+        current, seen = asset_id, set()
+        while is_asset(current) and current not in seen:
+            seen.add(current)
+            current = by_id[current][2]
+        return None if current in seen else current # None: parentless (or a cycle)
+
+    out = []
+    for asset_id, type, parent_id, health, status in rows:
+        node = node_above(asset_id) if is_asset(asset_id) else asset_id
+        if node is None:
+            if SEPARATOR not in asset_id:
+                continue
+            node = asset_id # Already qualified: kept as is
+        rename = lambda a: qualify(node, a) if a and is_asset(a) and SEPARATOR not in a else a
+        out.append((rename(asset_id), type, rename(parent_id), health, status))
+    return out
+
+
+class TopologyStore:
+    def __init__(self, path: str = "state/topology.db", assets: AssetManager = state,
+                 flush_interval: float = 5.0):
+        self.path = path
+        self.assets = assets
+        self.flush_interval = flush_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._upgrade()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.version: Optional[int] = None # AssetManager.version persisted so far
+        self.flushes = 0
+        self.rows_written = 0
+        self.resyncs = 0
+        self.last_flush_s = 0.0
+
+    @classmethod
+    def from_config(cls, cfg: dict, suffix: str = "") -> 'TopologyStore':
+        """Builds a store from the settings.yaml 'topology.store' section."""
+        path = cfg.get('path', "state/topology.db")
+        if suffix:
+            root, ext = os.path.splitext(path)
+            path = f"{root}-{suffix}{ext}"
+        return cls(path, flush_interval=cfg.get('flush_interval_sec', 5.0))
+
+    def _upgrade(self):
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version >= SCHEMA_VERSION:
+            return
+        with self._db:
+            rows = self._db.execute(_SELECT).fetchall()
+            if rows:
+                upgraded = qualify_rows(rows)
+                self._db.execute("DELETE FROM assets")
+                self._db.executemany(_UPSERT, upgraded)
+                logger.info(f"Upgraded {self.path}: cluster-qualified {len(upgraded)} assets "
+                            f"({len(rows) - len(upgraded)} without a node dropped)")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def load(self) -> int:
+        """Bulk-loads the stored graph into the AssetManager. Returns the asset count."""
+        start = time.perf_counter()
+        with self._lock:
+            rows = self._db.execute(_SELECT).fetchall()
+        self.assets.load_assets(Asset(*row) for row in rows)
+        self.version = self.assets.version
+        logger.info(f"Loaded {len(rows)} assets from {self.path} in {time.perf_counter() - start:.2f}s")
+        return len(rows)
+
+    def start(self):
+        if self.version is None:
+            self.version = -1 # Not loaded: first flush writes a full snapshot
+        self._thread = threading.Thread(target=self._run, name="topology-store", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Topology store flush failed: {e}")
+
+    def flush(self) -> int:
+        """Writes changes since the last flush in one transaction. Returns rows written."""
+        start = time.perf_counter()
+        changes = self.assets.changes_since(self.version) if self.version >= 0 else None
+        with self._lock, self._db:
+            if changes is None:
+                # Behind the change log (or never synced): rewrite from a snapshot
+                snap = self.assets.snapshot()
+                self._db.execute("DELETE FROM assets")
+                self._db.executemany(_UPSERT, (_row(a) for a in snap.assets.values()))
+                written, self.version = len(snap), snap.version
+                self.resyncs += 1
+            elif changes:
+                latest = {c.asset.id: c for c in changes} # Last change per asset
+                self._db.executemany(_UPSERT, (_row(c.asset) for c in latest.values() if c.kind == 'upsert'))
+                self._db.executemany(_DELETE, ((c.asset.id,) for c in latest.values() if c.kind == 'remove'))
+                written, self.version = len(latest), changes[-1].version
+            else:
+                return 0
+        self.flushes += 1
+        self.rows_written += written
+        self.last_flush_s = time.perf_counter() - start
+        return written
+
+    def close(self):
+        """Final flush, then closes the database."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'version': self.version,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'resyncs': self.resyncs,
+            'last_flush_s': self.last_flush_s,
+        }
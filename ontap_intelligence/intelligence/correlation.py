@@ -4,15 +4,26 @@ correlation.py
 Correlates UnifiedEvents to detect incidents (Failure Cascades).
 Listens to: 'event.unified'
 Publishes: 'event.incident'
+
+A disk failure paired with its aggregate's degradation also teaches the topology
+which aggregate the disk belongs to (parsers only see the disk's node), so the
+health roll-up of later events on the disk passes through the aggregate.
+
+Rules match events of one cluster, so the window buffer is partitioned by
+cluster: each partition is pruned and scanned on its own, and partitions can be
+processed in parallel (a stage partitioned by cluster, see core/stages.py).
 """
 
 from ontap_intelligence.core.bus import bus
-from ontap_intelligence.core.state import state
+from ontap_intelligence.core.codec import decode_event, encode_event
+from ontap_intelligence.core.metrics import metrics
+from ontap_intelligence.core.state import AssetManager, state
 from ontap_intelligence.parsers.base import UnifiedEvent
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import List, Dict, Optional
 import datetime
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -24,32 +35,56 @@ class Incident:
     root_cause_event: UnifiedEvent
     related_events: List[UnifiedEvent] = field(default_factory=list)
     timestamp: datetime.datetime = field(default_factory=datetime.datetime.now)
+    # Stage tracing (time.monotonic()): ingest of the triggering line, and detection
+    ingest_ts: Optional[float] = None
+    detected_ts: float = field(default_factory=time.monotonic)
+    cluster: str = ""
 
 class CorrelationEngine:
-    def __init__(self, window_seconds=60):
+    def __init__(self, window_seconds=60, assets: AssetManager = state):
         self.window = datetime.timedelta(seconds=window_seconds)
-        self.buffer: List[UnifiedEvent] = []
+        self.assets = assets
+        self.buffers: Dict[str, List[UnifiedEvent]] = {} # cluster -> events in the window
+        self.parse_lag = metrics.histogram(
+            "parse_to_correlate_seconds", "Lag from parse to CorrelationEngine")
+        self.event_alert_lag = metrics.histogram(
+            "event_to_alert_seconds", "Event timestamp (wall) to alert", kind="incident")
+        self.ingest_alert_lag = metrics.histogram(
+            "ingest_to_alert_seconds", "LogIngestor read to alert", kind="incident")
         
     def start(self):
-        bus.subscribe("event.unified", self._handle_event)
+        bus.subscribe("event.unified", self._handle_event, stage="correlate")
         logger.info("CorrelationEngine started.")
 
     def _handle_event(self, topic, event: UnifiedEvent):
-        # 1. Add to buffer
-        self.buffer.append(event)
-        self._prune_buffer()
+        if event.parse_ts is not None:
+            self.parse_lag.observe(time.monotonic() - event.parse_ts)
+
+        # 1. Add to the cluster's buffer
+        cluster = event.cluster
+        buffer = self.buffers.get(cluster)
+        if buffer is None:
+            buffer = self.buffers[cluster] = []
+        buffer.append(event)
+        buffer = self._prune_buffer(cluster)
         
         # 2. Check for patterns
-        self._check_disk_raid_cascade(event)
+        self._check_disk_raid_cascade(event, buffer)
+
+    @property
+    def buffer(self) -> List[UnifiedEvent]:
+        """Every buffered event, across clusters."""
+        return [e for buffer in list(self.buffers.values()) for e in buffer]
 
-    def _prune_buffer(self):
-        """Remove old events outside the window."""
-        if not self.buffer: return
-        now = self.buffer[-1].timestamp
+    def _prune_buffer(self, cluster: str) -> List[UnifiedEvent]:
+        """Remove old events outside the window (one cluster's partition)."""
+        buffer = self.buffers[cluster]
+        now = buffer[-1].timestamp
         cutoff = now - self.window
-        self.buffer = [e for e in self.buffer if e.timestamp >= cutoff]
+        buffer = self.buffers[cluster] = [e for e in buffer if e.timestamp >= cutoff]
+        return buffer
 
-    def _check_disk_raid_cascade(self, current_event: UnifiedEvent):
+    def _check_disk_raid_cascade(self, current_event: UnifiedEvent, buffer: List[UnifiedEvent]):
         """
         Scenario: RAID Group Degraded (Current) -> Caused by Disk Failure (Past)
         """
@@ -60,7 +95,7 @@ class CorrelationEngine:
             
             # Find recent 'disk.outOfService' on same node
             candidates = [
-                e for e in self.buffer 
+                e for e in buffer 
                 if e.event_name == 'disk.outOfService' 
                 and e.node == current_event.node
                 and e != current_event
@@ -69,17 +104,41 @@ class CorrelationEngine:
             if candidates:
                 # Found the root cause!
                 root_cause = candidates[-1] # Most recent disk fail
+                if root_cause.asset_id and current_event.asset_id:
+                    # The pairing is the only evidence of the disk's aggregate
+                    self.assets.add_or_update_asset(root_cause.asset_id, "disk", parent_id=current_event.asset_id)
                 
                 incident = Incident(
                     id=f"INC-{int(datetime.datetime.now().timestamp())}",
                     description=f"Aggregate {current_event.asset_id} degraded due to Disk Failure {root_cause.asset_id}",
                     severity="CRITICAL",
                     root_cause_event=root_cause,
-                    related_events=[current_event]
+                    related_events=[current_event],
+                    ingest_ts=current_event.ingest_ts,
+                    cluster=current_event.cluster
                 )
+                self._observe_alert(incident, current_event)
                 
                 bus.publish("event.incident", incident)
                 logger.info(f"🔥 INCIDENT DETECTED: {incident.description}")
 
+    def checkpoint_state(self) -> dict:
+        return {'buffers': {cluster: [encode_event(e) for e in buffer]
+                            for cluster, buffer in self.buffers.items()}}
+
+    def restore_state(self, saved: dict):
+        if 'buffer' in saved: # Checkpoint from before cluster partitions
+            saved = {'buffers': {None: saved['buffer']}}
+        self.buffers = {}
+        for encoded in saved['buffers'].values():
+            for data in encoded:
+                event = decode_event(data)[0]
+                self.buffers.setdefault(event.cluster, []).append(event)
+
+    def _observe_alert(self, incident: Incident, trigger: UnifiedEvent):
+        self.event_alert_lag.observe(max(0.0, (incident.timestamp - trigger.timestamp).total_seconds()))
+        if incident.ingest_ts is not None:
+            self.ingest_alert_lag.observe(incident.detected_ts - incident.ingest_ts)
+
 # Global Instance
 correlator = CorrelationEngine()
@@ -0,0 +1,116 @@
+"""
+features.py
+
+Incremental, mergeable window features for MLService.
+WindowFeatures accumulates the model's feature row one UnifiedEvent at a time,
+so a window never needs its events kept around, and partial windows from
+several shards combine with merge().
+ClusterWindows partitions one window by cluster: each cluster's features
+accumulate independently, and their merge is the fleet-wide row the model scores.
+"""
+
+import datetime
+from typing import Dict, Optional
+
+from ontap_intelligence.intelligence.sketches import WindowSketches
+from ontap_intelligence.parsers.base import UnifiedEvent
+
+# Column order the IsolationForest was trained on (src/train_model.py)
+FEATURE_COLUMNS = ['log_count', 'error_count', 'warning_count', 'vol_full_events', 'avg_latency', 'unique_nodes']
+
+
+class WindowFeatures:
+    def __init__(self):
+        self.log_count = 0
+        self.error_count = 0
+        self.warning_count = 0
+        self.vol_full_events = 0
+        self.latency_sum = 0.0
+        self.sketches = WindowSketches() # Distinct counts / top-K
+        self.first_ts: Optional[datetime.datetime] = None
+        self.last_ts: Optional[datetime.datetime] = None
+        self.ingest_ts: Optional[float] = None # Oldest ingest time in the window
+
+    def __len__(self) -> int:
+        return self.log_count
+
+    def update(self, event: UnifiedEvent):
+        self.log_count += 1
+        if event.severity == 'ERROR':
+            self.error_count += 1
+        elif event.severity == 'WARN':
+            self.warning_count += 1
+        if event.event_name == 'monitor.volume.nearlyFull':
+            self.vol_full_events += 1
+        self.latency_sum += event.parsed_fields.get('latency', 0)
+        self.sketches.update(event)
+
+        if self.first_ts is None:
+            self.first_ts = event.timestamp
+        self.last_ts = event.timestamp
+        if event.ingest_ts is not None and (self.ingest_ts is None or event.ingest_ts < self.ingest_ts):
+            self.ingest_ts = event.ingest_ts
+
+    def merge(self, other: 'WindowFeatures'):
+        self.log_count += other.log_count
+        self.error_count += other.error_count
+        self.warning_count += other.warning_count
+        self.vol_full_events += other.vol_full_events
+        self.latency_sum += other.latency_sum
+        self.sketches.merge(other.sketches)
+
+        if other.first_ts is not None and (self.first_ts is None or other.first_ts < self.first_ts):
+            self.first_ts = other.first_ts
+        if other.last_ts is not None and (self.last_ts is None or other.last_ts > self.last_ts):
+            self.last_ts = other.last_ts
+        if other.ingest_ts is not None and (self.ingest_ts is None or other.ingest_ts < self.ingest_ts):
+            self.ingest_ts = other.ingest_ts
+
+    def features(self) -> Dict[str, float]:
+        """Feature row: FEATURE_COLUMNS plus every sketch cardinality."""
+        return {
+            'log_count': self.log_count,
+            'error_count': self.error_count,
+            'warning_count': self.warning_count,
+            'vol_full_events': self.vol_full_events,
+            'avg_latency': self.latency_sum / self.log_count if self.log_count else 0.0,
+            **self.sketches.cardinalities()
+        }
+
+
+class ClusterWindows:
+    """One time window of WindowFeatures, partitioned by cluster."""
+    def __init__(self):
+        self.clusters: Dict[str, WindowFeatures] = {}
+
+    def __len__(self) -> int:
+        return self.log_count
+
+    @property
+    def log_count(self) -> int:
+        return sum(wf.log_count for wf in self.clusters.values())
+
+    def update(self, event: UnifiedEvent):
+        wf = self.clusters.get(event.cluster)
+        if wf is None:
+            wf = self.clusters[event.cluster] = WindowFeatures()
+        wf.update(event)
+
+    def merge(self, other: 'ClusterWindows'):
+        for cluster, wf in other.clusters.items():
+            mine = self.clusters.get(cluster)
+            if mine is None:
+                mine = self.clusters[cluster] = WindowFeatures() # A copy: never share other's partitions
+            mine.merge(wf)
+
+    def merged(self) -> WindowFeatures:
+        """All clusters combined (a new WindowFeatures; the partitions are unchanged)."""
+        total = WindowFeatures()
+        for wf in self.clusters.values():
+            total.merge(wf)
+        return total
+
+    def by_cluster(self) -> Dict[str, Dict[str, float]]:
+        """Model feature columns per cluster."""
+        return {cluster: {col: value for col, value in wf.features().items() if col in FEATURE_COLUMNS}
+                for cluster, wf in sorted(self.clusters.items())}
@@ -0,0 +1,146 @@
+"""
+health.py
+
+Derives per-asset health from UnifiedEvent impact levels and rolls it up the topology.
+Listens to: 'event.unified'
+Updates: Asset.health_score / status (AssetManager.set_asset_health)
+
+Each event adds a penalty of impact_level^2 (10 = outage = 100) to its asset and
+rollup_factor^k of it to the asset's k-th ancestor (volume -> aggregate -> node;
+disk -> node until correlation pairs a failure of the disk with its aggregate's
+degradation, disk -> aggregate -> node for events after that). Penalties decay
+exponentially (half_life_sec of event time). Since every penalty decays at the
+same rate, an asset's total penalty (its own plus its subtree's share) is a single
+decayed accumulator, so an event only touches the assets on its ancestor path -
+O(depth), never the graph.
+health_score = 100 - penalty (floored at 0). A periodic sweep applies decay to
+assets that see no new events, so they recover, and forgets healed ones.
+"""
+
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+from ontap_intelligence.core.bus import bus
+from ontap_intelligence.core.codec import EPOCH
+from ontap_intelligence.core.state import AssetManager, state
+from ontap_intelligence.parsers.base import UnifiedEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 32 # Guards the path walk against a corrupt parent chain
+HEALED = 0.5 # Penalties below this are dropped (health rounds to 100)
+
+
+class HealthEngine:
+    def __init__(self, assets: AssetManager = state, half_life_sec: float = 600.0, rollup_factor: float = 0.5,
+                 sweep_interval_sec: float = 30.0, degraded_below: float = 80.0, critical_below: float = 50.0):
+        """
+        :param rollup_factor: Share of a child's penalty its parent inherits (per level).
+        :param sweep_interval_sec: Event time between decay sweeps over all penalized assets.
+        """
+        self.assets = assets
+        self.decay_rate = math.log(2) / half_life_sec
+        self.rollup_factor = rollup_factor
+        self.sweep_interval = sweep_interval_sec
+        self.degraded_below = degraded_below
+        self.critical_below = critical_below
+        self.penalties: Dict[str, Tuple[float, float]] = {} # id -> (penalty, as of event time)
+        self.clock: Optional[float] = None # Newest event time seen (seconds since epoch)
+        self._last_sweep: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, cfg: dict, assets: AssetManager = state) -> 'HealthEngine':
+        """Builds an engine from the settings.yaml 'intelligence.health' section."""
+        return cls(assets, half_life_sec=cfg.get('half_life_sec', 600.0),
+                   rollup_factor=cfg.get('rollup_factor', 0.5),
+                   sweep_interval_sec=cfg.get('sweep_interval_sec', 30.0))
+
+    def start(self):
+        bus.subscribe("event.unified", self._handle_event, stage="health")
+        self.assets.add_eviction_listener(self._handle_evicted)
+        logger.info("HealthEngine started.")
+
+    def _handle_evicted(self, assets):
+        # Runs on the parsing thread; a concurrent _add can re-create an entry, which then heals away
+        for asset in assets:
+            self.penalties.pop(asset.id, None)
+
+    def _handle_event(self, topic, event: UnifiedEvent):
+        self.update(event)
+
+    def update(self, event: UnifiedEvent):
+        now = (event.timestamp - EPOCH).total_seconds()
+        if self.clock is None or now > self.clock:
+            self.clock = now
+
+        if event.impact_level > 0:
+            penalty = float(event.impact_level ** 2)
+            for depth, asset_id in enumerate(self._path(event)):
+                self._add(asset_id, penalty * self.rollup_factor ** depth, now)
+
+        if self._last_sweep is None:
+            self._last_sweep = self.clock
+        elif self.clock - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def _path(self, event: UnifiedEvent) -> List[str]:
+        """The event's asset, then its ancestors up to the node."""
+        path: List[str] = []
+        current = event.asset_id or event.node
+        while current and current not in path and len(path) < MAX_DEPTH:
+            path.append(current)
+            asset = self.assets.get_asset(current)
+            # Assets unknown to the topology are attributed to the event's node
+            current = asset.parent_id if asset is not None else event.node
+        return path
+
+    def _decayed(self, penalty: float, as_of: float, now: float) -> float:
+        return penalty * math.exp(-self.decay_rate * max(0.0, now - as_of))
+
+    def _add(self, asset_id: str, amount: float, now: float):
+        prev = self.penalties.get(asset_id)
+        if prev is None:
+            value, as_of = amount, now
+        else:
+            value, as_of = self._decayed(prev[0], prev[1], now) + amount, max(prev[1], now)
+        self.penalties[asset_id] = (value, as_of)
+        self._publish(asset_id, value)
+
+    def _publish(self, asset_id: str, penalty: float):
+        score = round(max(0.0, 100.0 - penalty), 1)
+        if score < self.critical_below:
+            status = "critical"
+        elif score < self.degraded_below:
+            status = "degraded"
+        else:
+            status = "ok"
+        self.assets.set_asset_health(asset_id, score, status) # No-op if unchanged or not an asset
+
+    def sweep(self):
+        """Applies decay up to the newest event time to every penalized asset."""
+        now = self.clock
+        for asset_id, (penalty, as_of) in list(self.penalties.items()):
+            value = self._decayed(penalty, as_of, now)
+            if value < HEALED:
+                self.penalties.pop(asset_id, None) # May race an eviction
+                value = 0.0
+            else:
+                self.penalties[asset_id] = (value, max(as_of, now))
+            self._publish(asset_id, value)
+        self._last_sweep = now
+
+    def health(self, asset_id: str) -> float:
+        """Current health of any id on a path (including nodes without an Asset)."""
+        entry = self.penalties.get(asset_id)
+        if entry is None:
+            return 100.0
+        return max(0.0, 100.0 - self._decayed(entry[0], entry[1], self.clock))
+
+    def checkpoint_state(self) -> Dict:
+        return {'penalties': self.penalties, 'clock': self.clock, 'last_sweep': self._last_sweep}
+
+    def restore_state(self, saved: Dict):
+        self.penalties = saved['penalties']
+        self.clock = saved['clock']
+        self._last_sweep = saved['last_sweep']
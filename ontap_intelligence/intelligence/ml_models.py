@@ -4,29 +4,56 @@ ml_models.py
 Machine Learning Service for Anomaly Detection.
 Listens to: 'event.unified'
 Publishes: 'event.anomaly'
+
+Window features are kept per cluster (ClusterWindows); the model, trained on
+fleet-wide windows, scores their merge, and anomalies carry the per-cluster rows.
 """
 
 from ontap_intelligence.core.bus import bus
+from ontap_intelligence.core.metrics import metrics
 from ontap_intelligence.parsers.base import UnifiedEvent
+from ontap_intelligence.intelligence.features import FEATURE_COLUMNS, ClusterWindows, WindowFeatures
 import pandas as pd
 import joblib
 import os
 import datetime
 import logging
-from typing import List
+import time
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
 class MLService:
-    def __init__(self, model_path="models/iso_forest.pkl"):
+    def __init__(self, model_path="models/iso_forest.pkl", window_seconds=10, clock="wall",
+                 anomaly_threshold=None):
+        """
+        :param clock: 'wall' closes windows on wall time (live tail);
+                      'event' closes them on event timestamps (replay, backtests, benchmarks).
+        :param anomaly_threshold: Flag windows whose IsolationForest score_samples() is below
+                                  this value. None uses the model's own cut-off (predict() == -1).
+        """
+        self.anomaly_threshold = anomaly_threshold
         self.model_path = model_path
         self.model = None
-        self.buffer: List[UnifiedEvent] = []
-        self.window_size = datetime.timedelta(seconds=10) # 10s aggregation for live ML
+        self.window = ClusterWindows() # Incremental features of the open window, per cluster
+        self.window_size = datetime.timedelta(seconds=window_seconds) # 10s aggregation for live ML
+        self.clock = clock
         self.last_predict_time = datetime.datetime.now()
+        self.window_start = None # Event-time start of the open window (clock='event')
+        self.last_window = {} # Sketch summary of the last closed window (for dashboards)
+        self.parse_lag = metrics.histogram(
+            "parse_to_ml_seconds", "Lag from parse to MLService")
+        self.event_alert_lag = metrics.histogram(
+            "event_to_alert_seconds", "Event timestamp (wall) to alert", kind="anomaly")
+        self.ingest_alert_lag = metrics.histogram(
+            "ingest_to_alert_seconds", "LogIngestor read to alert", kind="anomaly")
 
     def start(self):
-        # Load Model
+        self.load_model()
+        bus.subscribe("event.unified", self._handle_event, stage="ml")
+        logger.info("MLService started.")
+
+    def load_model(self):
         if os.path.exists(self.model_path):
             try:
                 self.model = joblib.load(self.model_path)
@@ -36,67 +63,70 @@ class MLService:
         else:
             logger.warning("ML Model not found. Anomaly detection disabled.")
 
-        bus.subscribe("event.unified", self._handle_event)
-        logger.info("MLService started.")
-
     def _handle_event(self, topic, event: UnifiedEvent):
-        self.buffer.append(event)
+        if event.parse_ts is not None:
+            self.parse_lag.observe(time.monotonic() - event.parse_ts)
+
+        if self.clock == "event":
+            # Event that falls past the window closes it and opens the next one
+            if self.window_start is None:
+                self.window_start = event.timestamp
+            elif event.timestamp - self.window_start >= self.window_size:
+                self._close_window()
+                self.window_start = event.timestamp
+            self.window.update(event)
+            return
+
+        self.window.update(event)
         
         # Check if window closed
         now = datetime.datetime.now()
         if now - self.last_predict_time >= self.window_size:
-            self._run_inference()
+            self._close_window()
             self.last_predict_time = now
-            self.buffer = [] # Clear buffer after window
 
-    def _run_inference(self):
-        if not self.model or not self.buffer:
+    def _close_window(self):
+        window, self.window = self.window, ClusterWindows()
+        self.score_window(window)
+
+    def checkpoint_state(self) -> Dict:
+        return {'window': self.window, 'window_start': self.window_start, 'last_window': self.last_window}
+
+    def restore_state(self, saved: Dict):
+        self.window = saved['window']
+        self.window_start = saved['window_start']
+        self.last_window = saved['last_window']
+        self.last_predict_time = datetime.datetime.now() # Wall clock: the restored window restarts
+
+    def score_window(self, clusters: ClusterWindows):
+        """Scores one closed window (also used for windows merged from shards)."""
+        window = clusters.merged()
+        self.last_window = window.sketches.summary()
+        if not self.model or not window.log_count:
             return
 
-        # 1. Feature Engineering (On the fly)
-        # We need to map UnifiedEvents back to the features the model expects:
-        # [log_count, error_count, warning_count, vol_full_events, avg_latency, unique_nodes]
-        
-        df = pd.DataFrame([vars(e) for e in self.buffer])
-        
-        # Helper to check event type
-        df['is_error'] = df['severity'].apply(lambda s: 1 if s == 'ERROR' else 0)
-        df['is_warning'] = df['severity'].apply(lambda s: 1 if s == 'WARN' else 0)
-        df['is_vol_full'] = df['event_name'] == 'monitor.volume.nearlyFull'
-        
-        # Extract latency
-        def get_latency(e):
-            return e.parsed_fields.get('latency', 0)
-        
-        df['latency_val'] = df.apply(lambda row: row['parsed_fields'].get('latency', 0), axis=1)
-
-        # Aggregate
-        features = pd.DataFrame([{
-            'log_count': len(df),
-            'error_count': df['is_error'].sum(),
-            'warning_count': df['is_warning'].sum(),
-            'vol_full_events': df['is_vol_full'].sum(),
-            'avg_latency': df['latency_val'].mean(),
-            'unique_nodes': df['node'].nunique()
-        }]).fillna(0)
+        # 1. Features (accumulated per event; distinct counts come from the window sketches)
+        features = window.features()
 
         # 2. Predict
         try:
             # Reorder columns to match training
-            cols = ['log_count', 'error_count', 'warning_count', 'vol_full_events', 'avg_latency', 'unique_nodes']
-            X = features[cols]
+            X = pd.DataFrame([features])[FEATURE_COLUMNS]
             
             score = self.model.decision_function(X)[0]
-            pred = self.model.predict(X)[0]
+            if self.anomaly_threshold is None:
+                is_anomaly = self.model.predict(X)[0] == -1
+            else:
+                is_anomaly = self.model.score_samples(X)[0] < self.anomaly_threshold
 
-            if pred == -1:
+            if is_anomaly:
                 # Anomaly!
-                self._publish_anomaly(score, features.iloc[0])
+                self._publish_anomaly(score, features, window, clusters)
 
         except Exception as e:
             logger.error(f"Inference error: {e}")
 
-    def _publish_anomaly(self, score, feats):
+    def _publish_anomaly(self, score, feats: Dict, window: WindowFeatures, clusters: ClusterWindows):
         # Generate Explanation
         reasons = []
         if feats['error_count'] > 2: reasons.append(f"High Error Rate ({int(feats['error_count'])})")
@@ -105,13 +135,28 @@ class MLService:
         
         explanation = ", ".join(reasons) if reasons else "Unknown deviation from baseline"
 
+        now = datetime.datetime.now()
+        detected_ts = time.monotonic()
+        # Oldest line in the window: worst-case lag of this alert
+        ingest_ts: Optional[float] = window.ingest_ts
+
         anomaly_event = {
             "type": "anomaly",
             "score": score,
             "explanation": explanation,
-            "timestamp": datetime.datetime.now(),
-            "metrics": feats.to_dict()
+            "timestamp": now,
+            "metrics": feats,
+            "clusters": clusters.by_cluster(),
+            "top_k": window.sketches.top_k(),
+            "window_start": window.first_ts,
+            "window_end": window.last_ts,
+            "ingest_ts": ingest_ts,
+            "detected_ts": detected_ts
         }
+
+        self.event_alert_lag.observe(max(0.0, (now - window.last_ts).total_seconds()))
+        if ingest_ts is not None:
+            self.ingest_alert_lag.observe(detected_ts - ingest_ts)
         
         bus.publish("event.anomaly", anomaly_event)
         logger.info(f"🤖 ML ANOMALY: Score {score:.3f} | {explanation}")
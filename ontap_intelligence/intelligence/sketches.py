@@ -0,0 +1,204 @@
+"""
+sketches.py
+
+Fixed-memory, mergeable sketches for high-cardinality window features.
+- HyperLogLog: approximate distinct counts (volumes, LIFs, workloads, users).
+- SpaceSaving: heavy hitters / top-K (event types, volumes, LIFs).
+WindowSketches bundles them per aggregation window for MLService and the dashboards.
+"""
+
+import hashlib
+import math
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ontap_intelligence.core.clusters import qualify
+from ontap_intelligence.parsers.base import UnifiedEvent
+
+
+def _hash64(value: str) -> int:
+    """Stable 64-bit hash (unlike hash(), identical across processes)."""
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter.
+    Memory is 2^precision bytes regardless of cardinality (4 KB at p=12, ~1.6% error).
+    """
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._value_bits = 64 - precision
+        self._value_mask = (1 << self._value_bits) - 1
+
+    def add(self, value: str):
+        h = _hash64(value)
+        idx = h >> self._value_bits
+        w = h & self._value_mask
+        rank = self._value_bits - w.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        """In-place union with another sketch of the same precision."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        regs = self.registers
+        for i, r in enumerate(other.registers):
+            if r > regs[i]:
+                regs[i] = r
+
+    def count(self) -> int:
+        m = self.m
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        # Small range correction (linear counting) keeps low counts near-exact
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def __len__(self) -> int:
+        return self.count()
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary with a fixed number of counters.
+    Each reported count over-estimates the true count by at most its error.
+    """
+    def __init__(self, capacity: int = 32):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, item: str, weight: int = 1):
+        if item in self.counts:
+            self.counts[item] += weight
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+            return
+
+        # Replace the minimum counter; the newcomer inherits its count as error
+        victim = min(self.counts, key=self.counts.get)
+        floor = self.counts.pop(victim)
+        self.errors.pop(victim)
+        self.counts[item] = floor + weight
+        self.errors[item] = floor
+
+    def _min_count(self) -> int:
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def merge(self, other: 'SpaceSaving'):
+        """In-place merge (Agarwal et al.); items missing on one side get its min count."""
+        self_min, other_min = self._min_count(), other._min_count()
+        merged: Dict[str, Tuple[int, int]] = {}
+        for item in set(self.counts) | set(other.counts):
+            c1 = self.counts.get(item)
+            c2 = other.counts.get(item)
+            count = (c1 if c1 is not None else self_min) + (c2 if c2 is not None else other_min)
+            error = (self.errors[item] if c1 is not None else self_min) + \
+                    (other.errors[item] if c2 is not None else other_min)
+            merged[item] = (count, error)
+
+        top = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:self.capacity]
+        self.counts = {item: ce[0] for item, ce in top}
+        self.errors = {item: ce[1] for item, ce in top}
+
+    def top(self, k: int = 10) -> List[Tuple[str, int]]:
+        """Returns the k heaviest items as (item, estimated_count), heaviest first."""
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+
+# --- Per-event dimension extractors ---
+_USER_RE = re.compile(r"User '(.*?)'")
+_DEST_VOL_RE = re.compile(r"destination volume (\S+) failed")
+
+def _volume(e: UnifiedEvent) -> Optional[str]:
+    if e.event_name in ('monitor.volume.nearlyFull', 'wafl.scan.start'):
+        return e.asset_id
+    if e.event_name == 'snapmirror.dst.updateFailed':
+        m = _DEST_VOL_RE.search(e.raw_message)
+        return qualify(e.node, m.group(1)) if m else None
+    return None
+
+# LIF and workload names repeat across clusters like volume names: count them qualified
+def _lif(e: UnifiedEvent) -> Optional[str]:
+    lif = e.parsed_fields.get('lif')
+    return qualify(e.node, lif) if lif else None
+
+def _workload(e: UnifiedEvent) -> Optional[str]:
+    workload = e.parsed_fields.get('workload')
+    return qualify(e.node, workload) if workload else None
+
+def _user(e: UnifiedEvent) -> Optional[str]:
+    if e.event_name != 'audit.cmd.create':
+        return None
+    m = _USER_RE.search(e.raw_message)
+    return m.group(1) if m else None
+
+DIMENSIONS: Dict[str, Callable[[UnifiedEvent], Optional[str]]] = {
+    'nodes': lambda e: e.node,
+    'volumes': _volume,
+    'lifs': _lif,
+    'workloads': _workload,
+    'users': _user,
+}
+
+# Dimensions that also get a heavy-hitter summary
+TOP_K_DIMENSIONS = ('events', 'volumes', 'lifs')
+
+
+class WindowSketches:
+    """
+    Distinct counts and top-K for one aggregation window of UnifiedEvents.
+    Memory is fixed per window; windows (or shards) combine with merge().
+    """
+    def __init__(self, precision: int = 12, top_k_capacity: int = 32):
+        self.precision = precision
+        self.top_k_capacity = top_k_capacity
+        self.distinct = {dim: HyperLogLog(precision) for dim in DIMENSIONS}
+        self.heavy = {dim: SpaceSaving(top_k_capacity) for dim in TOP_K_DIMENSIONS}
+
+    def update(self, event: UnifiedEvent):
+        self.heavy['events'].add(event.event_name)
+        for dim, extract in DIMENSIONS.items():
+            value = extract(event)
+            if not value:
+                continue
+            self.distinct[dim].add(value)
+            if dim in self.heavy:
+                self.heavy[dim].add(value)
+
+    def merge(self, other: 'WindowSketches'):
+        for dim, hll in other.distinct.items():
+            self.distinct[dim].merge(hll)
+        for dim, ss in other.heavy.items():
+            self.heavy[dim].merge(ss)
+
+    def cardinalities(self) -> Dict[str, int]:
+        """Feature-ready distinct counts: {'unique_nodes': 4, 'unique_volumes': 812, ...}"""
+        return {f"unique_{dim}": hll.count() for dim, hll in self.distinct.items()}
+
+    def top_k(self, k: int = 5) -> Dict[str, List[Tuple[str, int]]]:
+        return {dim: ss.top(k) for dim, ss in self.heavy.items()}
+
+    def summary(self, k: int = 5) -> Dict:
+        return {'cardinality': self.cardinalities(), 'top_k': self.top_k(k)}
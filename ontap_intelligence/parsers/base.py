@@ -8,6 +8,8 @@ from dataclasses import dataclass
 from typing import Optional, Dict
 import datetime
 
+from ontap_intelligence.core.clusters import cluster_of
+
 @dataclass
 class UnifiedEvent:
     """
@@ -22,7 +24,15 @@ class UnifiedEvent:
     impact_level: int   # 0-10 (10 = Outage)
     raw_message: str
     parsed_fields: Dict # Extracted dynamic values (vol_name, latency, etc.)
-    asset_id: Optional[str] = None # The primary asset affected (e.g., 'vol_finance')
+    asset_id: Optional[str] = None # The primary asset affected, cluster-qualified (e.g., 'ontap-cluster-01:vol_finance')
+    # Stage tracing (time.monotonic()): when the raw line was ingested / parsed
+    ingest_ts: Optional[float] = None
+    parse_ts: Optional[float] = None
+
+    @property
+    def cluster(self) -> str:
+        """Cluster of the reporting node (see core/clusters.py)."""
+        return cluster_of(self.node)
 
 class BaseParser:
     def can_parse(self, event_name: str) -> bool:
@@ -5,6 +5,7 @@ Parses Network-related events (LIFs, Ports, QoS).
 """
 
 from .base import BaseParser, UnifiedEvent
+from ontap_intelligence.core.clusters import qualify
 from ontap_intelligence.core.state import state
 import re
 
@@ -31,8 +32,9 @@ class NetworkParser(BaseParser):
         # "LIF {lif_name} (port {port}) on Vserver {vserver} has gone down."
         m = re.search(r"LIF (.*?) \(port (.*?)\) on Vserver (.*?) has", raw['message'])
         lif, port, vserver = m.groups() if m else ("unknown", "unknown", "unknown")
+        lif_id = qualify(raw['node'], lif)
 
-        state.add_or_update_asset(lif, "lif", parent_id=raw['node'])
+        state.add_or_update_asset(lif_id, "lif", parent_id=raw['node'])
 
         return UnifiedEvent(
             timestamp=raw['timestamp'],
@@ -44,7 +46,7 @@ class NetworkParser(BaseParser):
             impact_level=9,
             raw_message=raw['message'],
             parsed_fields={'lif': lif, 'port': port, 'vserver': vserver},
-            asset_id=lif
+            asset_id=lif_id
         )
 
     def _parse_qos(self, raw: dict) -> UnifiedEvent:
@@ -66,5 +68,5 @@ class NetworkParser(BaseParser):
             impact_level=4,
             raw_message=raw['message'],
             parsed_fields={'latency': lat, 'workload': workload},
-            asset_id=workload
+            asset_id=qualify(raw['node'], workload)
         )
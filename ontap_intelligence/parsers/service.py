@@ -6,10 +6,12 @@ Listens to 'log.raw', parses it, and publishes 'event.unified'.
 """
 
 from ontap_intelligence.core.bus import bus
+from ontap_intelligence.core.metrics import metrics
 from src.parser import LogParser as RawRegexParser # Reuse our Phase 3 regex
 from .storage import StorageParser
 from .network import NetworkParser
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +22,17 @@ class ParserService:
             StorageParser(),
             NetworkParser()
         ]
+        self.ingest_lag = metrics.histogram(
+            "ingest_to_parse_seconds", "Lag from LogIngestor read to parsed UnifiedEvent")
         
     def start(self):
-        bus.subscribe("log.raw", self._handle_raw_log)
+        bus.subscribe("log.raw", self._handle_raw_log, stage="parse")
         logger.info("ParserService started.")
 
     def _handle_raw_log(self, topic, payload: str):
+        # Lines published directly (not via LogIngestor) start their clock here
+        ingest_ts = getattr(payload, 'ingest_ts', None) or time.monotonic()
+
         # 1. Regex Parse (Basic Fields)
         basic = self.raw_parser.parse_line(payload)
         if not basic:
@@ -55,7 +62,10 @@ class ParserService:
                 asset_id=None
             )
 
-        # 4. Publish Unified Event
+        # 4. Stamp stage times and publish Unified Event
+        unified_event.ingest_ts = ingest_ts
+        unified_event.parse_ts = time.monotonic()
+        self.ingest_lag.observe(unified_event.parse_ts - ingest_ts)
         bus.publish("event.unified", unified_event)
         
         # Debug print (for demo)
@@ -3,9 +3,11 @@ storage.py
 
 Parses Storage-related events (Disk, RAID, WAFL).
 Updates the AssetManager topology based on discovery.
+Asset ids are cluster-qualified (aggr1 exists on every cluster, see core/clusters.py).
 """
 
 from .base import BaseParser, UnifiedEvent
+from ontap_intelligence.core.clusters import qualify
 from ontap_intelligence.core.state import state
 import re
 
@@ -36,10 +38,11 @@ class StorageParser(BaseParser):
         # Msg: Volume vol_X on aggregate aggr_Y is 99% full.
         m = re.search(r"Volume (.*?) on aggregate (.*?) is (\d+)% full", raw['message'])
         vol_name, aggr_name, usage = m.groups() if m else ("unknown", "unknown", 0)
+        vol_id, aggr_id = qualify(raw['node'], vol_name), qualify(raw['node'], aggr_name)
         
         # Update Topology
-        state.add_or_update_asset(aggr_name, "aggr", parent_id=raw['node'])
-        state.add_or_update_asset(vol_name, "volume", parent_id=aggr_name)
+        state.add_or_update_asset(aggr_id, "aggr", parent_id=raw['node'])
+        state.add_or_update_asset(vol_id, "volume", parent_id=aggr_id)
 
         return UnifiedEvent(
             timestamp=raw['timestamp'],
@@ -51,15 +54,18 @@ class StorageParser(BaseParser):
             impact_level=5,
             raw_message=raw['message'],
             parsed_fields={'usage': int(usage), 'limit': 95},
-            asset_id=vol_name
+            asset_id=vol_id
         )
 
     def _parse_disk_fail(self, raw: dict) -> UnifiedEvent:
         # Msg: Disk 1.2 on shelf 1 ...
         m = re.search(r"Disk (.*?) on shelf", raw['message'])
         disk_id = m.group(1) if m else "unknown"
+        asset_id = qualify(raw['node'], disk_id)
         
-        state.add_or_update_asset(disk_id, "disk", parent_id=raw['node'])
+        # The message names no aggregate: the node is a fallback until correlation
+        # pairs the failure with its aggregate's degradation (intelligence/correlation.py)
+        state.add_or_update_asset(asset_id, "disk", parent_id=raw['node'], keep_parent=True)
 
         return UnifiedEvent(
             timestamp=raw['timestamp'],
@@ -71,13 +77,16 @@ class StorageParser(BaseParser):
             impact_level=8,
             raw_message=raw['message'],
             parsed_fields={'disk_id': disk_id},
-            asset_id=disk_id
+            asset_id=asset_id
         )
 
     def _parse_aggr_degraded(self, raw: dict) -> UnifiedEvent:
         # Msg: Aggregate aggr1 is degraded.
         m = re.search(r"Aggregate (.*?) is degraded", raw['message'])
         aggr_name = m.group(1) if m else "unknown"
+        aggr_id = qualify(raw['node'], aggr_name)
+
+        state.add_or_update_asset(aggr_id, "aggr", parent_id=raw['node'])
 
         return UnifiedEvent(
             timestamp=raw['timestamp'],
@@ -89,16 +98,18 @@ class StorageParser(BaseParser):
             impact_level=9,
             raw_message=raw['message'],
             parsed_fields={'aggr': aggr_name},
-            asset_id=aggr_name
+            asset_id=aggr_id
         )
         
     def _parse_wafl_scan(self, raw: dict) -> UnifiedEvent:
         # Msg: WAFL scan 'active_fcp' started on volume vol_X.
         m = re.search(r"on volume (.*?)\.", raw['message'])
         vol_name = m.group(1) if m else "unknown"
+        vol_id = qualify(raw['node'], vol_name)
         
         # We might not know the aggregate here, so just link to Node for now if new
-        state.add_or_update_asset(vol_name, "volume", parent_id=raw['node'])
+        # (keep_parent: a volume already linked to its aggregate stays there)
+        state.add_or_update_asset(vol_id, "volume", parent_id=raw['node'], keep_parent=True)
 
         return UnifiedEvent(
             timestamp=raw['timestamp'],
@@ -110,5 +121,5 @@ class StorageParser(BaseParser):
             impact_level=1,
             raw_message=raw['message'],
             parsed_fields={'scan': 'active_fcp'},
-            asset_id=vol_name
+            asset_id=vol_id
         )
@@ -0,0 +1,593 @@
+"""
+sharding.py
+
+Multi-process pipeline partitioned by node or by cluster (sharding.key).
+Correlation rules are node-local, so every line of a node goes to the same shard
+process (a stable hash of the node name, or an explicit assignment). With
+key 'cluster', a cluster's nodes share a shard, so each cluster's topology,
+correlation and feature partitions live in a single process. Each shard
+runs its own ParserService, CorrelationEngine, HealthEngine and window features; the merger
+(in the supervisor process) re-publishes shard incidents and combines per-shard
+partial windows (per-cluster features) into fleet-wide windows that MLService scores.
+
+    supervisor: log.raw -> ShardRouter --batches--> shard 0..N-1: parse -> correlate
+                                                                    -> window features
+    supervisor: ShardMerger <--incidents, partial windows-- shards
+                  -> 'event.incident' / MLService.score_window -> 'event.anomaly'
+
+Line batches reach the shards over a shared-memory ring per shard (see
+core/ringbuffer.py; 'queue' transport falls back to multiprocessing queues).
+ML windows are aligned to multiples of window_seconds (event time) so partials
+from different shards line up. Topology (AssetManager) is built per shard.
+
+Checkpoints (core/checkpoint.py) travel in-band: with ingestion paused, the
+router flushes and sends a checkpoint marker after each shard's last batch;
+each shard snapshots its state into <checkpoint dir>/shard-<n> and acks through
+the merger, which has then merged every partial sent before the marker.
+"""
+
+import datetime
+import hashlib
+import logging
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from ontap_intelligence.core.bus import bus
+from ontap_intelligence.core.clusters import cluster_of, node_of
+from ontap_intelligence.core.codec import decode_lines, encode_lines
+from ontap_intelligence.core.ringbuffer import SharedRing
+from ontap_intelligence.intelligence.features import ClusterWindows
+
+logger = logging.getLogger(__name__)
+
+TAG_CHECKPOINT = 1 # Ring record tag of a checkpoint marker (0 = line batch)
+TAG_FINAL_CHECKPOINT = 2 # ... of the shutdown checkpoint marker (open windows flushed first)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def shard_for(node: str, shards: int) -> int:
+    """
+    Shard of a node (or cluster) name. Stable across processes and restarts (unlike hash()).
+    blake2b rather than crc32: crc32 is linear, so names that differ only in a
+    digit ('...-01-01', '...-02-02') often share their low bits and collide.
+    """
+    digest = hashlib.blake2b(node.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+def window_key(ts: datetime.datetime, window_seconds: int) -> int:
+    """Start of the aligned window containing ts, in epoch seconds."""
+    seconds = int((ts - EPOCH).total_seconds())
+    return seconds - seconds % window_seconds
+
+
+class ShardWindows:
+    """Per-shard partial window features, closed once a later window has started."""
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        self.open: Dict[int, ClusterWindows] = {}
+        self.watermark: Optional[int] = None # Newest window key seen
+
+    def _handle_event(self, topic, event):
+        key = window_key(event.timestamp, self.window_seconds)
+        wf = self.open.get(key)
+        if wf is None:
+            wf = self.open[key] = ClusterWindows()
+        wf.update(event)
+        if self.watermark is None or key > self.watermark:
+            self.watermark = key
+
+    def take_closed(self, final: bool = False) -> List[Tuple[int, ClusterWindows]]:
+        keys = sorted(k for k in self.open if final or k < self.watermark)
+        return [(k, self.open.pop(k)) for k in keys]
+
+    def checkpoint_state(self) -> Dict:
+        return {'open': self.open, 'watermark': self.watermark}
+
+    def restore_state(self, saved: Dict):
+        self.open = saved['open']
+        self.watermark = saved['watermark']
+
+
+# --- Transport: router -> shard ---
+class QueueSender:
+    def __init__(self, q):
+        self.q = q
+
+    def send(self, lines: List[str], ingest_ts: List[float]):
+        self.q.put(("lines", lines, ingest_ts))
+
+    def checkpoint(self, ckpt_id: int, final: bool = False):
+        self.q.put(("checkpoint", ckpt_id, final))
+
+    def close(self):
+        self.q.put(None)
+
+    def source(self) -> Tuple:
+        return ("queue", self.q)
+
+    def stats(self) -> Optional[Dict]:
+        return None
+
+    def release(self):
+        pass
+
+
+class RingSender:
+    def __init__(self, capacity: int):
+        self.ring = SharedRing.create(capacity, consumers=1)
+        self.producer = self.ring.producer()
+        self._final_stats: Optional[Dict] = None
+
+    def send(self, lines: List[str], ingest_ts: List[float]):
+        self.producer.write(encode_lines(lines, ingest_ts))
+
+    def checkpoint(self, ckpt_id: int, final: bool = False):
+        self.producer.write(str(ckpt_id).encode(), tag=TAG_FINAL_CHECKPOINT if final else TAG_CHECKPOINT)
+
+    def close(self):
+        self.producer.close()
+
+    def source(self) -> Tuple:
+        return ("ring", self.ring.name)
+
+    def stats(self) -> Optional[Dict]:
+        return self._final_stats or self.ring.stats()
+
+    def release(self):
+        """Frees the segment (after the shard has exited)."""
+        self._final_stats = self.ring.stats()
+        self.ring.close()
+
+
+def _shard_input(source: Tuple) -> Iterator[Tuple]:
+    """Yields ("lines", lines, ingest_ts) batches and ("checkpoint", id, final) markers, in order."""
+    kind, where = source
+    if kind == "queue":
+        for item in iter(where.get, None):
+            yield item
+        return
+
+    ring = SharedRing.attach(where)
+    consumer = ring.consumer()
+    while True:
+        record = consumer.read()
+        if record is None:
+            break
+        if record[0] in (TAG_CHECKPOINT, TAG_FINAL_CHECKPOINT):
+            yield "checkpoint", int(bytes(record[1])), record[0] == TAG_FINAL_CHECKPOINT
+        else:
+            yield ("lines", *decode_lines(record[1]))
+    consumer.commit()
+    ring.close()
+
+
+def _shard_main(shard_id: int, config: Dict, source: Tuple, out_q):
+    """Shard process: raw line batches in; incidents and partial windows out."""
+    from ontap_intelligence.core.checkpoint import CheckpointManager
+    from ontap_intelligence.core.ingestion import RawLine
+    from ontap_intelligence.core.state import state
+    from ontap_intelligence.core.topology_store import TopologyStore
+    from ontap_intelligence.core.journal import EventJournal
+    from ontap_intelligence.core.event_store import EventStore
+    from ontap_intelligence.intelligence.correlation import CorrelationEngine
+    from ontap_intelligence.intelligence.health import HealthEngine
+    from ontap_intelligence.parsers.service import parser_service
+
+    intel = config.get('intelligence', {})
+    logging.getLogger().setLevel(config.get('system', {}).get('log_level', "INFO"))
+
+    state.configure_from(config.get('topology', {}))
+    store = None
+    store_cfg = config.get('topology', {}).get('store', {})
+    if store_cfg.get('enabled'):
+        store = TopologyStore.from_config(store_cfg, f"shard-{shard_id}")
+        store.load()
+        store.start()
+    parser_service.start()
+    correlator = CorrelationEngine(window_seconds=intel.get('correlation_window_sec', 60))
+    correlator.start()
+    health = None
+    if intel.get('health', {}).get('enabled', True):
+        health = HealthEngine.from_config(intel.get('health', {})) # A node's subtree lives in one shard
+        health.start()
+    windows = ShardWindows(intel.get('ml_window_sec', 10))
+    bus.subscribe("event.unified", windows._handle_event)
+    bus.subscribe("event.incident", lambda t, incident: out_q.put(("incident", shard_id, incident)))
+    journal = None
+    if config.get('journal', {}).get('enabled'):
+        journal = EventJournal.from_config(config['journal'], f"shard-{shard_id}")
+        journal.attach(bus)
+    events = None
+    if config.get('event_store', {}).get('enabled'):
+        events = EventStore.from_config(config['event_store'], f"shard-{shard_id}")
+        events.attach(bus)
+    archive = None
+    if config.get('archive', {}).get('enabled'):
+        try:
+            from ontap_intelligence.core.archive import EventArchive
+            archive = EventArchive.from_config(config['archive'], f"shard-{shard_id}") # One archive, files per shard
+            archive.attach(bus)
+        except ImportError as e:
+            logger.warning(f"EventArchive unavailable ({e}). Parquet archiving disabled.")
+
+    checkpoints = None
+    ckpt_cfg = config.get('checkpoint', {})
+    if ckpt_cfg.get('enabled'):
+        checkpoints = CheckpointManager.from_config(ckpt_cfg, f"shard-{shard_id}")
+        checkpoints.register("correlation", correlator)
+        checkpoints.register("windows", windows)
+        if health:
+            checkpoints.register("health", health)
+        if events:
+            checkpoints.register("event_store", events)
+        if archive:
+            checkpoints.register("archive", archive)
+        if ckpt_cfg.get('restore_id') is not None:
+            checkpoints.restore(ckpt_cfg['restore_id'])
+
+    lines = 0
+    for item in _shard_input(source):
+        if item[0] == "checkpoint":
+            # Everything before the marker is processed (the shard bus is synchronous)
+            _, ckpt_id, final = item
+            if final: # Shutdown: no later line will close the open windows, so they go out now
+                out_q.put(("windows", shard_id, windows.watermark, windows.take_closed(final=True)))
+            if checkpoints:
+                checkpoints.write(ckpt_id=ckpt_id)
+            out_q.put(("checkpoint", shard_id, ckpt_id))
+            continue
+
+        _, batch, batch_ts = item
+        del item # Holds a view into the ring
+        for line, ingest_ts in zip(batch, batch_ts):
+            bus.publish("log.raw", RawLine(line, ingest_ts))
+        lines += len(batch)
+        del batch_ts
+
+        closed = windows.take_closed()
+        if closed:
+            out_q.put(("windows", shard_id, windows.watermark, closed))
+
+    out_q.put(("windows", shard_id, windows.watermark, windows.take_closed(final=True)))
+    if journal:
+        journal.close()
+    if events:
+        events.close()
+    if archive:
+        archive.close()
+    if checkpoints:
+        checkpoints.close()
+    if store:
+        store.close()
+    out_q.put(("done", shard_id, lines))
+
+
+class ShardRouter:
+    """Batches raw lines per shard (by node or cluster) and hands them to the shard senders."""
+    def __init__(self, senders: List, batch_size: int = 256, flush_interval: float = 0.2,
+                 assignments: Optional[Dict[str, int]] = None, key: str = "node"):
+        """
+        :param assignments: Optional fixed node (or cluster) -> shard map (small fleets,
+                            where hashing a handful of names can leave shards idle).
+        :param key: 'node' or 'cluster': the unit kept together in one shard.
+        """
+        if key not in ("node", "cluster"):
+            raise ValueError(f"Unknown sharding key '{key}'")
+        self.by_cluster = key == "cluster"
+        self.senders = senders
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = [self._empty() for _ in senders] # (lines, ingest_ts) per shard
+        self.routed = [0] * len(senders)
+        self._assigned: Dict[str, int] = dict(assignments or {})
+        self._nodes: Dict[str, int] = {} # node -> shard cache
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _empty() -> Tuple[List[str], List[float]]:
+        return [], []
+
+    def start(self):
+        bus.subscribe("log.raw", self._handle_raw_log)
+        threading.Thread(target=self._flush_loop, name="shard-router-flush", daemon=True).start()
+
+    def _handle_raw_log(self, topic, payload: str):
+        node = node_of(payload)
+        shard = self._nodes.get(node)
+        if shard is None:
+            name = cluster_of(node) if self.by_cluster else node
+            shard = self._assigned.get(name)
+            if shard is None:
+                shard = shard_for(name, len(self.senders))
+            self._nodes[node] = shard
+
+        # Sends happen under the lock so batches (and checkpoint markers) of a shard
+        # can't overtake each other between this thread and the flush thread
+        with self._lock:
+            lines, ingest_ts = batch = self.pending[shard]
+            lines.append(str(payload))
+            ingest_ts.append(getattr(payload, 'ingest_ts', None) or time.monotonic())
+            if len(lines) >= self.batch_size:
+                self.pending[shard] = self._empty()
+                self._send(shard, batch) # Blocks when the shard is behind (backpressure)
+
+    def _send(self, shard: int, batch: Tuple[List[str], List[float]]):
+        self.senders[shard].send(*batch)
+        self.routed[shard] += len(batch[0])
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        batches, self.pending = self.pending, [self._empty() for _ in self.senders]
+        for shard, batch in enumerate(batches):
+            if batch[0]:
+                self._send(shard, batch)
+
+    def checkpoint(self, ckpt_id: int, final: bool = False):
+        """Sends pending lines, then a checkpoint marker, to every shard."""
+        with self._lock:
+            self._flush_locked()
+            for sender in self.senders:
+                sender.checkpoint(ckpt_id, final)
+
+    def _flush_loop(self):
+        # Ships partial batches so slow sources (live tail) aren't held back
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        self._stop_event.set()
+        self.flush()
+
+
+class ShardMerger:
+    """
+    Merges per-shard partial windows and scores each window once.
+    A window closes when every live shard has moved past it, or after
+    `grace_seconds` of wall time (idle or lagging shards don't stall scoring).
+    Closed windows are scored in order on a thread of their own: the merger thread,
+    the only reader of the shards' output queue, just forwards, so incidents never
+    wait behind ML inference and shards never block on a full pipe.
+    """
+    def __init__(self, out_q, shards: int, ml=None, grace_seconds: float = 30.0):
+        self.out_q = out_q
+        self.shards = shards
+        self.ml = ml
+        self.grace_seconds = grace_seconds
+        self.pending: Dict[int, ClusterWindows] = {}
+        self._first_seen: Dict[int, float] = {}
+        self.watermarks: Dict[int, Optional[int]] = {}
+        self.done: Dict[int, int] = {} # shard -> lines processed
+        self.last_closed: Optional[int] = None
+        self.incidents = 0
+        self.windows_scored = 0
+        self.late_partials = 0
+        self._acks: Dict[int, Set[int]] = {} # checkpoint id -> shards that have snapshotted
+        self._lock = threading.Condition() # Guards merge state; notified on acks, 'done' and scores
+        self._thread: Optional[threading.Thread] = None
+        self._unscored: Dict[int, ClusterWindows] = {} # Closed, queued for (or in) scoring
+        self._score_q: queue.Queue = queue.Queue() # Unbounded: the merger never waits on ML
+        self._scorer: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="shard-merger", daemon=True)
+        self._thread.start()
+        if self.ml:
+            self._scorer = threading.Thread(target=self._score_loop, name="shard-scorer", daemon=True)
+            self._scorer.start()
+
+    def _run(self):
+        while len(self.done) < self.shards:
+            try:
+                msg = self.out_q.get(timeout=0.1 if self._stopping.is_set() else 1.0)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break # Shards gone without 'done', and nothing left to read
+                with self._lock:
+                    self._close_windows()
+                continue
+
+            kind, shard = msg[0], msg[1]
+            if kind == "incident":
+                self.incidents += 1
+                bus.publish("event.incident", msg[2])
+                continue
+            with self._lock:
+                if kind == "windows":
+                    self.watermarks[shard] = msg[2]
+                    self._add_partials(msg[3])
+                    self._close_windows()
+                elif kind == "checkpoint":
+                    self._acks.setdefault(msg[2], set()).add(shard)
+                    self._lock.notify_all()
+                elif kind == "done":
+                    self.done[shard] = msg[2]
+                    self._lock.notify_all()
+        with self._lock:
+            self._close_windows(final=True)
+        self._score_q.put(None)
+
+    def _score_loop(self):
+        for key, wf in iter(self._score_q.get, None):
+            self.ml.score_window(wf)
+            with self._lock:
+                self._unscored.pop(key, None)
+                self.windows_scored += 1
+                self._lock.notify_all()
+
+    def wait_done(self, timeout: float) -> bool:
+        """Waits until every shard has reported 'done' (its results are all read)."""
+        with self._lock:
+            return self._lock.wait_for(lambda: len(self.done) >= self.shards, timeout)
+
+    def stop(self):
+        """Ends the merger once the output queue is empty, even if shards never reported 'done'."""
+        self._stopping.set()
+
+    def flush(self, timeout: float) -> bool:
+        """Closes every pending window and waits until all closed windows are scored."""
+        with self._lock:
+            self._close_windows(final=True)
+            return self._lock.wait_for(lambda: not self._unscored, timeout)
+
+    def wait_checkpoint(self, ckpt_id: int, timeout: float) -> bool:
+        """Waits until every live shard has acked checkpoint `ckpt_id`."""
+        with self._lock:
+            done = self._lock.wait_for(
+                lambda: all(s in self._acks.get(ckpt_id, ()) or s in self.done for s in range(self.shards)),
+                timeout)
+            self._acks.pop(ckpt_id, None)
+            return done
+
+    def checkpoint_state(self) -> bytes:
+        # Serialized under the lock: a grace timeout may close windows meanwhile
+        with self._lock:
+            return pickle.dumps({'pending': self.pending, 'watermarks': self.watermarks,
+                                 'last_closed': self.last_closed, 'unscored': self._unscored},
+                                protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore_state(self, data: bytes):
+        saved = pickle.loads(data)
+        with self._lock:
+            self.pending = saved['pending']
+            self.watermarks = saved['watermarks']
+            self.last_closed = saved['last_closed']
+            self._first_seen = {key: time.monotonic() for key in self.pending}
+            for key, wf in sorted(saved.get('unscored', {}).items()):
+                self._queue_scoring(key, wf)
+
+    def _add_partials(self, partials: List[Tuple[int, ClusterWindows]]):
+        for key, wf in partials:
+            if self.last_closed is not None and key <= self.last_closed:
+                self.late_partials += 1
+                continue
+            if key in self.pending:
+                self.pending[key].merge(wf)
+            else:
+                self.pending[key] = wf
+                self._first_seen[key] = time.monotonic()
+
+    def _close_windows(self, final: bool = False):
+        # Every live shard must have moved past a window (a silent shard holds it until grace)
+        live = [self.watermarks.get(s) for s in range(self.shards) if s not in self.done]
+        low = min(live) if live and None not in live else None
+        now = time.monotonic()
+        for key in sorted(self.pending):
+            ready = (final or (low is not None and key < low)
+                     or now - self._first_seen[key] >= self.grace_seconds)
+            if not ready:
+                break # Windows are scored in order
+            wf = self.pending.pop(key)
+            del self._first_seen[key]
+            self.last_closed = key
+            self._queue_scoring(key, wf)
+
+    def _queue_scoring(self, key: int, wf: ClusterWindows):
+        if self.ml:
+            self._unscored[key] = wf
+            self._score_q.put((key, wf))
+        else:
+            self.windows_scored += 1
+
+    def join(self, timeout: float) -> bool:
+        """
+        Waits for the merger thread, then for the scorer. Scoring can lag far behind
+        (replays close windows faster than ML scores them): the scorer is waited for
+        as long as it scores at least one window per `timeout`.
+        """
+        if self._thread:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return False
+        while self._scorer and self._scorer.is_alive():
+            scored = self.windows_scored
+            self._scorer.join(timeout)
+            if self._scorer.is_alive() and self.windows_scored == scored:
+                logger.warning(f"ML scoring stalled with {len(self._unscored)} windows unscored")
+                return False
+        return True
+
+
+class ShardedPipeline:
+    def __init__(self, config: Dict, shards: int, ml=None):
+        cfg = config.get('pipeline', {}).get('sharding', {})
+        ctx = multiprocessing.get_context("spawn") # Safe with the supervisor's threads
+        self.config = config
+        self.shards = shards
+        if cfg.get('transport', "ring") == "ring":
+            self.senders = [RingSender(int(cfg.get('ring_mb', 8) * (1 << 20))) for _ in range(shards)]
+        else:
+            self.senders = [QueueSender(ctx.Queue(maxsize=cfg.get('queue_batches', 64))) for _ in range(shards)]
+        self.out_q = ctx.Queue()
+        self.router = ShardRouter(self.senders, batch_size=cfg.get('batch_size', 256),
+                                  flush_interval=cfg.get('flush_interval_sec', 0.2),
+                                  assignments=cfg.get('assignments'), key=cfg.get('key', "node"))
+        self.merger = ShardMerger(self.out_q, shards, ml=ml,
+                                  grace_seconds=cfg.get('window_grace_sec', 30))
+        self.processes = [
+            ctx.Process(target=_shard_main, args=(i, config, self.senders[i].source(), self.out_q),
+                        name=f"shard-{i}", daemon=True)
+            for i in range(shards)
+        ]
+
+    def start(self):
+        for p in self.processes:
+            p.start()
+        self.merger.start()
+        self.router.start()
+        logger.info(f"Sharded pipeline started: {self.shards} shard processes")
+
+    def shutdown(self, timeout: float = 10.0) -> bool:
+        """Flushes routed lines, lets shards finish, and waits for the merger and ML scoring."""
+        self.router.stop()
+        for sender in self.senders:
+            sender.close()
+        # The merger keeps reading the output queue meanwhile, so shards can flush and exit
+        finished = self.merger.wait_done(timeout)
+        deadline = time.monotonic() + 1.0
+        for p in self.processes:
+            p.join(timeout=max(0.0, deadline - time.monotonic()))
+            if p.is_alive():
+                logger.warning(f"{p.name} did not exit; terminating it")
+                p.terminate()
+        self.merger.stop() # Reads what terminated shards left in the queue, then ends
+        drained = self.merger.join(timeout)
+        for sender in self.senders:
+            sender.release()
+        return finished and drained
+
+    def checkpoint(self, ckpt_id: int, timeout: float = 10.0, final: bool = False) -> bool:
+        """
+        With ingestion paused: has every shard snapshot its state as of the lines routed so far.
+        `final` (at shutdown): shards flush their open windows first and every merged window
+        is scored before returning, so the checkpoint holds no window a restart would score again.
+        """
+        self.router.checkpoint(ckpt_id, final)
+        if not self.merger.wait_checkpoint(ckpt_id, timeout):
+            return False
+        return self.merger.flush(timeout) if final else True
+
+    def alive(self) -> bool:
+        return all(p.is_alive() for p in self.processes)
+
+    def stats(self) -> Dict:
+        return {
+            'shards': [{'pid': p.pid, 'alive': p.is_alive(), 'routed': self.router.routed[i],
+                        'processed': self.merger.done.get(i),
+                        'ring': self.senders[i].stats()}
+                       for i, p in enumerate(self.processes)],
+            'incidents': self.merger.incidents,
+            'windows_scored': self.merger.windows_scored,
+            'windows_pending': len(self.merger.pending),
+            'late_partials': self.merger.late_partials,
+        }
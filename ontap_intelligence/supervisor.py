@@ -0,0 +1,454 @@
+"""
+supervisor.py
+
+Pipeline supervisor: the deployable entry point.
+Builds LogIngestor -> ParserService -> CorrelationEngine / HealthEngine -> MLService from
+settings.yaml, runs each stage on its configured workers (see core/stages.py),
+reports health and stats, and drains stage queues on shutdown.
+With pipeline.shards > 1, parsing and correlation run in shard processes
+partitioned by node or cluster instead (see sharding.py).
+Stages with partition_by: cluster run one partition of clusters per worker, so
+clusters are processed in parallel and each cluster's events stay in order.
+With checkpoint.enabled, state is checkpointed every interval_sec (ingestion is
+paused and the pipeline drained for the duration, see core/checkpoint.py) and
+on shutdown, and restored on start: ingestion resumes at the checkpointed offset.
+
+HTTP (optional, supervisor.http_port):
+- GET /health          liveness of ingestion and stage workers
+- GET /stats           bus/stage stats, alert counts, stage-lag metrics (JSON)
+- GET /metrics         Prometheus text format
+- POST /profile/toggle start/stop the PipelineProfiler
+
+Run with: python -m ontap_intelligence.supervisor --config ontap_intelligence/config/settings.yaml
+"""
+
+import argparse
+import json
+import logging
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import yaml
+
+from ontap_intelligence.core.bus import bus
+from ontap_intelligence.core.checkpoint import CheckpointManager
+from ontap_intelligence.core.clusters import partition_key
+from ontap_intelligence.core.event_store import EventStore
+from ontap_intelligence.core.ingestion import LogIngestor
+from ontap_intelligence.core.journal import EventJournal
+from ontap_intelligence.core.metrics import metrics
+from ontap_intelligence.core.profiling import profiler
+from ontap_intelligence.core.state import state
+from ontap_intelligence.core.topology_store import TopologyStore
+from ontap_intelligence.intelligence.correlation import CorrelationEngine
+from ontap_intelligence.intelligence.health import HealthEngine
+from ontap_intelligence.parsers.service import parser_service
+from ontap_intelligence.sharding import ShardedPipeline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = "ontap_intelligence/config/settings.yaml"
+
+
+def load_config(path: str) -> Dict:
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+class PipelineSupervisor:
+    def __init__(self, config: Dict):
+        self.config = config
+        self.pipeline_cfg = config.get('pipeline', {})
+        self.ingestor: Optional[LogIngestor] = None
+        self.correlator: Optional[CorrelationEngine] = None
+        self.health_engine: Optional[HealthEngine] = None
+        self.ml = None
+        self.sharded: Optional[ShardedPipeline] = None
+        self.journal: Optional[EventJournal] = None
+        self.event_store: Optional[EventStore] = None
+        self.archive = None
+        self.checkpoints: Optional[CheckpointManager] = None
+        self.topology_store: Optional[TopologyStore] = None
+        self.resume_position: Optional[Dict] = None
+        self._checkpoint_lock = threading.Lock()
+        self.started_at: Optional[float] = None
+        self._stop_event = threading.Event()
+        self._http: Optional[ThreadingHTTPServer] = None
+        self.checkpoint_pause = metrics.histogram(
+            "checkpoint_pause_seconds", "Ingestion paused while taking a checkpoint")
+        self.alerts = {kind: metrics.counter("alerts_total", "Alerts published", kind=kind)
+                       for kind in ("incident", "anomaly")}
+
+    # --- Build ---
+    def build(self):
+        """Configures stage executors and starts every pipeline component."""
+        intel = self.config.get('intelligence', {})
+        state.configure_from(self.config.get('topology', {}))
+        shards = self.pipeline_cfg.get('shards', 0)
+        if shards > 1:
+            self._build_sharded(intel, shards)
+        else:
+            self._build_local(intel)
+        self._build_checkpoints()
+
+        bus.subscribe("event.incident", lambda t, p: self.alerts["incident"].inc())
+        bus.subscribe("event.anomaly", lambda t, p: self.alerts["anomaly"].inc())
+
+        profiler.track_defaults(correlator=self.correlator, ml=self.ml)
+        profiler.attach_bus_control()
+
+        self.ingestor = LogIngestor(self.config)
+
+    def _make_ml(self, intel: Dict):
+        if not intel.get('ml_enabled', True):
+            return None
+        try:
+            from ontap_intelligence.intelligence.ml_models import MLService
+        except ImportError as e:
+            logger.warning(f"MLService unavailable ({e}). Anomaly detection disabled.")
+            return None
+        return MLService(model_path=intel.get('model_path', "models/iso_forest.pkl"),
+                         window_seconds=intel.get('ml_window_sec', 10),
+                         clock=intel.get('ml_clock', "wall"),
+                         anomaly_threshold=intel.get('anomaly_threshold'))
+
+    def _make_archive(self, cfg: Dict):
+        if not cfg.get('enabled'):
+            return None
+        try:
+            from ontap_intelligence.core.archive import EventArchive
+        except ImportError as e:
+            logger.warning(f"EventArchive unavailable ({e}). Parquet archiving disabled.")
+            return None
+        return EventArchive.from_config(cfg)
+
+    def _build_sharded(self, intel: Dict, shards: int):
+        # Shards parse and correlate; this process routes lines and merges windows for ML
+        self.ml = self._make_ml(intel)
+        if self.ml:
+            self.ml.load_model()
+        self.sharded = ShardedPipeline(self.config, shards, ml=self.ml)
+
+    def _build_local(self, intel: Dict):
+        # 0. Warm start: topology learned in earlier runs (a checkpoint restore replaces it)
+        store_cfg = self.config.get('topology', {}).get('store', {})
+        if store_cfg.get('enabled'):
+            self.topology_store = TopologyStore.from_config(store_cfg)
+            self.topology_store.load()
+            self.topology_store.start()
+
+        # 1. Components
+        parser_service.start()
+
+        journal_cfg = self.config.get('journal', {})
+        if journal_cfg.get('enabled'):
+            self.journal = EventJournal.from_config(journal_cfg)
+            self.journal.attach(bus, stage="journal")
+
+        store_cfg = self.config.get('event_store', {})
+        if store_cfg.get('enabled'):
+            self.event_store = EventStore.from_config(store_cfg)
+            self.event_store.attach(bus, stage="store")
+
+        self.archive = self._make_archive(self.config.get('archive', {}))
+        if self.archive:
+            self.archive.attach(bus, stage="archive")
+
+        self.correlator = CorrelationEngine(window_seconds=intel.get('correlation_window_sec', 60))
+        self.correlator.start()
+
+        if intel.get('health', {}).get('enabled', True):
+            self.health_engine = HealthEngine.from_config(intel.get('health', {}))
+            self.health_engine.start()
+
+        self.ml = self._make_ml(intel)
+        if self.ml:
+            self.ml.start()
+
+        # 2. Stage executors (handlers of unconfigured stages run inline). Only stages
+        #    a component subscribed to get workers: a disabled journal/store/archive has none.
+        used = bus.subscribed_stages()
+        for name, spec in self.pipeline_cfg.get('stages', {}).items():
+            if name not in used:
+                logger.debug(f"Stage '{name}' has no subscribers; not started")
+                continue
+            workers = spec.get('workers', 1)
+            if workers <= 0:
+                logger.info(f"Stage '{name}' runs inline")
+                continue
+            partition_by = spec.get('partition_by')
+            if partition_by not in (None, "cluster"):
+                raise ValueError(f"Stage '{name}': unknown partition_by '{partition_by}'")
+            if workers > 1 and not partition_by:
+                logger.warning(f"Stage '{name}' has {workers} workers: events will reach "
+                               f"correlation/ML out of order")
+            bus.configure_stage(name, workers=workers,
+                                queue_size=spec.get('queue_size', 10000),
+                                batch_size=spec.get('batch_size', 1),
+                                partition_by=partition_key if partition_by else None)
+
+    def _build_checkpoints(self):
+        cfg = self.config.get('checkpoint', {})
+        if not cfg.get('enabled'):
+            return
+        self.checkpoints = CheckpointManager.from_config(cfg)
+        if self.sharded:
+            self.checkpoints.register("merger", self.sharded.merger)
+        else:
+            self.checkpoints.register("correlation", self.correlator)
+            if self.health_engine:
+                self.checkpoints.register("health", self.health_engine)
+            if self.ml:
+                self.checkpoints.register("ml", self.ml)
+            if self.event_store:
+                self.checkpoints.register("event_store", self.event_store)
+            if self.archive:
+                self.checkpoints.register("archive", self.archive)
+        if not cfg.get('restore', True):
+            return
+
+        record = self.checkpoints.restore()
+        if record:
+            self.resume_position = record['position']
+            if self.sharded:
+                # Shard processes receive the config when started: restore the same checkpoint
+                cfg['restore_id'] = record['id']
+
+    # --- Lifecycle ---
+    def start(self):
+        self.build()
+        self.started_at = time.monotonic()
+        if self.sharded:
+            self.sharded.start()
+        self.ingestor.start(position=self.resume_position)
+
+        sup_cfg = self.config.get('supervisor', {})
+        if sup_cfg.get('http_port'):
+            self._start_http(sup_cfg.get('http_host', "127.0.0.1"), sup_cfg['http_port'])
+
+        threading.Thread(target=self._stats_loop, name="supervisor-stats", daemon=True).start()
+        if self.checkpoints:
+            threading.Thread(target=self._checkpoint_loop, name="supervisor-checkpoint", daemon=True).start()
+        logger.info("Pipeline started.")
+
+    def run(self):
+        """Runs until SIGINT/SIGTERM (or until a replay finishes), then shuts down."""
+        signal.signal(signal.SIGINT, lambda s, f: self._stop_event.set())
+        signal.signal(signal.SIGTERM, lambda s, f: self._stop_event.set())
+        profiler.install_signal_handler()
+
+        self.start()
+        replay = self.ingestor.mode == 'replay'
+        while not self._stop_event.wait(0.5):
+            if replay and not self.ingestor.is_running():
+                logger.info("Replay finished.")
+                break
+        self.shutdown()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def shutdown(self):
+        """Graceful drain: stop reading, finish queued work, flush the open ML window."""
+        logger.info("Shutting down: draining stage queues...")
+        self._stop_event.set() # Ends the stats/checkpoint loops
+        # 1. No new input (after a checkpoint in progress completes)
+        if self.ingestor:
+            with self._checkpoint_lock:
+                self.ingestor.stop()
+
+        # 2. Finish queued events in every stage (or shard), then stop the stage workers.
+        #    Shards snapshot in-band, so their final checkpoint goes out while the router
+        #    and the shards are still running.
+        timeout = self.pipeline_cfg.get('drain_timeout_sec', 10)
+        if self.checkpoints and self.sharded:
+            self.checkpoint(timeout, final=True)
+        if self.sharded and not self.sharded.shutdown(timeout):
+            logger.warning(f"Shards did not finish within {timeout}s")
+        if not bus.drain(timeout):
+            logger.warning(f"Drain timed out after {timeout}s with "
+                           f"{sum(s['depth'] for s in bus.stats()['stages'].values())} events queued")
+        stages = bus.shutdown_stages(timeout)
+        stuck = [name for name, s in stages.items() if s['alive']] # Workers still inside a handler
+        if stuck:
+            logger.warning(f"Stages {stuck} did not stop; dropped "
+                           f"{sum(s['dropped'] for s in stages.values())} queued events")
+
+        # 3. Score the last (partial) ML window. Only once no ml worker is left to race it
+        #    on the window; its alerts are then delivered inline.
+        if self.ml and len(self.ml.window):
+            if 'ml' in stuck:
+                logger.warning("ML stage did not stop; last window not scored")
+            else:
+                self.ml._close_window()
+
+        # 4. Final checkpoint: a restart resumes exactly here (sharded: taken in step 2).
+        #    Not with events dropped or in flight: the last complete checkpoint re-reads them.
+        if self.checkpoints and not self.sharded and not stuck:
+            self.checkpoint(timeout)
+
+        summary = self._summary(stages)
+        if self.journal:
+            self.journal.close()
+        if self.event_store:
+            self.event_store.close()
+        if self.archive:
+            self.archive.close()
+        if self.checkpoints:
+            self.checkpoints.close()
+        if self.topology_store:
+            self.topology_store.close()
+        if profiler.active:
+            profiler.stop()
+        if self._http:
+            self._http.shutdown()
+        logger.info(f"Pipeline stopped. {summary}")
+
+    # --- Checkpoints ---
+    def checkpoint(self, timeout: Optional[float] = None, final: bool = False) -> Optional[int]:
+        """
+        Pauses ingestion, waits until every line read so far is fully processed,
+        snapshots all state with the ingestion position, then resumes.
+        `final`: the shutdown checkpoint of a sharded pipeline (see ShardedPipeline.checkpoint).
+        Returns the checkpoint id, or None if the pipeline did not quiesce in time.
+        """
+        timeout = self.pipeline_cfg.get('drain_timeout_sec', 10) if timeout is None else timeout
+        cfg = self.config.get('checkpoint', {})
+        with self._checkpoint_lock:
+            start = time.monotonic()
+            if not self.ingestor.pause(cfg.get('pause_timeout_sec', 5)):
+                self.ingestor.resume()
+                logger.warning("Checkpoint skipped: ingestion did not pause")
+                return None
+            try:
+                ckpt_id = self.checkpoints.next_id()
+                if self.sharded:
+                    quiet = self.sharded.checkpoint(ckpt_id, timeout, final=final)
+                else:
+                    quiet = bus.drain(timeout)
+                if not quiet:
+                    logger.warning(f"Checkpoint skipped: pipeline not drained within {timeout}s")
+                    return None
+                self.checkpoints.write(self.ingestor.position(), ckpt_id=ckpt_id)
+            finally:
+                self.ingestor.resume()
+            self.checkpoint_pause.observe(time.monotonic() - start)
+            logger.info(f"Checkpoint {ckpt_id} at {self.ingestor.position()} "
+                        f"(ingestion paused {time.monotonic() - start:.2f}s)")
+            return ckpt_id
+
+    def _checkpoint_loop(self):
+        interval = self.config.get('checkpoint', {}).get('interval_sec', 60)
+        while not self._stop_event.wait(interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"Checkpoint failed: {e}")
+
+    # --- Health / stats ---
+    def health(self) -> Dict:
+        stages = bus.stats()['stages']
+        ingesting = bool(self.ingestor and self.ingestor.is_running())
+        workers_ok = all(s['alive'] == s['workers'] for s in stages.values())
+        if self.sharded:
+            workers_ok = workers_ok and self.sharded.alive()
+        return {
+            'status': "ok" if ingesting and workers_ok else "degraded",
+            'ingesting': ingesting,
+            'stage_workers_ok': workers_ok,
+            'uptime_s': time.monotonic() - self.started_at if self.started_at else 0.0,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            **self.health(),
+            'bus': bus.stats(),
+            'shards': self.sharded.stats() if self.sharded else None,
+            'journal': self.journal.stats() if self.journal else None,
+            'event_store': self.event_store.stats() if self.event_store else None,
+            'archive': self.archive.stats() if self.archive else None,
+            'topology': state.stats(),
+            'topology_store': self.topology_store.stats() if self.topology_store else None,
+            'checkpoint': self.checkpoints.stats() if self.checkpoints else None,
+            'alerts': {kind: c.value for kind, c in self.alerts.items()},
+            'ml_last_window': self.ml.last_window if self.ml else None,
+            'metrics': metrics.snapshot()['histograms'],
+        }
+
+    def _summary(self, stages: Optional[Dict] = None) -> str:
+        stages = bus.stats()['stages'] if stages is None else stages
+        parts = [f"{name}: {s['processed']} done, depth {s['depth']}/{s['capacity']}, blocked {s['blocked']}"
+                 for name, s in stages.items()]
+        if self.sharded:
+            st = self.sharded.stats()
+            parts.append(f"shards: {sum(s['routed'] for s in st['shards'])} routed, "
+                         f"{st['windows_scored']} windows scored, {st['late_partials']} late partials")
+        parts.append(f"incidents: {self.alerts['incident'].value}, anomalies: {self.alerts['anomaly'].value}")
+        return " | ".join(parts)
+
+    def _stats_loop(self):
+        interval = self.pipeline_cfg.get('stats_interval_sec', 30)
+        while not self._stop_event.wait(interval):
+            state.evict_expired() # TTL sweeps otherwise run only when assets are written
+            logger.info(f"Stats: {self._summary()}")
+
+    # --- HTTP ---
+    def _start_http(self, host: str, port: int):
+        supervisor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, code: int, body: str, content_type: str = "application/json"):
+                data = body.encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    h = supervisor.health()
+                    self._send(200 if h['status'] == "ok" else 503, json.dumps(h))
+                elif self.path == "/stats":
+                    self._send(200, json.dumps(supervisor.stats(), default=str))
+                elif self.path == "/metrics":
+                    self._send(200, metrics.render_prometheus(), "text/plain; version=0.0.4")
+                else:
+                    self._send(404, json.dumps({'error': "not found"}))
+
+            def do_POST(self):
+                if self.path == "/profile/toggle":
+                    report = profiler.toggle()
+                    self._send(200, json.dumps({'profiling': profiler.active, 'report': report}))
+                else:
+                    self._send(404, json.dumps({'error': "not found"}))
+
+            def log_message(self, fmt, *args):
+                logger.debug(fmt % args)
+
+        self._http = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._http.serve_forever, name="supervisor-http", daemon=True).start()
+        logger.info(f"Supervisor HTTP on {host}:{port}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the ONTAP intelligence pipeline.")
+    ap.add_argument("--config", default=DEFAULT_CONFIG)
+    ap.add_argument("--mode", choices=["tail", "replay", "udp"], help="Override ingestion.mode")
+    ap.add_argument("--source", help="Override ingestion.source_file")
+    args = ap.parse_args()
+
+    config = load_config(args.config)
+    if args.mode:
+        config['ingestion']['mode'] = args.mode
+    if args.source:
+        config['ingestion']['source_file'] = args.source
+    logging.getLogger().setLevel(config.get('system', {}).get('log_level', "INFO"))
+
+    PipelineSupervisor(config).run()
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ import streamlit as st
 import pandas as pd
 import time
 import graphviz
+from ontap_intelligence.core.clusters import split_id
 from ontap_intelligence.core.state import state
 from ontap_intelligence.intelligence.correlation import correlator
 
@@ -21,38 +22,48 @@ from ontap_intelligence.intelligence.correlation import correlator
 # populated by `src/simulator.py` if that's running separately.
 #
 # FOR DEMO PURPOSES: We will make this dashboard "Read-Only" from the log file 
-# and re-run all the logic internally (Ingest->Parse->Correlate) on the fly for the view window.
+# and re-run all the logic internally (Ingest->Parse->Correlate) as lines are appended.
+# A cached LogFeed (ui/log_feed.py) remembers the last processed offset across reruns,
+# so each line is parsed and correlated exactly once.
 # This ensures consistency without complex IPC.
 
 from ontap_intelligence.core.ingestion import LogIngestor
 from ontap_intelligence.parsers.service import parser_service
 from ontap_intelligence.intelligence.correlation import CorrelationEngine
+from ontap_intelligence.intelligence.health import HealthEngine
 from ontap_intelligence.core.state import AssetManager
+from ontap_intelligence.intelligence.sketches import WindowSketches
+from ontap_intelligence.ui.log_feed import LogFeed
+from collections import deque
 import threading
 
 st.set_page_config(layout="wide", page_title="ONTAP Enterprise Observability")
 
 # --- Simulation Logic (Re-running pipeline for UI) ---
+LOG_FILE = "logs/ontap_ems.log"
+VIEW_EVENTS = 200 # Most events shown (the first load parses this many lines from the end)
+
 @st.cache_resource
 def get_pipeline():
     # specialized separate pipeline for Dashboard
     pm = AssetManager()
     cor = CorrelationEngine()
-    return pm, cor
+    health = HealthEngine(state) # Rolls event impact up the topology the parsers build
+    feed = LogFeed(LOG_FILE, backlog=VIEW_EVENTS)
+    recent = deque(maxlen=VIEW_EVENTS) # Latest events, kept across reruns
+    lock = threading.Lock() # Sessions share the engines: one processes new lines at a time
+    return pm, cor, health, feed, recent, lock
 
-asset_mgr, corr_engine = get_pipeline()
+asset_mgr, corr_engine, health_engine, log_feed, recent_events, pipeline_lock = get_pipeline()
 
 def process_logs_for_ui():
-    """Reads the last N lines of the log file and updates local UI state."""
-    log_file = "logs/ontap_ems.log"
-    import os
-    if not os.path.exists(log_file): return []
-    
-    with open(log_file, "r") as f:
-        # Read last 200 lines for speed
-        lines = f.readlines()[-200:]
+    """Parses and correlates the lines appended since the last rerun; returns the latest events."""
+    with pipeline_lock:
+        return _process_new_lines()
+
+def _process_new_lines():
+    lines = log_feed.poll() # Only lines no earlier rerun has processed
     
-    events = []
     # Temporarily hook into our local components
     # We manually drive the parser -> state -> correlator flow
     from ontap_intelligence.parsers.service import parser_service
@@ -74,10 +85,11 @@ def process_logs_for_ui():
                 break
         
         if ue:
-            events.append(ue)
+            recent_events.append(ue)
             corr_engine._handle_event("event.unified", ue) # Update local correlator
+            health_engine.update(ue)
             
-    return events
+    return list(recent_events)
 
 # --- UI Layout ---
 
@@ -92,9 +104,10 @@ events = process_logs_for_ui()
 # Top Row: KPI
 col1, col2, col3 = st.columns(3)
 col1.metric("Active Incidents", len(corr_engine.buffer)) # Approximation
-col2.metric("Assets Discovered", len(state.assets))
+topology = state.snapshot() # Immutable view: never blocks parsing
+col2.metric("Assets Discovered", len(topology))
 criticals = sum(1 for e in events if e.impact_level >= 8)
-col3.metric("Critical Events (Last 200)", criticals)
+col3.metric(f"Critical Events (Last {len(events)})", criticals) # Lines that do not parse yield no event
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["Topology Graph", "Incidents & Correlation", "Live Events"])
@@ -105,15 +118,28 @@ with tab1:
     graph = graphviz.Digraph()
     graph.attr(rankdir='LR')
     
-    for asset_id, asset in state.assets.items():
-        color = "lightblue"
-        if asset.type == 'node': color = "lightgrey"
-        if asset.type == 'aggr': color = "lightgreen"
-        if asset.type == 'disk': color = "white"
-        
-        graph.node(asset.id, f"{asset.type.upper()}\n{asset.id}", style="filled", fillcolor=color)
-        if asset.parent_id:
-            graph.edge(asset.parent_id, asset.id)
+    # One box per cluster (asset ids are '<cluster>:<name>')
+    by_cluster = {}
+    for asset in topology.assets.values():
+        by_cluster.setdefault(split_id(asset.id)[0], []).append(asset)
+
+    for cluster, assets in sorted(by_cluster.items()):
+        with graph.subgraph(name=f"cluster_{cluster}") as sub:
+            sub.attr(label=cluster)
+            for asset in assets:
+                color = "lightblue"
+                if asset.type == 'node': color = "lightgrey"
+                if asset.type == 'aggr': color = "lightgreen"
+                if asset.type == 'disk': color = "white"
+                if asset.status == 'degraded': color = "orange"
+                if asset.status == 'critical': color = "salmon"
+
+                # graphviz reads ':' in edge endpoints as a port
+                gv_id = asset.id.replace(":", "/")
+                name = split_id(asset.id)[1]
+                sub.node(gv_id, f"{asset.type.upper()}\n{name}\n{asset.health_score:.0f}%", style="filled", fillcolor=color)
+                if asset.parent_id:
+                    sub.edge(asset.parent_id.replace(":", "/"), gv_id)
             
     st.graphviz_chart(graph)
 
@@ -141,6 +167,22 @@ with tab2:
 
 with tab3:
     st.header("Unified Event Stream")
+
+    # Heavy hitters & distinct counts for the current view (fixed-memory sketches)
+    sketches = WindowSketches()
+    for e in events:
+        sketches.update(e)
+    summary = sketches.summary()
+
+    card_cols = st.columns(len(summary['cardinality']))
+    for col, (name, value) in zip(card_cols, summary['cardinality'].items()):
+        col.metric(name.replace('_', ' ').title(), value)
+
+    top_cols = st.columns(len(summary['top_k']))
+    for col, (dim, items) in zip(top_cols, summary['top_k'].items()):
+        col.caption(f"Top {dim.title()}")
+        col.dataframe(pd.DataFrame(items, columns=[dim, "count"]), hide_index=True)
+
     # Table of valid events
     data = [{
         "Time": e.timestamp_str,
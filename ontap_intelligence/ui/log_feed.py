@@ -0,0 +1,75 @@
+"""
+log_feed.py
+
+Offset-tracked feed of a raw EMS log for the command center (ui/dashboard.py).
+The first poll seeks backward from EOF in blocks for the last `backlog` lines, so
+its cost is independent of the file size. Later polls return the complete lines
+appended since (core/log_index.LogTail: a rotated or truncated file is read again
+from its start), so every line is handed out (parsed, correlated) exactly once
+across Streamlit reruns.
+"""
+
+import os
+import threading
+from typing import BinaryIO, List, Tuple
+
+from ontap_intelligence.core.log_index import LogTail
+
+
+def tail_lines(f: BinaryIO, end: int, n: int, block_size: int = 1 << 16) -> Tuple[List[str], int]:
+    """
+    The last n complete lines of a binary file before byte `end`, reading backward
+    in blocks. Returns (lines, offset just past the last complete line).
+    """
+    chunks: List[bytes] = []
+    newlines = 0
+    pos = end
+    while pos > 0 and newlines <= n: # One extra newline: the line before the first kept one ends
+        size = min(block_size, pos)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size)
+        chunks.append(chunk)
+        newlines += chunk.count(b"\n")
+    data = b"".join(reversed(chunks))
+    complete = data.rfind(b"\n") + 1
+    if not complete:
+        return [], pos
+    if n <= 0: # lines[-0:] would be all of them; still read back to the last line end
+        return [], pos + complete
+    lines = data[:complete - 1].split(b"\n")
+    if pos > 0:
+        lines = lines[1:] # Starts mid-line
+    return [line.decode('utf-8', errors='replace') for line in lines[-n:]], pos + complete
+
+
+class LogFeed:
+    def __init__(self, path: str, backlog: int = 200, block_size: int = 1 << 16, max_bytes: int = 8 << 20):
+        """
+        :param backlog: Lines the first poll returns (from the end of the file).
+        :param max_bytes: Most bytes one poll reads; a larger backlog of appended lines
+                          is returned over the following polls.
+        """
+        self.path = path
+        self.backlog = backlog
+        self.block_size = block_size
+        self.tail = LogTail(path, max_bytes=max_bytes)
+        self.lines = 0
+        self._lock = threading.Lock() # Streamlit sessions share one feed
+
+    def poll(self) -> List[str]:
+        """Lines not returned by an earlier poll."""
+        with self._lock:
+            if self.tail.inode is None:
+                try:
+                    f = open(self.path, "rb")
+                except FileNotFoundError:
+                    return []
+                with f:
+                    st = os.fstat(f.fileno())
+                    lines, offset = tail_lines(f, st.st_size, self.backlog, self.block_size)
+                self.tail.seek(offset, st.st_ino)
+            else:
+                lines = self.tail.read_new()
+            self.lines += len(lines)
+            return lines
@@ -14,9 +14,8 @@ import joblib
 
 # Import our project modules
 # Note: When running streamlit, the CWD is usually the project root if run from there.
-from src.parser import LogParser
-from src.feature_engine import FeatureEngineer
 from src.anomaly_detector import OntapAnomalyDetector
+from src.log_reader import LiveLogView
 
 # --- Configuration ---
 LOG_FILE = "logs/ontap_ems.log"
@@ -43,29 +42,20 @@ def load_detector():
             return None
     return None
 
-def read_and_process_logs():
+@st.cache_resource
+def load_log_view():
+    # Kept across reruns: remembers the file offset, feature windows and scores
+    return LiveLogView(LOG_FILE, freq="10s")
+
+def read_and_process_logs(window_min, detector):
     """
-    Reads the entire log file and processes it using the existing pipeline.
-    In a high-throughput prod env, this would read from a DB or sliding window buffer.
+    Parses only the lines appended since the last refresh and returns the last
+    window_min minutes of 10-second feature windows, scored by the detector
+    (only windows that are new or changed since the last refresh are scored).
     """
-    if not os.path.exists(LOG_FILE):
-        return pd.DataFrame()
-
-    # 1. Parse
-    parser = LogParser()
-    logs = list(parser.parse_file(LOG_FILE))
-    
-    if not logs:
-        return pd.DataFrame()
-
-    # 2. Features
-    engine = FeatureEngineer()
-    engine.ingest_stream(logs)
-    
-    # Aggregate to 10-second windows for granular visualization
-    df = engine.aggregate_window(freq="10s")
-    
-    return df
+    log_view = load_log_view()
+    log_view.refresh()
+    return log_view.view(window_min, detector)
 
 # --- Main Dashboard ---
 
@@ -86,22 +76,16 @@ placeholder = st.empty()
 
 while True:
     with placeholder.container():
-        # Get Data
-        df = read_and_process_logs()
+        # Get Data (last window_min minutes, with inference)
+        view_df = read_and_process_logs(window_min, detector)
         
-        if df.empty:
+        if view_df.empty:
             st.warning("No logs found. Is the simulator running?")
             time.sleep(REFRESH_RATE)
             continue
 
-        # Filter by Time Window
-        now = df.index.max()
-        cutoff = now - pd.Timedelta(minutes=window_min)
-        view_df = df[df.index >= cutoff].copy()
-
-        # Run Inference
         if detector:
-            results = detector.predict(view_df)
+            results = view_df
         else:
             results = view_df.copy()
             results['is_anomaly'] = 1 # Default normal
@@ -84,6 +84,86 @@ class FeatureEngineer:
 
         return features
 
+class IncrementalFeatureTable:
+    """
+    FeatureEngineer.aggregate_window, maintained as parsed logs arrive: each log
+    updates only its own window's counters, so a refresh costs O(new logs + rows viewed)
+    instead of re-aggregating the whole history.
+    freq must divide a day (10s, 1min, 5min...), as resample bins are then plain floors.
+    """
+    COLUMNS = ['log_count', 'error_count', 'warning_count', 'vol_full_events', 'avg_latency', 'unique_nodes']
+
+    def __init__(self, freq="10s", retain=timedelta(hours=2)):
+        """
+        :param retain: Windows older than this (relative to the newest) are dropped.
+        """
+        self.freq = pd.Timedelta(freq)
+        self.step = int(self.freq.total_seconds())
+        self.retain = retain
+        self.windows = {} # window start -> [count, errors, warnings, vol_full, latency sum, latency count, nodes]
+        self.changed = set() # Windows updated since take_changed()
+        self.latest = None # Newest window start
+        self._extract_latency = FeatureEngineer()._extract_latency
+
+    def clear(self):
+        self.windows.clear()
+        self.changed.clear()
+        self.latest = None
+
+    def ingest_stream(self, parsed_logs):
+        for log in parsed_logs:
+            ts = log['timestamp']
+            if ts is None:
+                continue
+            start = ts - timedelta(seconds=(ts.hour * 3600 + ts.minute * 60 + ts.second) % self.step,
+                                   microseconds=ts.microsecond)
+            acc = self.windows.get(start)
+            if acc is None:
+                acc = self.windows[start] = [0, 0, 0, 0, 0, 0, set()]
+            acc[0] += 1
+            if log['severity'] in ['ERROR', 'ALERT', 'EMERGENCY']:
+                acc[1] += 1
+            elif log['severity'] == 'WARNING':
+                acc[2] += 1
+            if log['event'] == 'monitor.volume.nearlyFull':
+                acc[3] += 1
+            elif log['event'] == 'qos.latency.high':
+                acc[4] += self._extract_latency(log['message'])
+                acc[5] += 1
+            acc[6].add(log['node'])
+            self.changed.add(start)
+            if self.latest is None or start > self.latest:
+                self.latest = start
+        self._prune()
+
+    def _prune(self):
+        if self.latest is None or len(self.windows) * self.freq <= 2 * self.retain:
+            return
+        cutoff = self.latest - self.retain
+        for start in [w for w in self.windows if w < cutoff]:
+            del self.windows[start]
+
+    def take_changed(self):
+        """Windows updated since the last call."""
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def frame(self, since=None):
+        """
+        Feature rows from the window containing `since` (default: the oldest kept)
+        to the newest, empty windows included - as aggregate_window() over the same logs.
+        """
+        if self.latest is None:
+            return pd.DataFrame()
+        first = min(self.windows) if since is None else max(pd.Timestamp(since).floor(self.freq), min(self.windows))
+        index = pd.date_range(first, self.latest, freq=self.freq, name='timestamp')
+        empty = [0, 0, 0, 0, 0, 0, ()]
+        rows = []
+        for start in index:
+            count, errors, warnings, vol_full, lat_sum, lat_n, nodes = self.windows.get(start, empty)
+            rows.append((count, errors, warnings, vol_full, lat_sum / lat_n if lat_n else 0.0, len(nodes)))
+        return pd.DataFrame(rows, index=index, columns=self.COLUMNS)
+
 if __name__ == "__main__":
     # Test stub
     pass
@@ -0,0 +1,319 @@
+"""
+history_generator.py
+
+High-volume synthetic EMS history with a simulated clock.
+Unlike OntapLogGenerator.generate_log() (one line, wall-clock timestamp), this
+advances simulated time with Poisson inter-arrivals (diurnal rate curve), injects
+labeled failure scenarios, and renders lines in batches from pre-built value pools.
+Seedable: the same seed always yields the same history and labels.
+
+Run with: python -m src.history_generator --hours 24 --rate 50 --out logs/history.log
+"""
+
+import argparse
+import bisect
+import datetime
+import math
+import random
+import string
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.log_generator import OntapLogGenerator
+from src.patterns import TEMPLATES, NODES
+
+# Default class mix, same as OntapLogGenerator: 90% Noise, 9% Warning, 1% Failure
+DEFAULT_MIX = {"N": 0.90, "W": 0.09, "F": 0.01}
+
+# Candidate values per template placeholder (mirrors OntapLogGenerator._generate_dynamic_values)
+VALUE_POOLS: Dict[str, List[str]] = {
+    'disk_id': [f"{a}.{b}" for a in range(10) for b in range(25)],
+    'shelf_id': [str(i) for i in range(1, 6)],
+    'aggr_name': [f"aggr{i}_{t}" for i in range(1, 5) for t in ('ssd', 'sata')],
+    'raid_group': [f"rg{i}" for i in range(6)],
+    'lif_name': [f"lif_{r}_{i}" for r in ('data', 'cluster', 'mgmt') for i in range(100, 1000)],
+    'port': ['e0a', 'e0b', 'e1a', 'e1b'],
+    'vserver': [f"svm{i}" for i in range(1, 11)],
+    'vol_name': [f"vol_{d}_{i}" for d in ('finance', 'hr', 'eng', 'marketing') for i in range(1, 51)],
+    'dest_vol': [f"dp_vol_{i}" for i in range(1, 51)],
+    'usage': [str(i) for i in range(95, 100)],
+    'latency': [str(i) for i in range(50, 501)],
+    'threshold': ['20'],
+    'workload_name': [f"policy_group_{i}" for i in range(1, 6)],
+    'fan_id': [str(i) for i in range(1, 7)],
+    'reason': ["Network timeout", "Transfer stalled", "Snapshot missing"],
+    'trap_event': ["linkUp", "linkDown", "coldStart", "authFailure"],
+    'trap_dest': ["192.168.1.10"],
+    'user': ["admin", "ansible_svc", "monitoring"],
+    'command': ["vol show", "lun map", "snapmirror update", "net int show"],
+    'scan_type': ["active_fcp", "snapshot_reclaim", "deswizzler"],
+    'days': [str(i) for i in range(10, 301)],
+    'hours': [str(i) for i in range(24)],
+}
+
+SCENARIOS = ("disk_raid_cascade", "lif_flap", "latency_storm")
+
+
+@dataclass
+class ScenarioLabel:
+    """Ground truth for one injected scenario."""
+    name: str
+    node: str
+    start: datetime.datetime
+    end: datetime.datetime
+    asset_id: str
+    expect_incident: bool = False # True if CorrelationEngine has a rule for it
+    lines: int = 0
+
+
+@dataclass
+class _Template:
+    pattern_id: str
+    prefix_fmt: str # "<{prival}>{ts} [{node}:event:SEV]: " without ts/node filled
+    message_template: str
+    fields: List[str] = field(default_factory=list)
+
+
+class HistoryGenerator:
+    def __init__(self, seed: Optional[int] = None, rate: float = 20.0, nodes: Optional[List[str]] = None,
+                 mix: Optional[Dict[str, float]] = None, diurnal_amplitude: float = 0.5):
+        """
+        :param seed: RNG seed for reproducible histories.
+        :param rate: Mean background lines per simulated second.
+        :param nodes: Node names to emit from (defaults to patterns.NODES).
+        :param mix: Class weights for N/W/F patterns.
+        :param diurnal_amplitude: 0 = flat rate, 0.5 = +/-50% day/night swing.
+        """
+        self.rng = random.Random(seed)
+        self.rate = rate
+        self.nodes = list(nodes or NODES)
+        self.diurnal_amplitude = diurnal_amplitude
+        self.labels: List[ScenarioLabel] = []
+        self._ts_cache: Dict[int, str] = {}
+
+        prival = OntapLogGenerator()._get_prival
+        self.templates: Dict[str, _Template] = {}
+        for pid, t in TEMPLATES.items():
+            fields = [f for _, f, _, _ in string.Formatter().parse(t['message_template']) if f]
+            self.templates[pid] = _Template(
+                pattern_id=pid,
+                prefix_fmt=f"<{prival(t['severity'])}>{{ts}} [{{node}}:{t['event']}:{t['severity']}]: ",
+                message_template=t['message_template'],
+                fields=fields
+            )
+
+        # Per-pattern weights from the class mix
+        mix = mix or DEFAULT_MIX
+        self.pattern_ids = list(TEMPLATES.keys())
+        class_sizes = {c: sum(1 for p in self.pattern_ids if p.startswith(c)) for c in mix}
+        self.pattern_weights = [
+            mix.get(p[0], 0.0) / class_sizes[p[0]] if class_sizes.get(p[0]) else 0.0
+            for p in self.pattern_ids
+        ]
+
+    # --- Rendering ---
+    def _ts(self, epoch: float) -> str:
+        """Syslog timestamp, cached per simulated second."""
+        sec = int(epoch)
+        ts = self._ts_cache.get(sec)
+        if ts is None:
+            if len(self._ts_cache) > 100000:
+                self._ts_cache.clear()
+            ts = time.strftime("%b %d %H:%M:%S", time.localtime(sec))
+            self._ts_cache[sec] = ts
+        return ts
+
+    def render(self, pattern_id: str, epoch: float, node: str, values: Dict[str, str]) -> str:
+        t = self.templates[pattern_id]
+        return t.prefix_fmt.format(ts=self._ts(epoch), node=node) + t.message_template.format(**values)
+
+    def _render_batch(self, times: List[float], pids: List[str], nodes: List[str]) -> List[str]:
+        """Renders a batch, drawing each placeholder's values in one call per template."""
+        rng = self.rng
+        by_pattern: Dict[str, List[int]] = {}
+        for i, pid in enumerate(pids):
+            by_pattern.setdefault(pid, []).append(i)
+
+        lines: List[Optional[str]] = [None] * len(pids)
+        for pid, idxs in by_pattern.items():
+            t = self.templates[pid]
+            k = len(idxs)
+            columns = [rng.choices(VALUE_POOLS[f], k=k) for f in t.fields]
+            prefix_fmt, msg_fmt, fields = t.prefix_fmt, t.message_template, t.fields
+            for j, i in enumerate(idxs):
+                values = {f: col[j] for f, col in zip(fields, columns)}
+                lines[i] = prefix_fmt.format(ts=self._ts(times[i]), node=nodes[i]) + msg_fmt.format(**values)
+        return lines
+
+    def generate_batch(self, times: List[float]) -> List[str]:
+        """Renders one background line per epoch timestamp (pattern and node drawn by weight)."""
+        n = len(times)
+        pids = self.rng.choices(self.pattern_ids, weights=self.pattern_weights, k=n)
+        nodes = self.rng.choices(self.nodes, k=n)
+        return self._render_batch(times, pids, nodes)
+
+    # --- Scenarios ---
+    def _pick(self, field_name: str) -> str:
+        return self.rng.choice(VALUE_POOLS[field_name])
+
+    def _scenario_events(self, name: str, t0: float) -> Tuple[ScenarioLabel, List[Tuple[float, str]]]:
+        """Builds the labeled line sequence for one scenario starting at simulated time t0."""
+        rng = self.rng
+        node = rng.choice(self.nodes)
+        events: List[Tuple[float, str]] = []
+
+        def values(pid, **fixed):
+            vals = {f: self._pick(f) for f in self.templates[pid].fields}
+            vals.update(fixed)
+            return vals
+
+        if name == "disk_raid_cascade":
+            # Latency precursors -> Disk failure -> RAID degraded (same node)
+            workload = self._pick('workload_name')
+            for i in range(rng.randint(2, 5)):
+                t = t0 + i * rng.uniform(2, 10)
+                events.append((t, self.render("W02", t, node, values("W02", workload_name=workload))))
+            t_disk = events[-1][0] + rng.uniform(5, 30)
+            disk = self._pick('disk_id')
+            events.append((t_disk, self.render("F01", t_disk, node, values("F01", disk_id=disk))))
+            t_raid = t_disk + rng.uniform(1, 45)
+            aggr = self._pick('aggr_name')
+            events.append((t_raid, self.render("F02", t_raid, node, values("F02", aggr_name=aggr))))
+            asset, expect = aggr, True
+
+        elif name == "lif_flap":
+            lif = self._pick('lif_name')
+            vals = values("F03", lif_name=lif)
+            t = t0
+            for _ in range(rng.randint(3, 8)):
+                events.append((t, self.render("F03", t, node, vals)))
+                t += rng.uniform(5, 30)
+            asset, expect = lif, False
+
+        elif name == "latency_storm":
+            workload = self._pick('workload_name')
+            t = t0
+            for _ in range(rng.randint(30, 200)):
+                vals = values("W02", workload_name=workload, latency=str(rng.randint(200, 500)))
+                events.append((t, self.render("W02", t, node, vals)))
+                t += rng.expovariate(2.0)
+            asset, expect = workload, False
+
+        else:
+            raise ValueError(f"Unknown scenario: {name}")
+
+        label = ScenarioLabel(
+            name=name,
+            node=node,
+            start=datetime.datetime.fromtimestamp(events[0][0]),
+            end=datetime.datetime.fromtimestamp(events[-1][0]),
+            asset_id=asset,
+            expect_incident=expect,
+            lines=len(events)
+        )
+        return label, events
+
+    def _schedule_scenarios(self, t_start: float, t_end: float, scenarios_per_hour: float,
+                            scenario_names) -> List[Tuple[float, str]]:
+        """Merged, time-ordered list of all injected scenario lines in [t_start, t_end)."""
+        injected: List[Tuple[float, str]] = []
+        if scenarios_per_hour <= 0:
+            return injected
+        t = t_start + self.rng.expovariate(scenarios_per_hour / 3600.0)
+        while t < t_end:
+            label, events = self._scenario_events(self.rng.choice(scenario_names), t)
+            if events[-1][0] >= t_end:
+                break # Would be cut off by the end of the history
+            self.labels.append(label)
+            injected.extend(events)
+            t += self.rng.expovariate(scenarios_per_hour / 3600.0)
+        injected.sort(key=lambda e: e[0])
+        return injected
+
+    # --- Generation ---
+    def _rate_at(self, epoch: float) -> float:
+        """Background rate with a diurnal curve (peak mid-afternoon, trough at night)."""
+        hour = time.localtime(epoch).tm_hour + (epoch % 3600) / 3600.0
+        return self.rate * (1 + self.diurnal_amplitude * math.sin(2 * math.pi * (hour - 9) / 24))
+
+    def iter_batches(self, duration: datetime.timedelta, start: Optional[datetime.datetime] = None,
+                     batch_size: int = 10000, scenarios_per_hour: float = 0.0,
+                     scenario_names=SCENARIOS) -> Iterator[List[str]]:
+        """
+        Yields time-ordered batches of log lines covering `duration` of simulated time.
+        Defaults to ending at the current wall time, so LogParser's year inference holds.
+        Ground truth for injected scenarios accumulates in self.labels.
+        """
+        if start is None:
+            start = datetime.datetime.now() - duration
+        t = start.timestamp()
+        t_end = t + duration.total_seconds()
+
+        injected = self._schedule_scenarios(t, t_end, scenarios_per_hour, scenario_names)
+        inj_times = [e[0] for e in injected]
+        inj_pos = 0
+
+        rng = self.rng
+        while t < t_end:
+            # 1. Draw inter-arrival gaps at the current (locally constant) rate
+            rate = max(self._rate_at(t), 1e-6)
+            times = []
+            for _ in range(batch_size):
+                t += rng.expovariate(rate)
+                if t >= t_end:
+                    break
+                times.append(t)
+
+            # 2. Batched categorical draws + rendering
+            lines = self.generate_batch(times)
+
+            # 3. Splice in scenario lines that fall inside this batch
+            batch_end = t if t < t_end else t_end
+            inj_stop = bisect.bisect_right(inj_times, batch_end, lo=inj_pos)
+            if inj_stop > inj_pos:
+                merged = list(zip(times, lines)) + injected[inj_pos:inj_stop]
+                merged.sort(key=lambda e: e[0])
+                lines = [line for _, line in merged]
+                inj_pos = inj_stop
+
+            if lines:
+                yield lines
+
+    def iter_lines(self, duration: datetime.timedelta, **kwargs) -> Iterator[str]:
+        for batch in self.iter_batches(duration, **kwargs):
+            yield from batch
+
+    def write(self, filepath: str, duration: datetime.timedelta, **kwargs) -> int:
+        """Writes the history to a file. Returns the number of lines written."""
+        count = 0
+        with open(filepath, 'w', buffering=1 << 20) as f:
+            for batch in self.iter_batches(duration, **kwargs):
+                f.write("\n".join(batch))
+                f.write("\n")
+                count += len(batch)
+        return count
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate synthetic ONTAP EMS history.")
+    ap.add_argument("--hours", type=float, default=24.0, help="Simulated duration")
+    ap.add_argument("--rate", type=float, default=20.0, help="Mean background lines per simulated second")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--scenarios-per-hour", type=float, default=1.0)
+    ap.add_argument("--out", default="logs/history.log")
+    args = ap.parse_args()
+
+    gen = HistoryGenerator(seed=args.seed, rate=args.rate)
+    t0 = time.perf_counter()
+    count = gen.write(args.out, datetime.timedelta(hours=args.hours),
+                      scenarios_per_hour=args.scenarios_per_hour)
+    elapsed = time.perf_counter() - t0
+
+    print(f"Wrote {count} lines to {args.out} in {elapsed:.1f}s ({count / elapsed * 60:,.0f} lines/min)")
+    print(f"Injected {len(gen.labels)} scenarios:")
+    for label in gen.labels:
+        print(f"  {label.start:%H:%M:%S} {label.name:<18} node={label.node} asset={label.asset_id}")
+
+if __name__ == "__main__":
+    main()
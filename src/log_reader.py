@@ -0,0 +1,68 @@
+"""
+log_reader.py
+
+Incremental reading of a growing log file for the live dashboard.
+LiveLogView keeps the parsed features and anomaly scores across dashboard
+refreshes. The first refresh starts at the newest `retain` of the log (found via
+its time index, see ontap_intelligence/core/log_index.py); later ones parse only
+the lines LogTail returns as appended since, and score only windows that changed.
+"""
+
+import os
+import threading
+from datetime import timedelta
+
+import pandas as pd
+
+from ontap_intelligence.core.log_index import LogTail
+from src.feature_engine import IncrementalFeatureTable
+from src.parser import LogParser
+
+class LiveLogView:
+    def __init__(self, path, freq="10s", retain=timedelta(hours=2)):
+        self.reader = LogTail(path)
+        self.parser = LogParser()
+        self.features = IncrementalFeatureTable(freq, retain)
+        self.scores = {} # window start -> (score, is_anomaly), for windows unchanged since scored
+        self.lines_parsed = 0
+        self._lock = threading.Lock() # Shared by every dashboard session
+
+    def refresh(self):
+        """Parses the lines appended since the last refresh. Returns how many."""
+        with self._lock:
+            if self.reader.inode is None and os.path.exists(self.reader.path):
+                # Older lines would only be parsed to be dropped (retain)
+                self.reader.seek_last(self.features.retain.total_seconds())
+            lines = self.reader.read_new()
+            if self.reader.rotated:
+                self.features.clear()
+                self.scores.clear()
+            self.features.ingest_stream(filter(None, map(self.parser.parse_line, lines)))
+            for start in self.features.take_changed():
+                self.scores.pop(start, None)
+            if len(self.scores) > len(self.features.windows) * 2:
+                oldest = min(self.features.windows)
+                self.scores = {w: s for w, s in self.scores.items() if w >= oldest}
+            self.lines_parsed += len(lines)
+            return len(lines)
+
+    def view(self, minutes, detector=None):
+        """
+        The last `minutes` of feature windows (ending at the newest), with 'score' and
+        'is_anomaly' from detector.predict() - run only on windows not scored before.
+        """
+        with self._lock:
+            if self.features.latest is None:
+                return pd.DataFrame()
+            df = self.features.frame(since=self.features.latest - timedelta(minutes=minutes))
+            if detector is None:
+                return df
+            unscored = [start for start in df.index if start not in self.scores]
+            if unscored:
+                # Isolation Forest scores each row on its own, so cached scores stay valid
+                scored = detector.predict(df.loc[unscored])
+                self.scores.update(zip(unscored, zip(scored['score'], scored['is_anomaly'])))
+            results = df.copy()
+            results['score'] = [self.scores[start][0] for start in df.index]
+            results['is_anomaly'] = [self.scores[start][1] for start in df.index]
+            return results
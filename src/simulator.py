@@ -3,13 +3,24 @@ simulator.py
 
 Simulates a live ONTAP system by writing logs to a file.
 Handles log rotation and simulates different scenarios.
+
+Two modes:
+- Simulator: human-paced demo traffic (one line every 0.1-1.5s).
+- LoadSimulator: sustained target rate (constant/ramp/burst) for a fleet of
+  N clusters x M nodes, batched writes to a file (own rotation) or UDP syslog.
+
+Run with: python -m src.simulator --load --rate 20000 --clusters 4 --nodes 4
 """
 
 import time
 import os
 import random
 import datetime
+import argparse
+import socket
+from typing import List, Optional
 from src.log_generator import OntapLogGenerator
+from src.history_generator import HistoryGenerator
 
 LOG_FILE = "logs/ontap_ems.log"
 MAX_BYTES = 5 * 1024 * 1024 # 5 MB
@@ -68,6 +79,193 @@ class Simulator:
         except KeyboardInterrupt:
             print("\nSimulator stopped.")
 
+
+# --- High-rate load generation ---
+
+def fleet_nodes(clusters: int, nodes_per_cluster: int) -> List[str]:
+    """Node names for N clusters x M nodes, in the same scheme as patterns.NODES."""
+    return [f"ontap-cluster-{c:02d}-{n:02d}"
+            for c in range(1, clusters + 1) for n in range(1, nodes_per_cluster + 1)]
+
+class RateProfile:
+    """
+    Target lines/s as a function of elapsed seconds.
+    - constant: always `rate`
+    - ramp:     linear from `start_rate` to `rate` over `ramp_seconds`, then flat
+    - burst:    `rate`, multiplied by `burst_factor` for `burst_seconds` every `burst_period`
+    """
+    def __init__(self, kind="constant", rate=1000.0, start_rate=0.0, ramp_seconds=60.0,
+                 burst_factor=10.0, burst_seconds=5.0, burst_period=60.0):
+        if kind not in ("constant", "ramp", "burst"):
+            raise ValueError(f"Unknown rate profile: {kind}")
+        self.kind = kind
+        self.rate = rate
+        self.start_rate = start_rate
+        self.ramp_seconds = ramp_seconds
+        self.burst_factor = burst_factor
+        self.burst_seconds = burst_seconds
+        self.burst_period = burst_period
+
+    def rate_at(self, elapsed: float) -> float:
+        if self.kind == "ramp":
+            if elapsed >= self.ramp_seconds:
+                return self.rate
+            return self.start_rate + (self.rate - self.start_rate) * elapsed / self.ramp_seconds
+        if self.kind == "burst":
+            if elapsed % self.burst_period < self.burst_seconds:
+                return self.rate * self.burst_factor
+        return self.rate
+
+class FileSink:
+    """
+    Buffered append-only writer with size-based rotation.
+    Tracks bytes written itself instead of stat()-ing the file per line.
+    """
+    def __init__(self, path=LOG_FILE, max_bytes=MAX_BYTES, rotation_count=ROTATION_COUNT,
+                 buffer_size=1 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotation_count = rotation_count
+        self.buffer_size = buffer_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        self._f = open(self.path, "a", encoding="utf-8", buffering=self.buffer_size)
+        self._bytes = self._f.tell()
+
+    def _rotate(self):
+        self._f.close()
+        for i in range(self.rotation_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i+1}")
+        os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def write_batch(self, lines: List[str]):
+        data = "\n".join(lines) + "\n"
+        self._f.write(data)
+        self._bytes += len(data.encode("utf-8")) # max_bytes is a file size: count bytes, not characters
+        if self._bytes >= self.max_bytes:
+            self._rotate()
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+class UdpSink:
+    """Sends each line as one syslog datagram (RFC 3164 style)."""
+    def __init__(self, host="127.0.0.1", port=514):
+        self.addr = (host, port)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write_batch(self, lines: List[str]):
+        sendto, addr = self._sock.sendto, self.addr
+        for line in lines:
+            sendto(line.encode("utf-8"), addr)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._sock.close()
+
+class LoadSimulator:
+    """
+    Sustains a target line rate using fixed ticks: each tick emits however many lines
+    are owed by the rate profile, rendered and written as one batch.
+    """
+    def __init__(self, sink, profile: RateProfile, clusters=2, nodes_per_cluster=2,
+                 tick_seconds=0.05, seed: Optional[int] = None):
+        self.sink = sink
+        self.profile = profile
+        self.tick = tick_seconds
+        self.generator = HistoryGenerator(seed=seed, nodes=fleet_nodes(clusters, nodes_per_cluster))
+        self.emitted = 0
+
+    def run(self, duration: Optional[float] = None, report_every: float = 1.0):
+        print(f"Starting load simulator: {self.profile.kind} profile, "
+              f"{len(self.generator.nodes)} nodes, target {self.profile.rate:,.0f} lines/s")
+        start = time.monotonic()
+        owed = 0.0
+        last_t = start
+        last_report, last_emitted = start, 0
+
+        try:
+            while True:
+                now = time.monotonic()
+                elapsed = now - start
+                if duration is not None and elapsed >= duration:
+                    break
+
+                # 1. Lines owed since the previous tick
+                owed += self.profile.rate_at(elapsed) * (now - last_t)
+                last_t = now
+                n = int(owed)
+                if n:
+                    owed -= n
+                    epoch = time.time()
+                    self.sink.write_batch(self.generator.generate_batch([epoch] * n))
+                    self.emitted += n
+
+                # 2. Report achieved rate
+                if now - last_report >= report_every:
+                    rate = (self.emitted - last_emitted) / (now - last_report)
+                    print(f"[LoadSimulator] {rate:,.0f} lines/s "
+                          f"(target {self.profile.rate_at(elapsed):,.0f}, total {self.emitted:,})")
+                    self.sink.flush()
+                    last_report, last_emitted = now, self.emitted
+
+                # 3. Sleep until the next tick (no sleep if generation is falling behind)
+                delay = self.tick - (time.monotonic() - now)
+                if delay > 0:
+                    time.sleep(delay)
+
+        except KeyboardInterrupt:
+            print("\nLoad simulator stopped.")
+        finally:
+            self.sink.flush()
+            self.sink.close()
+
+        total = time.monotonic() - start
+        print(f"Emitted {self.emitted:,} lines in {total:.1f}s ({self.emitted / max(total, 1e-9):,.0f} lines/s)")
+        return self.emitted
+
+def main():
+    ap = argparse.ArgumentParser(description="ONTAP EMS log simulator.")
+    ap.add_argument("--load", action="store_true", help="High-rate load generation mode")
+    ap.add_argument("--rate", type=float, default=1000.0, help="Target lines/s (peak for ramp)")
+    ap.add_argument("--profile", choices=["constant", "ramp", "burst"], default="constant")
+    ap.add_argument("--ramp-seconds", type=float, default=60.0)
+    ap.add_argument("--burst-factor", type=float, default=10.0)
+    ap.add_argument("--clusters", type=int, default=2)
+    ap.add_argument("--nodes", type=int, default=2, help="Nodes per cluster")
+    ap.add_argument("--sink", choices=["file", "udp"], default="file")
+    ap.add_argument("--out", default=LOG_FILE)
+    ap.add_argument("--udp-target", default="127.0.0.1:514", help="host:port")
+    ap.add_argument("--duration", type=float, default=None, help="Seconds (default: until Ctrl+C)")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    if not args.load:
+        Simulator().run()
+        return
+
+    if args.sink == "udp":
+        host, port = args.udp_target.rsplit(":", 1)
+        sink = UdpSink(host, int(port))
+    else:
+        sink = FileSink(args.out)
+
+    profile = RateProfile(args.profile, rate=args.rate, ramp_seconds=args.ramp_seconds,
+                          burst_factor=args.burst_factor)
+    LoadSimulator(sink, profile, clusters=args.clusters, nodes_per_cluster=args.nodes,
+                  seed=args.seed).run(duration=args.duration)
+
 if __name__ == "__main__":
-    sim = Simulator()
-    sim.run()
+    main()
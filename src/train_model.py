@@ -7,30 +7,30 @@ Generates synthetic history and trains the Isolation Forest model.
 import pandas as pd
 import os
 import shutil
-from src.log_generator import OntapLogGenerator
+import datetime
+from src.history_generator import HistoryGenerator
 from src.parser import LogParser
 from src.feature_engine import FeatureEngineer
 from src.anomaly_detector import OntapAnomalyDetector
 
 MODEL_PATH = "models/iso_forest.pkl"
-TRAIN_SIZE = 2000 # Number of log lines for training
+TRAIN_HOURS = 24 # Simulated history length
+TRAIN_RATE = 2.0 # Mean log lines per simulated second
+TRAIN_SEED = 42
 
 def generate_training_data():
     """
     Generates a batch of mostly normal logs.
     """
-    print(f"Generating {TRAIN_SIZE} synthetic logs...")
-    gen = OntapLogGenerator()
+    print(f"Generating {TRAIN_HOURS}h of synthetic logs at ~{TRAIN_RATE} lines/s...")
+    gen = HistoryGenerator(seed=TRAIN_SEED, rate=TRAIN_RATE)
     
     # We want mostly normal data for training to establish a baseline
     # But Isolation Forest handles some noise well.
-    logs = []
-    
-    # Simulate 24 hours of normal-ish traffic
-    for _ in range(TRAIN_SIZE):
-        # Force low probability of failure during training generation logic?
-        # The generator has built-in weights (90% Info), which is fine.
-        logs.append(gen.generate_log())
+    # Simulate 24 hours of normal-ish traffic on a simulated clock, so every
+    # 1-minute window of the day is represented (no injected scenarios).
+    logs = list(gen.iter_lines(datetime.timedelta(hours=TRAIN_HOURS)))
+    print(f"Generated {len(logs)} log lines.")
         
     return logs
 
@@ -7,6 +7,7 @@ Verifies that logs flow through ParserService and update the Asset Topology.
 import time
 import logging
 from ontap_intelligence.core.bus import bus
+from ontap_intelligence.core.clusters import qualify
 from ontap_intelligence.core.state import state
 from ontap_intelligence.parsers.service import parser_service
 
@@ -31,8 +32,9 @@ def main():
     
     # Check Topology
     print("\n--- Inspecting Knowledge Graph ---")
-    vol_asset = state.get_asset("vol_finance")
-    aggr_asset = state.get_asset("aggr_ssd_1")
+    # Asset ids are cluster-qualified: "node1" is a single-node cluster
+    vol_asset = state.get_asset(qualify("node1", "vol_finance"))
+    aggr_asset = state.get_asset(qualify("node1", "aggr_ssd_1"))
     
     if vol_asset:
         print(f"✅ Found Volume: {vol_asset}")
@@ -46,7 +48,7 @@ def main():
         print("❌ Aggregate not found in State!")
 
     # Verify dependency
-    if vol_asset and vol_asset.parent_id == "aggr_ssd_1":
+    if vol_asset and vol_asset.parent_id == qualify("node1", "aggr_ssd_1"):
         print("✅ Volume -> Aggregate dependency linked correctly.")
     else:
         print(f"❌ Dependency mismatch (Parent: {vol_asset.parent_id if vol_asset else 'None'})")
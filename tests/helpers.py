@@ -0,0 +1,27 @@
+"""
+helpers.py
+
+Fixtures shared by the unit tests.
+"""
+
+import datetime
+from ontap_intelligence.parsers.base import UnifiedEvent
+
+T0 = datetime.datetime(2026, 1, 22, 12, 0, 0)
+
+def make_event(event_name="callhome.snmp.trap.sent", node="node1", seconds=0, **fields):
+    """A UnifiedEvent `seconds` after T0. Any other UnifiedEvent field can be given by keyword."""
+    values = dict(
+        timestamp=T0 + datetime.timedelta(seconds=seconds),
+        timestamp_str="",
+        node=node,
+        subsystem='system',
+        event_name=event_name,
+        severity='INFO',
+        impact_level=0,
+        raw_message="",
+        parsed_fields={},
+        asset_id=None,
+    )
+    values.update(fields)
+    return UnifiedEvent(**values)
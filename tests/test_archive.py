@@ -0,0 +1,113 @@
+"""
+test_archive.py
+
+Unit tests for the Parquet event archive (skipped without pyarrow).
+"""
+
+import datetime
+import shutil
+import tempfile
+import unittest
+from ontap_intelligence.core.bus import EventBus
+from helpers import make_event
+
+try:
+    from ontap_intelligence.core.archive import EventArchive, iter_events, read_table, replay_to, scan_plan
+except ImportError:
+    EventArchive = None
+
+T0 = datetime.datetime(2026, 1, 22, 0, 0, 0)
+EVENTS = ["callhome.snmp.trap.sent"] * 6 + ["qos.latency.high"] * 3 + ["disk.outOfService"]
+
+def nth_event(i):
+    return make_event(
+        EVENTS[i % 10],
+        node=f"ontap-cluster-0{i % 2 + 1}-0{i % 4 // 2 + 1}",
+        timestamp=T0 + datetime.timedelta(seconds=20 * i),
+        severity='ERROR' if i % 10 == 9 else 'INFO',
+        impact_level=i % 10,
+        raw_message=f"message {i}",
+        parsed_fields={'seq': i} if i % 2 else {},
+        asset_id=f"ontap-cluster-0{i % 2 + 1}:1.{i % 24}" if i % 10 == 9 else None,
+    )
+
+@unittest.skipUnless(EventArchive, "pyarrow not installed")
+class TestEventArchive(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.events = [nth_event(i) for i in range(3 * 4320)] # 3 days, 20s apart
+        archive = EventArchive(self.dir, row_group_rows=500, late_sec=60, buffer_sec=2 * 86400)
+        for event in self.events[:5000]:
+            archive.append(event)
+        self.assertEqual(archive.stats()['files_written'], 2) # Day 1 of each cluster, once day 2 is 60s old
+        for event in self.events[5000:]:
+            archive.append(event)
+        archive.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip_in_time_order(self):
+        self.assertEqual(list(iter_events(self.dir)), self.events)
+        table = read_table(self.dir, columns=["timestamp", "node"])
+        self.assertEqual(table.column_names, ["timestamp", "node"])
+        self.assertEqual(table.column("timestamp").to_pylist(), [e.timestamp for e in self.events])
+        nodes = read_table(self.dir, columns=["node"]) # Still in time order without the timestamp
+        self.assertEqual(nodes.column_names, ["node"])
+        self.assertEqual(nodes.column("node").to_pylist(), [e.node for e in self.events])
+
+    def test_replay(self):
+        bus, replayed = EventBus(), []
+        bus.subscribe("event.unified", lambda t, e: replayed.append(e))
+        start = T0 + datetime.timedelta(hours=50)
+        self.assertEqual(replay_to(bus, self.dir, start=start, event_names=["disk.outOfService"]), len(replayed))
+        self.assertEqual(replayed, [e for e in self.events if e.timestamp >= start and e.event_name == "disk.outOfService"])
+
+    def test_filters_skip_partitions_and_row_groups(self):
+        start, end = T0 + datetime.timedelta(hours=30), T0 + datetime.timedelta(hours=31)
+        cases = [
+            (dict(start=start, end=end), lambda e: start <= e.timestamp <= end),
+            (dict(event_names=["disk.outOfService"]), lambda e: e.event_name == "disk.outOfService"),
+            (dict(nodes="ontap-cluster-02-01", start=start), lambda e: e.node == "ontap-cluster-02-01" and e.timestamp >= start),
+            (dict(clusters=["ontap-cluster-01"], severities=["ERROR"]),
+             lambda e: e.cluster == "ontap-cluster-01" and e.severity == "ERROR"),
+        ]
+        for filters, match in cases:
+            expected = [e for e in self.events if match(e)]
+            self.assertEqual(list(iter_events(self.dir, **filters)), expected, filters)
+            plan = scan_plan(self.dir, **filters)
+            self.assertGreaterEqual(plan['rows'], len(expected))
+            self.assertLess(plan['row_groups'], plan['total_row_groups'] / 2, filters)
+
+    def test_buffers_are_written_after_buffer_sec(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        archive = EventArchive(directory, late_sec=60, buffer_sec=3600)
+        for event in self.events[:900]: # 5 hours
+            archive.append(event)
+        self.assertEqual(archive.stats()['files_written'], 8) # 4 hours of each cluster
+        self.assertLessEqual(archive.stats()['buffered'], 180) # At most the last hour
+        archive.close()
+        self.assertEqual(list(iter_events(directory)), self.events[:900])
+
+    def test_restart_from_a_checkpoint(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        archive = EventArchive(directory, late_sec=60)
+        for event in self.events[:2000]:
+            archive.append(event)
+        saved = archive.checkpoint_state()
+        self.assertEqual(archive.stats()['buffered'], 0)
+        self.assertEqual(list(iter_events(directory)), self.events[:2000])
+        for event in self.events[2000:6000]: # Written and buffered events, then a crash
+            archive.append(event)
+
+        archive = EventArchive(directory, late_sec=60)
+        archive.restore_state(saved)
+        for event in self.events[2000:]: # The pipeline re-reads from the checkpoint
+            archive.append(event)
+        archive.close()
+        self.assertEqual(list(iter_events(directory)), self.events)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+test_checkpoint.py
+
+Unit tests for state checkpoints and resumable ingestion.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from ontap_intelligence.core.bus import EventBus
+from ontap_intelligence.core.checkpoint import CheckpointManager
+from ontap_intelligence.core.ingestion import LogIngestor
+from ontap_intelligence.core.state import AssetManager
+from ontap_intelligence.intelligence.correlation import CorrelationEngine
+from helpers import make_event
+
+def nth_event(i):
+    return make_event(seconds=i, subsystem='storage', severity='ERROR', impact_level=5,
+                      raw_message=f"message {i}", parsed_fields={'seq': i})
+
+class TestCheckpointManager(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def manager(self, assets, **kwargs):
+        manager = CheckpointManager(self.dir, assets=assets, **kwargs)
+        correlator = CorrelationEngine(window_seconds=300)
+        manager.register("correlation", correlator)
+        return manager, correlator
+
+    def test_round_trip(self):
+        assets = AssetManager()
+        assets.add_or_update_asset("node1", "node")
+        assets.add_or_update_asset("aggr1", "aggr")
+        assets.add_or_update_asset("aggr1", "aggr", parent_id="node1")
+        assets.set_asset_health("aggr1", 40.0, "degraded")
+        manager, correlator = self.manager(assets)
+        correlator.buffers = {"node1": [nth_event(i) for i in range(5)]}
+        position = {'file': "ems.log", 'inode': 1, 'offset': 1234}
+        ckpt_id = manager.write(position)
+        manager.close()
+
+        restored_assets = AssetManager()
+        manager, correlator = self.manager(restored_assets)
+        record = manager.restore()
+        self.assertEqual(record['id'], ckpt_id)
+        self.assertEqual(record['position'], position)
+        self.assertEqual(restored_assets.assets, assets.assets)
+        self.assertEqual([a.id for a in restored_assets.get_children("node1")], ["aggr1"])
+        self.assertEqual(correlator.buffer, [nth_event(i) for i in range(5)])
+        manager.close()
+
+    def test_topology_is_written_incrementally(self):
+        assets = AssetManager()
+        for i in range(100):
+            assets.add_or_update_asset(f"vol{i}", "volume")
+        manager, _ = self.manager(assets)
+        manager.write()
+        size = manager.last_bytes
+
+        assets.set_asset_health("vol7", 10.0, "critical")
+        manager.write()
+        topology = [p for p in os.listdir(self.dir) if p.startswith("topology-")]
+        self.assertEqual(len(topology), 1) # Same generation, one record appended
+        with open(os.path.join(self.dir, topology[0]), "rb") as f:
+            self.assertEqual(f.read().count(b"\n"), 101)
+        self.assertLess(manager.last_bytes - size, 200)
+        manager.close()
+
+        restored = AssetManager()
+        CheckpointManager(self.dir, assets=restored).restore()
+        self.assertEqual(restored.get_asset("vol7").status, "critical")
+        self.assertEqual(len(restored.assets), 100)
+
+    def test_compaction_and_retention(self):
+        assets = AssetManager()
+        assets.add_or_update_asset("vol1", "volume")
+        manager, _ = self.manager(assets, keep=2, compact_ratio=1.0)
+        for i in range(80):
+            assets.set_asset_health("vol1", float(i), "ok")
+            manager.write()
+        self.assertEqual(len(manager.checkpoint_ids()), 2)
+        topology = [p for p in os.listdir(self.dir) if p.startswith("topology-")]
+        self.assertLessEqual(len(topology), 2)
+        manager.close()
+
+        restored = AssetManager()
+        CheckpointManager(self.dir, assets=restored).restore()
+        self.assertEqual(restored.get_asset("vol1").health_score, 79.0)
+
+    def test_restoring_older_checkpoint_discards_newer(self):
+        assets = AssetManager()
+        manager, _ = self.manager(assets)
+        assets.add_or_update_asset("vol1", "volume")
+        first = manager.write()
+        assets.add_or_update_asset("vol2", "volume")
+        manager.write()
+        manager.close()
+
+        restored = AssetManager()
+        manager, _ = self.manager(restored)
+        manager.restore(first)
+        self.assertEqual(set(restored.assets), {"vol1"})
+        self.assertEqual(manager.checkpoint_ids(), [first])
+        manager.close()
+
+class TestResumableIngestion(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ems.log")
+        with open(self.path, "w") as f:
+            f.writelines(f"line {i}\n" for i in range(1000))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def ingest(self, position=None, pause_after=None):
+        bus = EventBus()
+        received = []
+        ingestor = LogIngestor({'ingestion': {'source_file': self.path, 'mode': "replay", 'poll_interval': 0.1}})
+        bus.subscribe("log.raw", lambda t, line: received.append(str(line)))
+        with mock.patch("ontap_intelligence.core.ingestion.bus", bus):
+            if pause_after is not None:
+                ingestor.pause(timeout=0) # Requested before the first line
+            ingestor.start(position=position)
+            if pause_after is not None:
+                self.assertTrue(ingestor.pause(timeout=5))
+                paused = (len(received), ingestor.position())
+                time.sleep(0.05)
+                self.assertEqual(len(received), paused[0]) # Nothing published while paused
+                ingestor.resume()
+            ingestor.join(timeout=10)
+        return received, ingestor.position(), (paused if pause_after is not None else None)
+
+    def test_pause_holds_at_line_boundary(self):
+        received, end, (count, position) = self.ingest(pause_after=0)
+        self.assertEqual(count, 0)
+        self.assertEqual(position['offset'], 0)
+        self.assertEqual(len(received), 1000)
+        self.assertEqual(end['offset'], os.path.getsize(self.path))
+
+    def test_resume_from_position(self):
+        offset = sum(len(f"line {i}\n") for i in range(600))
+        inode = os.stat(self.path).st_ino
+        received, _, _ = self.ingest(position={'file': self.path, 'inode': inode, 'offset': offset})
+        self.assertEqual(received[0], "line 600")
+        self.assertEqual(len(received), 400)
+
+    def test_rotated_file_is_read_from_start(self):
+        received, _, _ = self.ingest(position={'file': self.path, 'inode': -1, 'offset': 50})
+        self.assertEqual(len(received), 1000)
+
+if __name__ == '__main__':
+    unittest.main()
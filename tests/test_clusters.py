@@ -0,0 +1,90 @@
+"""
+test_clusters.py
+
+Unit tests for cluster-qualified identities and per-cluster partitions.
+"""
+
+import unittest
+from unittest import mock
+from ontap_intelligence.core.clusters import cluster_of, partition_key, qualify, split_id
+from ontap_intelligence.core.state import AssetManager
+from ontap_intelligence.intelligence.correlation import CorrelationEngine
+from ontap_intelligence.parsers.storage import StorageParser
+from helpers import T0, make_event
+
+class TestIdentity(unittest.TestCase):
+    def test_cluster_from_node_name(self):
+        self.assertEqual(cluster_of("ontap-cluster-01-02"), "ontap-cluster-01")
+        self.assertEqual(cluster_of("node1"), "node1") # No '-NN': its own cluster
+        self.assertEqual(qualify("ontap-cluster-02-01", "aggr1"), "ontap-cluster-02:aggr1")
+        self.assertEqual(split_id("ontap-cluster-02:aggr1"), ("ontap-cluster-02", "aggr1"))
+        self.assertEqual(split_id("ontap-cluster-02-01"), ("ontap-cluster-02", "ontap-cluster-02-01"))
+
+    def test_partition_key(self):
+        line = "<134>Jan 22 12:10:00 [ontap-cluster-01-02:qos.latency.high:NOTICE]: Workload x latency is 45ms"
+        self.assertEqual(partition_key(line), "ontap-cluster-01")
+        self.assertEqual(partition_key(make_event("x", node="ontap-cluster-02-01")), "ontap-cluster-02")
+
+    def test_same_names_on_two_clusters_do_not_collide(self):
+        parser = StorageParser()
+        state = AssetManager() # The parser writes the global topology; keep the test's out of it
+        with mock.patch("ontap_intelligence.parsers.storage.state", state):
+            for node in ("mc-a-01", "mc-b-01"):
+                parser.parse({'event': 'monitor.volume.nearlyFull', 'node': node, 'severity': 'WARNING',
+                              'timestamp': T0, 'timestamp_str': "",
+                              'message': "Volume vol_mc on aggregate aggr_mc is 97% full."})
+        self.assertEqual(state.get_asset("mc-a:vol_mc").parent_id, "mc-a:aggr_mc")
+        self.assertEqual(state.get_asset("mc-b:aggr_mc").parent_id, "mc-b-01")
+        self.assertEqual(sorted(a.id for a in state.find("vol_mc")), ["mc-a:vol_mc", "mc-b:vol_mc"])
+
+class TestTopologyPartitions(unittest.TestCase):
+    def setUp(self):
+        self.assets = AssetManager()
+        for cluster in ("c1", "c2"):
+            self.assets.add_or_update_asset(f"{cluster}:aggr1", "aggr", parent_id=f"{cluster}-01")
+            self.assets.add_or_update_asset(f"{cluster}:vol1", "volume", parent_id=f"{cluster}:aggr1")
+        self.assets.add_or_update_asset("c2:vol2", "volume", parent_id="c2:aggr1")
+
+    @staticmethod
+    def ids(assets):
+        return sorted(a.id for a in assets)
+
+    def test_cluster_partition_and_cross_cluster_queries(self):
+        self.assertEqual(self.assets.clusters(), ["c1", "c2"])
+        self.assertEqual(self.ids(self.assets.get_by_cluster("c1")), ["c1:aggr1", "c1:vol1"])
+        self.assertEqual(self.ids(self.assets.find("vol1")), ["c1:vol1", "c2:vol1"])
+        self.assertEqual(self.ids(self.assets.get_by_type("volume", cluster="c2")), ["c2:vol1", "c2:vol2"])
+        self.assertEqual(len(self.assets.get_by_type("volume")), 3)
+
+        snap = self.assets.snapshot()
+        self.assertEqual(self.ids(snap.get_by_cluster("c1")), ["c1:aggr1", "c1:vol1"])
+        self.assertEqual(self.ids(snap.find("aggr1")), ["c1:aggr1", "c2:aggr1"])
+
+    def test_eviction_and_reload_keep_the_cluster_index(self):
+        self.assets.configure(max_assets=4)
+        self.assets.add_or_update_asset("c3:lif1", "lif", parent_id="c3-01") # Evicts c1:vol1, then c1:aggr1 is a leaf
+        self.assertEqual(self.ids(self.assets.get_by_cluster("c1")), ["c1:aggr1"])
+
+        restored = AssetManager()
+        restored.load_assets(self.assets.snapshot().assets.values())
+        self.assertEqual(restored.clusters(), ["c1", "c2", "c3"])
+        self.assertEqual(restored.stats()['clusters'], 3)
+
+class TestCorrelationPartitions(unittest.TestCase):
+    def test_buffers_are_per_cluster(self):
+        engine = CorrelationEngine(window_seconds=60)
+        engine._handle_event("event.unified", make_event("disk.outOfService", node="c1-01", asset_id="c1:1.1"))
+        engine._handle_event("event.unified", make_event("disk.outOfService", node="c2-01", asset_id="c2:1.1", seconds=120))
+        # c2's clock does not prune c1's window
+        self.assertEqual(sorted(engine.buffers), ["c1", "c2"])
+        self.assertEqual(len(engine.buffer), 2)
+
+        engine._handle_event("event.unified", make_event(node="c1-01", seconds=90))
+        self.assertEqual([e.event_name for e in engine.buffers["c1"]], ["callhome.snmp.trap.sent"])
+
+        restored = CorrelationEngine(window_seconds=60)
+        restored.restore_state(engine.checkpoint_state())
+        self.assertEqual(restored.buffers, engine.buffers)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+test_event_store.py
+
+Unit tests for the indexed event store.
+"""
+
+import datetime
+import random
+import shutil
+import tempfile
+import unittest
+from ontap_intelligence.core.event_store import EventStore
+from helpers import T0, make_event
+
+EVENTS = ["disk.outOfService", "wafl.vol.full", "qos.latency.high", "callhome.snmp.trap.sent"]
+MESSAGES = [
+    "Disk 1.{n} on shelf {m} has failed and is being taken offline.",
+    "Volume vol{m} on SVM svm_{n} is full (99%).",
+    "Workload policy_group_{m} latency is {n}ms.",
+    "SnapMirror transfer for svm_{n}:vol{m} stalled: Transfer STALLED waiting for data.",
+]
+
+def nth_event(i, late=0):
+    return make_event(
+        EVENTS[i % 4],
+        node=f"ontap-cluster-01-0{i % 2 + 1}",
+        seconds=10 * i - late,
+        subsystem='storage' if i % 4 < 2 else 'system',
+        severity='ERROR' if i % 3 == 0 else 'INFO',
+        raw_message=MESSAGES[i % 4].format(n=i % 24, m=i % 7),
+        parsed_fields={'seq': i},
+        asset_id=f"ontap-cluster-01:vol{i % 7}" if i % 5 else None,
+    )
+
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = random.Random(7)
+        # 10s apart over ~28h, some up to 2 minutes late
+        self.events = [nth_event(i, late=rng.choice((0, 0, 0, 120))) for i in range(10000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def expected(self, start=None, end=None, **filters):
+        def matches(e):
+            return ((start is None or e.timestamp >= start) and (end is None or e.timestamp <= end) and
+                    all(getattr(e, f) in ([v] if isinstance(v, str) else v) for f, v in filters.items()))
+        return sorted((e for e in self.events if matches(e)), key=lambda e: e.timestamp)
+
+    def check(self, store, start=None, end=None, **filters):
+        got = list(store.query(start, end, **filters))
+        expected = self.expected(start, end, **filters)
+        self.assertEqual([e.timestamp for e in got], [e.timestamp for e in expected])
+        self.assertEqual(sorted(e.parsed_fields['seq'] for e in got), sorted(e.parsed_fields['seq'] for e in expected))
+        self.assertEqual(store.count(start, end, **filters), len(expected))
+
+    def queries(self):
+        hour = datetime.timedelta(hours=1)
+        return [
+            {},
+            {'asset_id': "ontap-cluster-01:vol3"},
+            {'start': T0 + 5 * hour, 'end': T0 + 6 * hour, 'asset_id': "ontap-cluster-01:vol3"},
+            {'event_name': "disk.outOfService", 'node': "ontap-cluster-01-01", 'start': T0 + 20 * hour},
+            {'severity': "ERROR", 'subsystem': "storage", 'event_name': ["wafl.vol.full", "disk.outOfService"]},
+            {'start': T0 + 3 * hour + datetime.timedelta(seconds=55), 'end': T0 + 3 * hour + datetime.timedelta(minutes=2)},
+            {'node': "ontap-cluster-02-01"},
+        ]
+
+    def test_queries_match_a_full_scan(self):
+        store = EventStore(self.dir, partition_minutes=60, late_sec=60)
+        for event in self.events:
+            store.append(event)
+        self.assertGreater(len(store.segments), 24) # Sealed hourly, plus late-event segments
+        self.assertTrue(store._open) # Open segments are queried too
+        for q in self.queries():
+            self.check(store, **q)
+        store.close()
+
+        reopened = EventStore(self.dir, read_only=True)
+        self.assertEqual(reopened.stats()['events'], len(self.events))
+        for q in self.queries():
+            self.check(reopened, **q)
+
+    def test_limit_and_newest_first(self):
+        store = EventStore(self.dir, segment_events=500)
+        for event in self.events:
+            store.append(event)
+        latest = list(store.query(limit=5, newest_first=True, event_name="qos.latency.high"))
+        expected = self.expected(event_name="qos.latency.high")[::-1][:5]
+        self.assertEqual([e.timestamp for e in latest], [e.timestamp for e in expected])
+        with self.assertRaises(ValueError):
+            store.count(cluster="ontap-cluster-01")
+        store.close()
+
+    def test_text_search(self):
+        store = EventStore(self.dir, partition_minutes=60, late_sec=60, text_index=False)
+        for event in self.events[:4000]: # Segments without trigrams are still searched
+            store.append(event)
+        store.close()
+        store = EventStore(self.dir, partition_minutes=60, late_sec=60)
+        for event in self.events[4000:]:
+            store.append(event)
+
+        later = T0 + datetime.timedelta(hours=10)
+        cases = [
+            (dict(text="transfer stalled"), lambda e: "transfer stalled" in e.raw_message.lower()),
+            (dict(text="Disk 1.17 "), lambda e: "Disk 1.17 " in e.raw_message),
+            (dict(text="svm_3:vol5", start=later), lambda e: "svm_3:vol5" in e.raw_message and e.timestamp >= later),
+            (dict(pattern=r"latency is 2\dms", node="ontap-cluster-01-01"),
+             lambda e: e.event_name == "qos.latency.high" and 20 <= e.parsed_fields['seq'] % 24 and e.node == "ontap-cluster-01-01"),
+            (dict(pattern=r"(?i)^volume vol(1|2) on"), lambda e: e.raw_message.startswith(("Volume vol1 ", "Volume vol2 "))),
+            (dict(text="no such message"), lambda e: False),
+        ]
+        for query, match in cases:
+            got = list(store.query(**query))
+            expected = sorted((e for e in self.events if match(e)), key=lambda e: e.timestamp)
+            self.assertEqual([e.timestamp for e in got], [e.timestamp for e in expected], query)
+            self.assertEqual(sorted(e.parsed_fields['seq'] for e in got), sorted(e.parsed_fields['seq'] for e in expected))
+            self.assertEqual(store.count(**query), len(expected))
+        store.close()
+
+    def test_required_literals(self):
+        from ontap_intelligence.core.event_store import _required_literals, _sre_parse
+        literals = lambda p: _required_literals(_sre_parse.parse(p))
+        self.assertEqual(literals(r"^Transfer (stalled|aborted) for (?:svm_\d+):vol"), ["Transfer ", " for svm_", ":vol"])
+        self.assertEqual(literals(r"(disk)\.fail"), ["disk", ".fail"])
+        self.assertEqual(literals(r"disk|aggr"), [])
+        self.assertEqual(literals(r"abc?de"), [])
+
+    def test_retention_drops_old_segments(self):
+        store = EventStore(self.dir, partition_minutes=60, late_sec=0, retention_days=0.5)
+        for event in self.events:
+            store.append(event)
+        oldest = min(s.min_ts for s in store.segments)
+        self.assertGreaterEqual(oldest, store.clock - 13 * 3600 * 1_000_000)
+        self.assertEqual(list(store.query(end=T0 + datetime.timedelta(hours=2))), [])
+        store.close()
+
+    def test_restart_from_a_checkpoint(self):
+        half = len(self.events) // 2
+        store = EventStore(self.dir, segment_events=1000)
+        for event in self.events[:half]:
+            store.append(event)
+        saved = store.checkpoint_state()
+        self.assertEqual(store.stats()['open_segments'], 0)
+        for event in self.events[half:half + 3000]: # Sealed and open segments, then a crash
+            store.append(event)
+        for segment in store.segments:
+            segment.close()
+
+        store = EventStore(self.dir, segment_events=1000)
+        store.restore_state(saved)
+        for event in self.events[half:]: # The pipeline re-reads from the checkpoint
+            store.append(event)
+        for query in self.queries():
+            self.check(store, **query)
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+test_health.py
+
+Unit tests for incremental health propagation over the topology.
+"""
+
+import unittest
+from unittest import mock
+from ontap_intelligence.core.state import AssetManager
+from ontap_intelligence.intelligence.health import HealthEngine
+from ontap_intelligence.parsers.service import RawRegexParser
+from ontap_intelligence.parsers.storage import StorageParser
+from helpers import make_event
+
+class TestHealthEngine(unittest.TestCase):
+    def setUp(self):
+        self.assets = AssetManager()
+        self.assets.add_or_update_asset("aggr1", "aggr", parent_id="node1")
+        self.assets.add_or_update_asset("aggr2", "aggr", parent_id="node1")
+        self.assets.add_or_update_asset("disk1", "disk", parent_id="aggr1")
+        self.assets.add_or_update_asset("vol1", "volume", parent_id="aggr2")
+        self.engine = HealthEngine(self.assets, half_life_sec=600, rollup_factor=0.5, sweep_interval_sec=60)
+
+    def health(self, asset_id):
+        return self.assets.get_asset(asset_id).health_score
+
+    def test_rolls_up_the_ancestor_path_only(self):
+        version = self.assets.version
+        self.engine.update(make_event(asset_id="disk1", impact_level=8)) # Penalty 64
+
+        self.assertEqual(self.health("disk1"), 36.0)
+        self.assertEqual(self.assets.get_asset("disk1").status, "critical")
+        self.assertEqual(self.health("aggr1"), 68.0)
+        self.assertEqual(self.assets.get_asset("aggr1").status, "degraded")
+        self.assertAlmostEqual(self.engine.health("node1"), 84.0) # Node without an Asset
+        self.assertEqual(self.health("aggr2"), 100.0)
+        self.assertEqual([c.asset.id for c in self.assets.changes_since(version)], ["disk1", "aggr1"])
+
+    def test_penalties_accumulate_and_decay(self):
+        self.engine.update(make_event(asset_id="vol1", impact_level=5)) # 25
+        self.engine.update(make_event(asset_id="vol1", impact_level=5, seconds=600)) # 12.5 left + 25
+        self.assertAlmostEqual(self.engine.health("vol1"), 62.5)
+
+        # Quiet asset recovers at the next sweep, driven by other events' time
+        self.engine.update(make_event(asset_id="aggr1", impact_level=0, seconds=600 + 3000))
+        self.assertGreater(self.health("vol1"), 98.0)
+        self.assertEqual(self.assets.get_asset("vol1").status, "ok")
+
+    def test_healed_assets_are_forgotten(self):
+        self.engine.update(make_event(asset_id="disk1", impact_level=3))
+        self.engine.update(make_event(asset_id="disk1", impact_level=0, seconds=6 * 3600))
+        self.assertEqual(self.engine.penalties, {})
+        self.assertEqual(self.health("disk1"), 100.0)
+
+    def test_unknown_asset_is_attributed_to_its_node(self):
+        self.engine.update(make_event(asset_id="lif9", impact_level=9))
+        self.assertEqual(set(self.engine.penalties), {"lif9", "node1"})
+
+    def test_wafl_scan_keeps_the_volume_under_its_aggregate(self):
+        assets = AssetManager()
+        engine = HealthEngine(assets, half_life_sec=600, rollup_factor=0.5)
+        raw, storage = RawRegexParser(), StorageParser()
+        node = "ontap-cluster-01-01"
+        lines = [
+            f"<132>Jan 22 12:00:00 [{node}:monitor.volume.nearlyFull:WARNING]: Volume vol1 on aggregate aggr1 is 97% full.",
+            f"<133>Jan 22 12:00:01 [{node}:wafl.scan.start:NOTICE]: WAFL scan 'active_fcp' started on volume vol1.",
+            f"<132>Jan 22 12:00:02 [{node}:monitor.volume.nearlyFull:WARNING]: Volume vol1 on aggregate aggr1 is 98% full.",
+            f"<133>Jan 22 12:00:03 [{node}:wafl.scan.start:NOTICE]: WAFL scan 'active_fcp' started on volume vol1.",
+        ]
+        with mock.patch("ontap_intelligence.parsers.storage.state", assets):
+            for line in lines:
+                engine.update(storage.parse(raw.parse_line(line)))
+
+        self.assertEqual(assets.get_asset("ontap-cluster-01:vol1").parent_id, "ontap-cluster-01:aggr1")
+        # Every event's penalty (nearlyFull 25, scan 1) reaches the aggregate at half strength
+        self.assertAlmostEqual(engine.health("ontap-cluster-01:aggr1"), 100 - 52 * 0.5, delta=0.1)
+        self.assertAlmostEqual(engine.health(node), 100 - 52 * 0.25, delta=0.1)
+
+    def test_disk_rolls_up_through_the_aggregate_once_paired(self):
+        from ontap_intelligence.intelligence.correlation import CorrelationEngine
+        assets = AssetManager()
+        engine = HealthEngine(assets, half_life_sec=600, rollup_factor=0.5)
+        correlator = CorrelationEngine(assets=assets)
+        raw, storage = RawRegexParser(), StorageParser()
+        node = "ontap-cluster-01-01"
+        fail = f"<129>Jan 22 12:00:00 [{node}:disk.outOfService:ALERT]: Disk 1.2 on shelf 1 has failed and is being taken offline."
+        degraded = f"<131>Jan 22 12:00:05 [{node}:raid.aggr.degraded:ERROR]: Aggregate aggr1 is degraded. rg0 is missing a disk."
+        disk, aggr = "ontap-cluster-01:1.2", "ontap-cluster-01:aggr1"
+
+        def process(line):
+            event = storage.parse(raw.parse_line(line))
+            correlator._handle_event("event.unified", event)
+            engine.update(event)
+
+        with mock.patch("ontap_intelligence.parsers.storage.state", assets), \
+                mock.patch("ontap_intelligence.intelligence.correlation.bus"):
+            process(fail)
+            self.assertNotIn(aggr, engine.penalties) # Before the pairing a failure reaches the node only
+            process(degraded)
+            self.assertEqual(assets.get_asset(disk).parent_id, aggr)
+            self.assertEqual(assets.get_asset(aggr).parent_id, node)
+            aggr_penalty = engine.penalties[aggr][0] # 81
+            process(fail)
+
+        self.assertEqual(assets.get_asset(disk).parent_id, aggr) # Not reset to the node by the failure
+        # The second failure (impact 8: 64) reaches the aggregate at half strength
+        self.assertAlmostEqual(engine.penalties[aggr][0] - aggr_penalty, 32, delta=0.1)
+
+    def test_checkpoint_round_trip(self):
+        self.engine.update(make_event(asset_id="disk1", impact_level=8))
+        restored = HealthEngine(self.assets)
+        restored.restore_state(self.engine.checkpoint_state())
+        self.assertAlmostEqual(restored.health("aggr1"), self.engine.health("aggr1"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+test_history_generator.py
+
+Unit tests for the simulated-clock HistoryGenerator.
+"""
+
+import unittest
+import datetime
+from src.history_generator import HistoryGenerator
+from src.parser import LogParser
+
+class TestHistoryGenerator(unittest.TestCase):
+    def setUp(self):
+        self.parser = LogParser()
+        self.duration = datetime.timedelta(minutes=30)
+        self.start = datetime.datetime.now() - datetime.timedelta(hours=1)
+
+    def _generate(self, seed, **kwargs):
+        gen = HistoryGenerator(seed=seed, rate=5.0)
+        lines = list(gen.iter_lines(self.duration, start=self.start, batch_size=500, **kwargs))
+        return gen, lines
+
+    def test_seed_is_reproducible(self):
+        _, a = self._generate(7, scenarios_per_hour=6)
+        _, b = self._generate(7, scenarios_per_hour=6)
+        _, c = self._generate(8, scenarios_per_hour=6)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_simulated_clock_spans_duration(self):
+        _, lines = self._generate(1)
+        parsed = [self.parser.parse_line(l) for l in lines]
+        self.assertTrue(all(parsed), "Generated line failed to parse")
+
+        times = [p['timestamp'] for p in parsed]
+        self.assertEqual(times, sorted(times))
+        self.assertGreater(times[-1] - times[0], datetime.timedelta(minutes=25))
+        # ~5 lines/s for 30 minutes, give or take the diurnal swing
+        self.assertGreater(len(lines), 3000)
+
+    def test_injected_scenarios_are_labeled(self):
+        gen, lines = self._generate(3, scenarios_per_hour=20, scenario_names=("disk_raid_cascade",))
+        self.assertTrue(gen.labels)
+        for label in gen.labels:
+            self.assertTrue(label.expect_incident)
+            raid = [l for l in lines if f"[{label.node}:raid.aggr.degraded" in l and label.asset_id in l]
+            self.assertTrue(raid, f"Missing RAID event for {label}")
+
+if __name__ == "__main__":
+    unittest.main()
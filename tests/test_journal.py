@@ -0,0 +1,105 @@
+"""
+test_journal.py
+
+Unit tests for the segmented event journal.
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from ontap_intelligence.core.bus import EventBus
+from ontap_intelligence.core.journal import EventJournal
+from helpers import T0, make_event
+
+
+def nth_event(i):
+    return make_event(node=f"node{i % 4}", seconds=i, raw_message=f"message {i}", parsed_fields={'seq': i})
+
+class TestEventJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def journal(self, **kwargs):
+        kwargs.setdefault('segment_bytes', 4096)
+        kwargs.setdefault('index_interval', 512)
+        return EventJournal(self.dir, **kwargs)
+
+    def test_append_and_replay_across_segments(self):
+        journal = self.journal()
+        offsets = [journal.append(nth_event(i)) for i in range(200)]
+        self.assertEqual(offsets, list(range(200)))
+        self.assertGreater(len(journal.segments), 1)
+
+        replayed = list(journal.replay())
+        self.assertEqual([o for o, _ in replayed], offsets)
+        self.assertEqual(replayed[57][1], nth_event(57))
+        journal.close()
+
+    def test_replay_from_offset_and_time(self):
+        journal = self.journal()
+        for i in range(200):
+            journal.append(nth_event(i))
+
+        from_offset = [e.parsed_fields['seq'] for _, e in journal.replay(from_offset=123)]
+        self.assertEqual(from_offset, list(range(123, 200)))
+
+        from_time = [e.parsed_fields['seq'] for _, e in
+                     journal.replay(from_time=T0 + datetime.timedelta(seconds=150))]
+        self.assertEqual(from_time, list(range(150, 200)))
+        journal.close()
+
+    def test_reopen_continues_offsets(self):
+        journal = self.journal()
+        for i in range(50):
+            journal.append(nth_event(i))
+        journal.close()
+
+        journal = self.journal()
+        self.assertEqual(journal.append(nth_event(50)), 50)
+        self.assertEqual(len(list(journal.replay())), 51)
+        journal.close()
+
+    def test_torn_tail_is_truncated(self):
+        journal = self.journal(segment_bytes=1 << 20)
+        for i in range(10):
+            journal.append(nth_event(i))
+        journal.close()
+        path = journal.segments[-1].log_path
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 5) # Crash mid-record
+
+        journal = self.journal(segment_bytes=1 << 20)
+        self.assertEqual(journal.next_offset, 9)
+        self.assertEqual(journal.append(nth_event(9)), 9)
+        self.assertEqual([e.parsed_fields['seq'] for _, e in journal.replay()], list(range(10)))
+        journal.close()
+
+    def test_retention_drops_oldest_segments(self):
+        journal = self.journal(retention_segments=2)
+        for i in range(300):
+            journal.append(nth_event(i))
+        self.assertEqual(len(journal.segments), 2)
+        self.assertGreater(journal.first_offset, 0)
+        self.assertEqual(next(journal.replay(from_offset=0))[0], journal.first_offset)
+        journal.close()
+
+    def test_attach_and_replay_to_bus(self):
+        src, dst = EventBus(), EventBus()
+        journal = self.journal()
+        journal.attach(src)
+        for i in range(20):
+            src.publish("event.unified", nth_event(i))
+
+        received = []
+        dst.subscribe("event.unified", lambda t, e: received.append(e.parsed_fields['seq']))
+        self.assertEqual(journal.replay_to(dst, from_offset=5), 15)
+        self.assertEqual(received, list(range(5, 20)))
+        journal.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+test_log_feed.py
+
+Unit tests for the command center's log feed.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from ontap_intelligence.ui.log_feed import LogFeed, tail_lines
+
+class TestLogFeed(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ems.log")
+        self.lines = [f"[node-{i % 4}: kernel: event.{i}]: message {'x' * (i % 37)}" for i in range(2000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def append(self, text):
+        with open(self.path, "a") as f:
+            f.write(text)
+
+    def test_tail_lines_spans_blocks(self):
+        data = "".join(line + "\n" for line in self.lines).encode()
+        for n in (1, 50, 1999, 2000, 5000):
+            lines, offset = tail_lines(io.BytesIO(data), len(data), n, block_size=97)
+            self.assertEqual(lines, self.lines[-n:], n)
+            self.assertEqual(offset, len(data))
+        # A trailing partial line is left for the next read
+        lines, offset = tail_lines(io.BytesIO(data + b"partial"), len(data) + 7, 3, block_size=97)
+        self.assertEqual((lines, offset), (self.lines[-3:], len(data)))
+        self.assertEqual(tail_lines(io.BytesIO(b"no newline"), 10, 3), ([], 0))
+        self.assertEqual(tail_lines(io.BytesIO(data), len(data), 0), ([], len(data)))
+        self.assertEqual(tail_lines(io.BytesIO(data + b"partial"), len(data) + 7, 0), ([], len(data)))
+
+    def test_first_poll_is_the_backlog_then_only_new_lines(self):
+        feed = LogFeed(self.path, backlog=100, block_size=256)
+        self.assertEqual(feed.poll(), []) # Not created yet
+        self.append("".join(line + "\n" for line in self.lines[:1500]))
+        self.assertEqual(feed.poll(), self.lines[1400:1500])
+        self.assertEqual(feed.poll(), [])
+
+        text = "".join(line + "\n" for line in self.lines[1500:])
+        got = []
+        for start in range(0, len(text), 1013): # Chunks end mid-line
+            self.append(text[start:start + 1013])
+            got.extend(feed.poll())
+        self.assertEqual(got, self.lines[1500:])
+        self.assertEqual(feed.lines, 600)
+
+    def test_no_backlog_starts_at_the_end(self):
+        self.append("".join(line + "\n" for line in self.lines))
+        feed = LogFeed(self.path, backlog=0)
+        self.assertEqual(feed.poll(), [])
+        self.append(self.lines[0] + "\n")
+        self.assertEqual(feed.poll(), [self.lines[0]])
+
+    def test_max_bytes_spreads_a_large_append_over_polls(self):
+        feed = LogFeed(self.path, backlog=10, max_bytes=4096)
+        self.append(self.lines[0] + "\n")
+        feed.poll()
+        self.append("".join(line + "\n" for line in self.lines[1:]))
+        got = []
+        while True:
+            lines = feed.poll()
+            if not lines:
+                break
+            got.extend(lines)
+        self.assertEqual(got, self.lines[1:])
+
+    def test_line_longer_than_max_bytes_is_cut(self):
+        feed = LogFeed(self.path, backlog=10, max_bytes=256)
+        self.append(self.lines[0] + "\n")
+        feed.poll()
+        long_line = "y" * 1000
+        self.append(long_line + "\n" + self.lines[1] + "\n" + "z" * 255 + "\n")
+        got = []
+        for _ in range(10):
+            got.extend(feed.poll())
+        self.assertEqual(got, [long_line[:256], self.lines[1], "z" * 255])
+        self.assertEqual(feed.tail.truncated, 1)
+        self.append(self.lines[2] + "\n")
+        self.assertEqual(feed.poll(), [self.lines[2]])
+
+    def test_rotation_rereads_from_the_start(self):
+        feed = LogFeed(self.path, backlog=10)
+        self.append("".join(line + "\n" for line in self.lines))
+        feed.poll()
+        os.remove(self.path)
+        self.append("".join(line + "\n" for line in self.lines[:5]))
+        self.assertEqual(feed.poll(), self.lines[:5])
+        self.assertEqual(feed.tail.rotations, 1)
+
+        with open(self.path, "w") as f: # Truncated in place
+            f.write(self.lines[7] + "\n")
+        self.assertEqual(feed.poll(), [self.lines[7]])
+        self.assertEqual(feed.tail.rotations, 2)
+
+if __name__ == '__main__':
+    unittest.main()
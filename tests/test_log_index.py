@@ -0,0 +1,130 @@
+"""
+test_log_index.py
+
+Unit tests for the time -> byte offset index of raw EMS log files.
+"""
+
+import datetime
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ontap_intelligence.core.bus import EventBus
+from ontap_intelligence.core.ingestion import LogIngestor
+from ontap_intelligence.core.log_index import LogTail, LogTimeIndex, open_indexes, read_range, read_last
+
+# Yesterday, so the year inferred from the file's mtime is this one
+T0 = (datetime.datetime.now() - datetime.timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
+
+def make_lines(start_sec, count, jitter=0, seed=0):
+    """One line per second from T0 + start_sec, each up to `jitter` seconds late."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(start_sec, start_sec + count):
+        ts = T0 + datetime.timedelta(seconds=i - rng.randint(0, jitter))
+        lines.append((ts, f"<134>{ts:%b %d %H:%M:%S} [ontap-cluster-01-0{i % 2 + 1}:callhome.snmp.trap.sent:INFO]: seq {i}"))
+    return lines
+
+class TestLogTimeIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ems.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, path, lines, mode="w"):
+        with open(path, mode) as f:
+            f.writelines(line + "\n" for _, line in lines)
+
+    def test_range_reads_match_a_full_scan_across_rotated_files(self):
+        lines = make_lines(0, 3000, jitter=5)
+        self.write(self.path + ".2", lines[:1000])
+        self.write(self.path + ".1", lines[1000:2000])
+        self.write(self.path, lines[2000:])
+
+        for lo, hi in ((0, 30), (995, 1010), (1500, 2600), (2990, 3100), (None, 100), (2900, None)):
+            start = T0 + datetime.timedelta(seconds=lo) if lo is not None else None
+            end = T0 + datetime.timedelta(seconds=hi) if hi is not None else None
+            expected = [line for ts, line in lines
+                        if (start is None or ts >= start) and (end is None or ts <= end)]
+            self.assertEqual(list(read_range(self.path, start, end)), expected, (lo, hi))
+
+        newest = max(ts for ts, _ in lines)
+        self.assertEqual(read_last(self.path, 9), [line for ts, line in lines if ts >= newest - datetime.timedelta(seconds=9)])
+
+    def test_reads_seek_past_earlier_data(self):
+        self.write(self.path, make_lines(0, 3600))
+        ix = open_indexes(self.path)[0]
+        begin, stop = ix.seek_range(ix.max_ts - 60, None, max_lag_sec=60)
+        self.assertGreater(begin, os.path.getsize(self.path) * 0.95)
+        self.assertIsNone(stop)
+        self.assertEqual(len(ix.buckets), 360)
+
+    def test_sidecar_is_reused_extended_and_follows_rotation(self):
+        self.write(self.path, make_lines(0, 600))
+        built = open_indexes(self.path)[0]
+
+        # Loaded from the sidecar: only the last bucket and new lines are scanned
+        self.write(self.path, make_lines(600, 100), mode="a")
+        loaded = LogTimeIndex(self.path)
+        self.assertEqual(loaded.buckets, built.buckets)
+        self.assertLess(loaded.catch_up(), os.path.getsize(self.path) * 0.2)
+        self.assertEqual(len(loaded.buckets), 70)
+
+        os.rename(self.path, self.path + ".1")
+        rotated = LogTimeIndex(self.path + ".1")
+        self.assertEqual(rotated.buckets, built.buckets) # Keyed by inode: no rebuild
+        self.write(self.path, make_lines(700, 10))
+        os.remove(self.path + ".1")
+        open_indexes(self.path)
+        self.assertEqual(os.listdir(rotated.index_dir), [f"{os.stat(self.path).st_ino}.tidx"])
+
+    def test_ingestor_indexes_as_it_reads(self):
+        self.write(self.path, make_lines(0, 500, jitter=3))
+        ingestor = LogIngestor({'ingestion': {'source_file': self.path, 'mode': "replay", 'poll_interval': 0.1,
+                                              'time_index': {'enabled': True, 'bucket_sec': 10}}})
+        with mock.patch("ontap_intelligence.core.ingestion.bus", EventBus()):
+            ingestor.start()
+            ingestor.join(timeout=10)
+
+        persisted = LogTimeIndex(self.path)
+        rebuilt = LogTimeIndex(self.path, index_dir=os.path.join(self.dir, "rebuilt")).refresh()
+        self.assertEqual((persisted.buckets, persisted.offsets), (rebuilt.buckets, rebuilt.offsets))
+
+    def test_tail_returns_appended_lines_once(self):
+        lines = [line for _, line in make_lines(0, 1000)]
+        tail = LogTail(self.path, max_bytes=4096)
+        self.assertEqual(tail.read_new(), []) # Not created yet
+        text = "".join(line + "\n" for line in lines)
+        got = []
+        for start in range(0, len(text), 3001): # Appends end mid-line
+            with open(self.path, "a") as f:
+                f.write(text[start:start + 3001])
+            while True:
+                new = tail.read_new()
+                if not new:
+                    break
+                got.extend(new)
+        self.assertEqual(got, lines)
+        self.assertEqual(tail.offset, len(text))
+
+        os.remove(self.path)
+        self.write(self.path, make_lines(2000, 3))
+        self.assertEqual(len(tail.read_new()), 3)
+        self.assertTrue(tail.rotated)
+        self.assertFalse(tail.read_new() or tail.rotated)
+
+    def test_tail_starts_at_the_newest_seconds(self):
+        lines = make_lines(0, 3600)
+        self.write(self.path, lines)
+        tail = LogTail(self.path)
+        self.assertGreater(tail.seek_last(300), os.path.getsize(self.path) * 0.9)
+        cutoff = lines[-1][0] - datetime.timedelta(seconds=300)
+        cutoff -= datetime.timedelta(seconds=cutoff.second % 10) # From the start of its 10s bucket
+        self.assertEqual(tail.read_new(), [line for ts, line in lines if ts >= cutoff])
+
+if __name__ == '__main__':
+    unittest.main()
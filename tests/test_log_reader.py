@@ -0,0 +1,106 @@
+"""
+test_log_reader.py
+
+Unit tests for the dashboard's incremental log reader (skipped without pandas).
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from src.history_generator import HistoryGenerator
+from src.parser import LogParser
+
+try:
+    import pandas as pd
+    from src.feature_engine import FeatureEngineer
+    from src.log_reader import LiveLogView
+except ImportError:
+    pd = None
+
+class CountingDetector:
+    """Stands in for OntapAnomalyDetector: scores = log_count, records the rows it scored."""
+    def __init__(self):
+        self.scored = []
+
+    def predict(self, df):
+        self.scored.extend(df.index)
+        results = df.copy()
+        results['score'] = df['log_count'] * 1.0
+        results['is_anomaly'] = 1
+        return results
+
+@unittest.skipUnless(pd, "pandas not installed")
+class TestLiveLogView(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ems.log")
+        start = datetime.datetime(2026, 1, 22, 12, 0, 3) # Fixed: window boundaries and rates repeat
+        gen = HistoryGenerator(seed=3, rate=5.0)
+        self.lines = list(gen.iter_lines(datetime.timedelta(minutes=20), start=start, scenarios_per_hour=12))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def append(self, text):
+        with open(self.path, "a") as f:
+            f.write(text)
+
+    def expected(self, lines):
+        engine = FeatureEngineer()
+        engine.ingest_stream(filter(None, map(LogParser().parse_line, lines)))
+        return engine.aggregate_window(freq="10s")
+
+    def test_incremental_features_match_a_full_rebuild(self):
+        view = LiveLogView(self.path, freq="10s")
+        text = "".join(line + "\n" for line in self.lines)
+        for start in range(0, len(text), 7919): # Chunks end mid-line
+            self.append(text[start:start + 7919])
+            view.refresh()
+        self.assertEqual(view.lines_parsed, len(self.lines))
+
+        pd.testing.assert_frame_equal(view.features.frame(), self.expected(self.lines), check_freq=False)
+        recent = view.view(5)
+        self.assertEqual(recent.index[0], recent.index[-1] - pd.Timedelta(minutes=5))
+
+    def test_only_changed_windows_are_scored(self):
+        view = LiveLogView(self.path, freq="10s")
+        detector = CountingDetector()
+        self.append("".join(line + "\n" for line in self.lines[:-50]))
+        view.refresh()
+        first = view.view(10, detector)
+        self.assertEqual(len(detector.scored), len(first))
+
+        detector.scored.clear()
+        self.append("".join(line + "\n" for line in self.lines[-50:]))
+        self.assertEqual(view.refresh(), 50)
+        latest = view.view(10, detector)
+        touched = {pd.Timestamp(e['timestamp']).floor("10s") for e in map(LogParser().parse_line, self.lines[-50:]) if e}
+        self.assertEqual(set(detector.scored), touched) # The windows the 50 new lines fell in
+        full = self.expected(self.lines)
+        self.assertEqual(list(latest['score']), list(full['log_count'].loc[latest.index] * 1.0))
+
+    def test_first_refresh_starts_at_the_retained_window(self):
+        self.append("".join(line + "\n" for line in self.lines))
+        view = LiveLogView(self.path, freq="10s", retain=datetime.timedelta(minutes=5))
+        view.refresh()
+        self.assertLess(view.lines_parsed, len(self.lines) / 2) # Earlier lines are skipped via the time index
+
+        frame = view.features.frame()
+        full = self.expected(self.lines)
+        pd.testing.assert_frame_equal(frame.iloc[1:], full.loc[frame.index[1:]], check_freq=False)
+        self.assertLessEqual(frame.index[0], full.index[-1] - pd.Timedelta(minutes=5))
+
+    def test_rotation_restarts(self):
+        view = LiveLogView(self.path, freq="10s")
+        self.append("".join(line + "\n" for line in self.lines))
+        view.refresh()
+        os.remove(self.path)
+        self.append("".join(line + "\n" for line in self.lines[:100]))
+        self.assertEqual(view.refresh(), 100)
+        self.assertTrue(view.reader.rotated)
+        pd.testing.assert_frame_equal(view.features.frame(), self.expected(self.lines[:100]), check_freq=False)
+
+if __name__ == '__main__':
+    unittest.main()
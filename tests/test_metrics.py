@@ -0,0 +1,110 @@
+"""
+test_metrics.py
+
+Unit tests for the stage-lag histograms and the ingest time carried to alerts.
+"""
+
+import datetime
+import time
+import unittest
+from unittest import mock
+from ontap_intelligence.core.bus import EventBus
+from ontap_intelligence.core.ingestion import RawLine
+from ontap_intelligence.core.metrics import Histogram, MetricsRegistry
+from ontap_intelligence.core.state import AssetManager
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_upper_inclusive(self):
+        h = Histogram(buckets=(1, 2, 4))
+        for value in (0.5, 1, 1.5, 3, 10):
+            h.observe(value)
+        self.assertEqual(h.counts, [2, 1, 1, 1]) # Last bucket is +Inf
+        self.assertEqual((h.count, h.sum, h.min, h.max), (5, 16.0, 0.5, 10))
+
+    def test_quantile_is_the_bucket_bound(self):
+        h = Histogram(buckets=(1, 2, 4))
+        self.assertIsNone(h.quantile(0.5))
+        for value in (0.5, 1, 1.5, 3, 10):
+            h.observe(value)
+        self.assertEqual(h.quantile(0.2), 1)
+        self.assertEqual(h.quantile(0.5), 2)
+        self.assertEqual(h.quantile(0.8), 4)
+        self.assertEqual(h.quantile(0.99), 10) # +Inf bucket: the largest value seen
+
+        snap = h.snapshot()
+        self.assertEqual((snap['mean'], snap['p50'], snap['p90'], snap['p99']), (3.2, 2, 10, 10))
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.lag = self.registry.histogram("lag_seconds", "Stage lag", kind="incident")
+        self.lag.observe(0.5)
+        self.lag.observe(3.0)
+        self.registry.counter("lines_total", "Lines read").inc(7)
+
+    def test_same_name_and_labels_is_one_metric(self):
+        self.assertIs(self.registry.histogram("lag_seconds", kind="incident"), self.lag)
+        self.assertIsNot(self.registry.histogram("lag_seconds", kind="anomaly"), self.lag)
+
+    def test_snapshot(self):
+        snap = self.registry.snapshot()
+        self.assertEqual(snap['counters'], {"lines_total": 7})
+        self.assertEqual(snap['histograms']["lag_seconds{kind=incident}"]['count'], 2)
+        self.assertEqual(snap['histograms']["lag_seconds{kind=incident}"]['max'], 3.0)
+
+    def test_prometheus_exposition(self):
+        lines = self.registry.render_prometheus().splitlines()
+        self.assertIn("# HELP lines_total Lines read", lines)
+        self.assertIn("# TYPE lines_total counter", lines)
+        self.assertIn("lines_total 7", lines)
+        self.assertIn("# TYPE lag_seconds histogram", lines)
+
+        buckets = [line for line in lines if line.startswith("lag_seconds_bucket")]
+        self.assertEqual(len(buckets), len(self.lag.bounds) + 1)
+        counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+        self.assertEqual(counts, sorted(counts)) # Cumulative
+        first = next(i for i, bound in enumerate(self.lag.bounds) if bound >= 0.5)
+        self.assertEqual(counts[first - 1:first + 1], [0, 1])
+        self.assertEqual(buckets[-1], 'lag_seconds_bucket{kind="incident",le="+Inf"} 2')
+        self.assertIn('lag_seconds_sum{kind="incident"} 3.5', lines)
+        self.assertIn('lag_seconds_count{kind="incident"} 2', lines)
+
+class TestIngestToAlert(unittest.TestCase):
+    def test_ingest_time_reaches_the_incident(self):
+        from ontap_intelligence.intelligence.correlation import CorrelationEngine
+        from ontap_intelligence.parsers.service import ParserService
+
+        registry, bus = MetricsRegistry(), EventBus()
+        with mock.patch("ontap_intelligence.parsers.service.metrics", registry), \
+                mock.patch("ontap_intelligence.intelligence.correlation.metrics", registry), \
+                mock.patch("ontap_intelligence.parsers.service.bus", bus), \
+                mock.patch("ontap_intelligence.intelligence.correlation.bus", bus), \
+                mock.patch("ontap_intelligence.parsers.storage.state", AssetManager()):
+            parser, correlator = ParserService(), CorrelationEngine()
+            parser.start()
+            correlator.start()
+            events, incidents = [], []
+            bus.subscribe("event.unified", lambda topic, e: events.append(e))
+            bus.subscribe("event.incident", lambda topic, i: incidents.append(i))
+
+            ts = datetime.datetime.now().strftime("%b %d %H:%M:%S")
+            read_at = time.monotonic() - 5 # Read 5s before it is parsed
+            bus.publish("log.raw", RawLine(
+                f"<11>{ts} [cl1-01:disk.outOfService:ERROR]: Disk 1.2 on shelf 1 has failed.", read_at))
+            bus.publish("log.raw", RawLine(
+                f"<11>{ts} [cl1-01:raid.aggr.degraded:ERROR]: Aggregate aggr1 is degraded.", read_at + 1))
+
+        self.assertEqual([e.ingest_ts for e in events], [read_at, read_at + 1])
+        self.assertEqual(len(incidents), 1)
+        self.assertEqual(incidents[0].ingest_ts, read_at + 1)
+
+        parse_lag = registry.histogram("ingest_to_parse_seconds")
+        self.assertEqual(parse_lag.count, 2)
+        self.assertGreaterEqual(parse_lag.min, 4)
+        alert_lag = registry.histogram("ingest_to_alert_seconds", kind="incident")
+        self.assertEqual(alert_lag.count, 1)
+        self.assertAlmostEqual(alert_lag.max, incidents[0].detected_ts - (read_at + 1))
+        self.assertGreaterEqual(alert_lag.max, 4)
+
+if __name__ == "__main__":
+    unittest.main()
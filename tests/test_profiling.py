@@ -0,0 +1,101 @@
+"""
+test_profiling.py
+
+Unit tests for the runtime pipeline profiler.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import signal
+import tempfile
+import tracemalloc
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from ontap_intelligence.core.bus import EventBus
+from ontap_intelligence.core.profiling import CONTROL_TOPIC, PipelineProfiler
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.bus = EventBus()
+        self.profiler = PipelineProfiler(report_dir=self.dir, sample_interval=0.001, bus=self.bus)
+
+    def tearDown(self):
+        if self.profiler.active:
+            self.profiler.stop()
+        shutil.rmtree(self.dir)
+
+    def test_report(self):
+        buffer = []
+        self.profiler.track("buffer", lambda: buffer)
+        self.bus.subscribe("t", lambda topic, p: buffer.append([p] * 50))
+
+        before = datetime.datetime.now().replace(microsecond=0)
+        self.profiler.start()
+        self.assertTrue(self.profiler.active)
+        for i in range(2000):
+            self.bus.publish("t", i)
+        path = self.profiler.stop()
+        self.assertFalse(self.profiler.active)
+        self.assertIsNone(self.profiler.stop())
+
+        with open(path) as f:
+            report = json.load(f)
+        started = datetime.datetime.fromisoformat(report['started'])
+        self.assertLessEqual(before, started) # Taken at start(), not when the report is written
+        self.assertLessEqual(started, datetime.datetime.now())
+        self.assertEqual(report['handlers'][0]['calls'], 2000)
+        self.assertIn("t", report['cpu_by_topic_s'])
+        self.assertEqual(report['components']['buffer']['growth_items'], 2000)
+        self.assertGreater(report['components']['buffer']['growth_bytes'], 0)
+        self.assertTrue(report['alloc_growth_by_file'])
+        self.assertTrue(os.path.exists(path.replace(".json", ".collapsed")))
+        self.assertFalse(self.bus._timing)
+
+    def test_track_defaults(self):
+        correlator = SimpleNamespace(buffer=[1, 2, 3])
+        ml = SimpleNamespace(window=SimpleNamespace(clusters={'a': 1}))
+        self.profiler.track_defaults(correlator=correlator, ml=ml)
+        self.assertEqual(set(self.profiler.components),
+                         {"correlation.buffer", "ml.window", "state.assets", "state.relations"})
+
+        ml.window = SimpleNamespace(clusters={'a': 1, 'b': 2}) # A closed window is replaced
+        sizes = self.profiler._measure_components()
+        self.assertEqual(sizes['ml.window']['items'], 2)
+        self.assertEqual(sizes['correlation.buffer']['items'], 3)
+
+    def test_leaves_existing_tracemalloc_running(self):
+        was_tracing = tracemalloc.is_tracing()
+        tracemalloc.start()
+        try:
+            self.profiler.start()
+            self.profiler.stop()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+        self.profiler.start()
+        self.profiler.stop()
+        self.assertEqual(tracemalloc.is_tracing(), was_tracing)
+
+    def test_bus_control(self):
+        self.profiler.attach_bus_control()
+        self.bus.publish(CONTROL_TOPIC, "start")
+        self.assertTrue(self.profiler.active)
+        self.bus.publish(CONTROL_TOPIC, "toggle")
+        self.assertFalse(self.profiler.active)
+        self.assertEqual(len([f for f in os.listdir(self.dir) if f.endswith(".json")]), 1)
+
+    def test_no_signal_handler_without_sigusr1(self):
+        with mock.patch.object(signal, "signal") as install:
+            with mock.patch.dict(signal.__dict__):
+                signal.__dict__.pop("SIGUSR1", None)
+                self.profiler.install_signal_handler()
+            install.assert_not_called() # SIGINT (Ctrl+C) is left alone
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+test_ringbuffer.py
+
+Unit tests for the shared-memory ring buffer and the compact codecs.
+"""
+
+import datetime
+import multiprocessing
+import unittest
+from ontap_intelligence.core.bus import EventBus
+from ontap_intelligence.core.codec import decode_event, decode_lines, encode_event, encode_lines
+from ontap_intelligence.core.ringbuffer import SharedRing, forward_topic, pump_topic
+from helpers import make_event
+
+def latency_event(**overrides):
+    """Every field set (microseconds, floats, a non-empty dict) for the codec round trips."""
+    fields = dict(
+        timestamp=datetime.datetime(2026, 1, 22, 12, 0, 0, 123456),
+        timestamp_str="Jan 22 12:00:00",
+        node="ontap-cluster-01-01",
+        subsystem='network',
+        severity='WARN',
+        impact_level=5,
+        raw_message="Workload policy_group_1 latency is 45ms (Threshold: 20ms).",
+        parsed_fields={'latency': 45, 'workload': "policy_group_1"},
+        ingest_ts=12.5,
+    )
+    fields.update(overrides)
+    return make_event("qos.latency.high", **fields)
+
+def _consume(name, out):
+    ring = SharedRing.attach(name)
+    consumer = ring.consumer()
+    total = 0
+    while True:
+        record = consumer.read(timeout=5)
+        if record is None:
+            break
+        lines, ts = decode_lines(record[1])
+        total += len(lines)
+        del ts
+    consumer.commit()
+    ring.close()
+    out.put(total)
+
+class TestCodec(unittest.TestCase):
+    def test_event_round_trip(self):
+        event = latency_event(parsed_fields={'latency': 45, 'ratio': 0.5, 'ok': True, 'none': None,
+                                          'name': "vol_ü", 'disks': [1, 2]})
+        data = encode_event(event)
+        decoded, end = decode_event(data)
+        self.assertEqual(decoded, event)
+        self.assertEqual(end, len(data))
+
+    def test_events_back_to_back(self):
+        a, b = latency_event(), latency_event(node="n2", parse_ts=13.0, asset_id="vol1")
+        data = encode_event(a) + encode_event(b)
+        first, pos = decode_event(data)
+        second, _ = decode_event(data, pos)
+        self.assertEqual((first, second), (a, b))
+
+    def test_lines_round_trip(self):
+        lines = [f"<134>Jan 22 12:00:{i:02d} [node1:x:INFO]: line {i}" for i in range(50)]
+        ts = [float(i) for i in range(50)]
+        decoded, decoded_ts = decode_lines(encode_lines(lines, ts))
+        self.assertEqual(decoded, lines)
+        self.assertEqual(list(decoded_ts), ts)
+
+    def test_lines_with_embedded_newlines(self):
+        for lines in (["a\nb", "c"], ["", "x\n", "\n", "é\nü"], ["a\nb"]):
+            ts = [float(i) for i in range(len(lines))]
+            decoded, decoded_ts = decode_lines(encode_lines(lines, ts))
+            self.assertEqual((decoded, list(decoded_ts)), (lines, ts))
+        self.assertEqual(decode_lines(encode_lines([""], [1.0]))[0], [""])
+        with self.assertRaises(ValueError):
+            encode_lines(["a", "b"], [1.0])
+
+class TestSharedRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = SharedRing.create(4096, consumers=2)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_every_consumer_sees_every_record_across_wraps(self):
+        producer = self.ring.producer()
+        consumers = [self.ring.consumer(0), self.ring.consumer(1)]
+        for i in range(500):
+            payload = str(i).encode() * (i % 40 + 1)
+            self.assertTrue(producer.write(payload, tag=i % 3))
+            for c in consumers:
+                tag, view = c.read(timeout=1)
+                self.assertEqual((tag, bytes(view)), (i % 3, payload))
+                del view
+        for c in consumers:
+            c.commit()
+
+    def test_full_ring_applies_backpressure_until_slowest_consumer_reads(self):
+        producer = self.ring.producer()
+        fast, slow = self.ring.consumer(0), self.ring.consumer(1)
+        while producer.write(b"x" * 500, timeout=0.01):
+            fast.read(timeout=0)
+        self.assertGreater(self.ring.stats()['producer_waits'], 0)
+
+        slow.read(timeout=0)
+        slow.read(timeout=0) # Commits the first record, freeing its space
+        fast.read(timeout=0)
+        self.assertTrue(producer.write(b"x" * 500, timeout=0.01))
+        fast.commit()
+        slow.commit()
+
+    def test_close_signals_end_of_stream(self):
+        producer, consumer = self.ring.producer(), self.ring.consumer(0)
+        producer.write(b"last")
+        producer.close()
+        self.assertEqual(bytes(consumer.read(timeout=1)[1]), b"last")
+        self.assertIsNone(consumer.read(timeout=1))
+        self.assertTrue(consumer.eof)
+
+    def test_bus_bridge(self):
+        ring = SharedRing.create(1 << 16, consumers=1)
+        src, dst = EventBus(), EventBus()
+        received = []
+        dst.subscribe("event.unified", lambda t, e: received.append(e))
+        forward_topic(src, "event.unified", ring.producer(), encode_event)
+
+        events = [latency_event(node=f"n{i}") for i in range(10)]
+        for e in events:
+            src.publish("event.unified", e)
+        producer = ring.producer()
+        producer.close()
+        pump_topic(ring.consumer(), dst, "event.unified", lambda view: decode_event(view)[0])
+        self.assertEqual(received, events)
+        ring.close()
+
+    def test_cross_process(self):
+        ring = SharedRing.create(1 << 16, consumers=1)
+        ctx = multiprocessing.get_context("spawn")
+        out = ctx.Queue()
+        proc = ctx.Process(target=_consume, args=(ring.name, out))
+        proc.start()
+        producer = ring.producer()
+        for _ in range(200):
+            producer.write(encode_lines(["a" * 100] * 64, [1.0] * 64))
+        producer.close()
+        self.assertEqual(out.get(timeout=30), 200 * 64)
+        proc.join(timeout=10)
+        ring.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""
+test_sharding.py
+
+Unit tests for node/cluster sharding and mergeable window features.
+"""
+
+import datetime
+import queue
+import threading
+import unittest
+from unittest import mock
+from ontap_intelligence.intelligence.features import ClusterWindows, WindowFeatures
+from ontap_intelligence.sharding import ShardMerger, ShardRouter, ShardWindows, node_of, shard_for, window_key
+from helpers import T0, make_event
+
+class TestRouting(unittest.TestCase):
+    def test_node_of(self):
+        line = "<134>Jan 22 12:10:00 [ontap-cluster-01-02:qos.latency.high:NOTICE]: Workload x latency is 45ms"
+        self.assertEqual(node_of(line), "ontap-cluster-01-02")
+        self.assertEqual(node_of("junk"), "")
+
+    def test_shard_for_is_stable_and_in_range(self):
+        nodes = [f"ontap-cluster-{c:02d}-{n:02d}" for c in range(1, 9) for n in (1, 2)]
+        shards = [shard_for(n, 4) for n in nodes]
+        self.assertEqual(shards, [shard_for(n, 4) for n in nodes])
+        self.assertTrue(all(0 <= s < 4 for s in shards))
+        self.assertEqual(len(set(shards)), 4)
+
+    def test_cluster_key_keeps_a_cluster_in_one_shard(self):
+        class Sender:
+            def __init__(self):
+                self.lines = []
+            def send(self, lines, ingest_ts):
+                self.lines += lines
+
+        senders = [Sender() for _ in range(4)]
+        router = ShardRouter(senders, batch_size=1, key="cluster")
+        nodes = [f"ontap-cluster-{c:02d}-{n:02d}" for c in range(1, 9) for n in (1, 2)]
+        for node in nodes:
+            router._handle_raw_log("log.raw", f"<134>Jan 22 12:10:00 [{node}:x:INFO]: m")
+        shard_of = {node_of(l): i for i, s in enumerate(senders) for l in s.lines}
+        for c in range(1, 9):
+            self.assertEqual(shard_of[f"ontap-cluster-{c:02d}-01"], shard_of[f"ontap-cluster-{c:02d}-02"])
+
+class TestWindowFeatures(unittest.TestCase):
+    def test_merge_equals_single_pass(self):
+        events = [make_event(node=f"node{i % 3}", seconds=i, severity=['INFO', 'WARN', 'ERROR'][i % 3],
+                             parsed_fields={'latency': i})
+                  for i in range(30)]
+        whole = WindowFeatures()
+        parts = [WindowFeatures(), WindowFeatures()]
+        for e in events:
+            whole.update(e)
+            parts[hash(e.node) % 2].update(e)
+        parts[0].merge(parts[1])
+
+        self.assertEqual(parts[0].features(), whole.features())
+        self.assertEqual(whole.features()['unique_nodes'], 3)
+        self.assertEqual(parts[0].first_ts, T0)
+        self.assertEqual(parts[0].last_ts, T0 + datetime.timedelta(seconds=29))
+
+    def test_cluster_partitions_merge_to_the_fleet_window(self):
+        events = [make_event(node=f"ontap-cluster-0{i % 2 + 1}-0{i % 3}", seconds=i, severity=['INFO', 'ERROR'][i % 2])
+                  for i in range(30)]
+        whole = WindowFeatures()
+        shards = [ClusterWindows(), ClusterWindows()] # Split by node, as node-keyed shards do
+        for e in events:
+            whole.update(e)
+            shards[hash(e.node) % 2].update(e)
+        second = shards[1].by_cluster()
+        total = ClusterWindows()
+        total.merge(shards[1])
+        total.merge(shards[0])
+        self.assertEqual(shards[1].by_cluster(), second) # Merged into, not shared
+        shards[0].merge(shards[1])
+        self.assertEqual(total.by_cluster(), shards[0].by_cluster())
+
+        self.assertEqual(sorted(shards[0].clusters), ["ontap-cluster-01", "ontap-cluster-02"])
+        self.assertEqual(shards[0].merged().features(), whole.features())
+        self.assertEqual(len(shards[0]), 30)
+        by_cluster = shards[0].by_cluster()
+        self.assertEqual(by_cluster["ontap-cluster-02"]['error_count'], 15)
+        self.assertEqual(by_cluster["ontap-cluster-01"]['unique_nodes'], 3)
+
+class TestShardWindows(unittest.TestCase):
+    def test_windows_close_when_next_starts(self):
+        windows = ShardWindows(10)
+        for s in (0, 5, 9):
+            windows._handle_event("event.unified", make_event(node="n1", seconds=s))
+        self.assertEqual(windows.take_closed(), [])
+
+        windows._handle_event("event.unified", make_event(node="n1", seconds=12))
+        closed = windows.take_closed()
+        self.assertEqual([k for k, _ in closed], [window_key(T0, 10)])
+        self.assertEqual(closed[0][1].log_count, 3)
+        self.assertEqual(len(windows.take_closed(final=True)), 1)
+
+class FakeML:
+    def __init__(self):
+        self.scored = []
+        self.last_window = {}
+
+    def score_window(self, wf):
+        self.scored.append(wf.log_count)
+
+class TestShardMerger(unittest.TestCase):
+    def test_merges_partials_across_shards(self):
+        out_q = queue.Queue()
+        ml = FakeML()
+        merger = ShardMerger(out_q, shards=2, ml=ml)
+        k0, k1 = window_key(T0, 10), window_key(T0, 10) + 10
+
+        def partial(n):
+            wf = ClusterWindows()
+            for i in range(n):
+                wf.update(make_event(node="n", seconds=i))
+            return wf
+
+        out_q.put(("windows", 0, k1, [(k0, partial(3))]))
+        out_q.put(("windows", 1, k1, [(k0, partial(4))]))
+        out_q.put(("windows", 0, k1, [(k1, partial(1))]))
+        out_q.put(("done", 0, 4))
+        out_q.put(("done", 1, 4))
+        merger.start()
+        self.assertTrue(merger.join(timeout=5))
+
+        self.assertEqual(ml.scored, [7, 1])
+        self.assertEqual(merger.windows_scored, 2)
+
+    def test_incidents_are_forwarded_while_a_window_scores(self):
+        out_q = queue.Queue()
+        scoring, release = threading.Event(), threading.Event()
+        ml = FakeML()
+        def slow_score(wf):
+            scoring.set()
+            release.wait(5)
+            ml.scored.append(wf.log_count)
+        ml.score_window = slow_score
+        merger = ShardMerger(out_q, shards=1, ml=ml)
+        k0 = window_key(T0, 10)
+        wf = ClusterWindows()
+        wf.update(make_event(node="n"))
+        forwarded = threading.Event()
+        with mock.patch("ontap_intelligence.sharding.bus") as fake_bus:
+            fake_bus.publish.side_effect = lambda topic, inc: forwarded.set()
+            merger.start()
+            out_q.put(("windows", 0, k0 + 10, [(k0, wf)]))
+            self.assertTrue(scoring.wait(5))
+            out_q.put(("incident", 0, "inc"))
+            self.assertTrue(forwarded.wait(5)) # Not stuck behind the window being scored
+            release.set()
+            out_q.put(("done", 0, 1))
+            self.assertTrue(merger.join(timeout=5))
+        self.assertEqual(ml.scored, [1])
+        self.assertEqual(merger.windows_scored, 1)
+
+    def test_flush_scores_every_pending_window(self):
+        out_q = queue.Queue()
+        ml = FakeML()
+        merger = ShardMerger(out_q, shards=2, ml=ml)
+        k0 = window_key(T0, 10)
+        wf = ClusterWindows()
+        wf.update(make_event(node="n"))
+        out_q.put(("windows", 0, k0, [(k0, wf)])) # Open until shard 1 moves on
+        out_q.put(("checkpoint", 0, 1))
+        out_q.put(("checkpoint", 1, 1))
+        merger.start()
+        self.assertTrue(merger.wait_checkpoint(1, timeout=5))
+        self.assertEqual(ml.scored, [])
+        self.assertTrue(merger.flush(timeout=5))
+        self.assertEqual(ml.scored, [1])
+        self.assertEqual(merger.pending, {})
+        merger.stop()
+        self.assertTrue(merger.join(timeout=5))
+        self.assertEqual(ml.scored, [1])
+
+    def test_stop_reads_what_is_left_when_shards_never_finish(self):
+        out_q = queue.Queue()
+        ml = FakeML()
+        merger = ShardMerger(out_q, shards=2, ml=ml)
+        k0 = window_key(T0, 10)
+        wf = ClusterWindows()
+        wf.update(make_event(node="n"))
+        out_q.put(("windows", 0, k0 + 10, [(k0, wf)]))
+        out_q.put(("done", 0, 1)) # Shard 1 was terminated before it could report
+        merger.start()
+        self.assertFalse(merger.wait_done(timeout=0.2))
+        merger.stop()
+        self.assertTrue(merger.join(timeout=5))
+        self.assertEqual(ml.scored, [1])
+
+if __name__ == '__main__':
+    unittest.main()
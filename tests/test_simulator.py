@@ -0,0 +1,109 @@
+"""
+test_simulator.py
+
+Unit tests for the high-rate LoadSimulator, its rate profiles and sinks.
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from src.simulator import FileSink, LoadSimulator, RateProfile, UdpSink, fleet_nodes
+
+class TestRateProfile(unittest.TestCase):
+    def test_constant(self):
+        profile = RateProfile("constant", rate=500)
+        self.assertEqual([profile.rate_at(t) for t in (0, 10, 1000)], [500, 500, 500])
+
+    def test_ramp_is_linear_then_flat(self):
+        profile = RateProfile("ramp", rate=1000, start_rate=200, ramp_seconds=40)
+        self.assertEqual(profile.rate_at(0), 200)
+        self.assertEqual(profile.rate_at(10), 400)
+        self.assertEqual(profile.rate_at(30), 800)
+        self.assertEqual(profile.rate_at(40), 1000)
+        self.assertEqual(profile.rate_at(400), 1000)
+
+    def test_burst_repeats_every_period(self):
+        profile = RateProfile("burst", rate=100, burst_factor=10, burst_seconds=5, burst_period=60)
+        self.assertEqual(profile.rate_at(0), 1000)
+        self.assertEqual(profile.rate_at(4.9), 1000)
+        self.assertEqual(profile.rate_at(5), 100)
+        self.assertEqual(profile.rate_at(59), 100)
+        self.assertEqual(profile.rate_at(62), 1000)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            RateProfile("sine")
+
+class TestFileSink(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ems.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_rotates_at_max_bytes(self):
+        sink = FileSink(self.path, max_bytes=1000, rotation_count=3)
+        line = "x" * 99 # 100 bytes with its newline
+        for _ in range(25):
+            sink.write_batch([line])
+        sink.close()
+        self.assertEqual(os.path.getsize(f"{self.path}.1"), 1000)
+        self.assertEqual(os.path.getsize(f"{self.path}.2"), 1000)
+        self.assertEqual(os.path.getsize(self.path), 500)
+        self.assertFalse(os.path.exists(f"{self.path}.3")) # Oldest dropped past rotation_count
+
+    def test_counts_encoded_bytes(self):
+        sink = FileSink(self.path, max_bytes=1000)
+        sink.write_batch(["é" * 400]) # 400 characters, 801 bytes
+        sink.write_batch(["é" * 100])
+        sink.close()
+        self.assertEqual(os.path.getsize(f"{self.path}.1"), 1002)
+
+class TestUdpSink(unittest.TestCase):
+    def test_one_datagram_per_line(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        server.settimeout(2)
+        sink = UdpSink(*server.getsockname())
+        try:
+            lines = ["<134>Jan 22 12:00:00 [node-01:kernel:notice]: a", "<134>Jan 22 12:00:01 [node-01:kernel:notice]: é"]
+            sink.write_batch(lines)
+            got = [server.recvfrom(65535)[0] for _ in lines]
+        finally:
+            sink.close()
+            server.close()
+        self.assertEqual(got, [line.encode("utf-8") for line in lines])
+
+class ListSink:
+    def __init__(self):
+        self.lines = []
+        self.closed = False
+
+    def write_batch(self, lines):
+        self.lines.extend(lines)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+class TestLoadSimulator(unittest.TestCase):
+    def test_emits_the_profile_rate_for_the_fleet(self):
+        sink = ListSink()
+        sim = LoadSimulator(sink, RateProfile("constant", rate=2000), clusters=2, nodes_per_cluster=2,
+                            tick_seconds=0.01, seed=1)
+        emitted = sim.run(duration=0.5, report_every=10)
+        self.assertTrue(sink.closed)
+        self.assertEqual(emitted, len(sink.lines))
+        self.assertGreater(emitted, 500) # ~1000 owed; leave room for a slow machine
+        self.assertLessEqual(emitted, 1000)
+        nodes = set(fleet_nodes(2, 2))
+        self.assertEqual(nodes, {"ontap-cluster-01-01", "ontap-cluster-01-02", "ontap-cluster-02-01", "ontap-cluster-02-02"})
+        self.assertTrue(all(line[line.index('[') + 1:].split(':')[0] in nodes for line in sink.lines))
+
+if __name__ == "__main__":
+    unittest.main()
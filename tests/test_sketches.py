@@ -0,0 +1,80 @@
+"""
+test_sketches.py
+
+Unit tests for the HyperLogLog / Space-Saving window sketches.
+"""
+
+import unittest
+from ontap_intelligence.intelligence.sketches import HyperLogLog, SpaceSaving, WindowSketches
+from helpers import make_event
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_small_counts_are_exact(self):
+        hll = HyperLogLog()
+        for i in range(50):
+            hll.add(f"vol_{i % 10}")
+        self.assertEqual(hll.count(), 10)
+
+    def test_large_count_within_error(self):
+        hll = HyperLogLog(precision=12)
+        n = 50000
+        for i in range(n):
+            hll.add(f"vol_{i}")
+        self.assertLess(abs(hll.count() - n) / n, 0.05)
+
+    def test_merge_is_union(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        for i in range(0, 600):
+            a.add(str(i))
+        for i in range(400, 1000):
+            b.add(str(i))
+        a.merge(b)
+        self.assertLess(abs(a.count() - 1000) / 1000, 0.05)
+
+class TestSpaceSaving(unittest.TestCase):
+    def test_heavy_hitters_survive(self):
+        ss = SpaceSaving(capacity=5)
+        for i in range(1000):
+            ss.add("callhome.snmp.trap.sent")
+            if i % 2 == 0:
+                ss.add("audit.cmd.create")
+            ss.add(f"rare_{i}")
+        top = [item for item, _ in ss.top(2)]
+        self.assertEqual(top, ["callhome.snmp.trap.sent", "audit.cmd.create"])
+
+    def test_merge(self):
+        a, b = SpaceSaving(capacity=4), SpaceSaving(capacity=4)
+        for _ in range(10):
+            a.add("x")
+            b.add("x")
+        b.add("y")
+        a.merge(b)
+        self.assertEqual(a.top(1), [("x", 20)])
+
+class TestWindowSketches(unittest.TestCase):
+    def test_dimensions(self):
+        ws = WindowSketches()
+        ws.update(make_event("monitor.volume.nearlyFull", asset_id="vol_hr_1"))
+        ws.update(make_event("wafl.scan.start", node="node2", asset_id="vol_hr_2"))
+        ws.update(make_event("vifMgr.lif.down", parsed_fields={'lif': 'lif_data_101'}))
+        ws.update(make_event("audit.cmd.create", raw_message="User 'admin' executed command 'vol show'."))
+
+        card = ws.cardinalities()
+        self.assertEqual(card['unique_nodes'], 2)
+        self.assertEqual(card['unique_volumes'], 2)
+        self.assertEqual(card['unique_lifs'], 1)
+        self.assertEqual(card['unique_users'], 1)
+        self.assertEqual(card['unique_workloads'], 0)
+        self.assertEqual(len(ws.top_k()['events']), 4)
+
+    def test_names_are_counted_per_cluster(self):
+        ws = WindowSketches()
+        for node in ("clusterA-01", "clusterA-02", "clusterB-01"):
+            ws.update(make_event("vifMgr.lif.down", node=node, parsed_fields={'lif': 'lif_data_101'}))
+            ws.update(make_event("qos.workload.throttled", node=node, parsed_fields={'workload': 'wl_oltp'}))
+        card = ws.cardinalities()
+        self.assertEqual(card['unique_lifs'], 2) # Same name in two clusters: two LIFs
+        self.assertEqual(card['unique_workloads'], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+test_stages.py
+
+Unit tests for queued EventBus stages.
+"""
+
+import threading
+import unittest
+from unittest import mock
+from ontap_intelligence.core.bus import EventBus
+from ontap_intelligence.supervisor import PipelineSupervisor
+
+class TestStages(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+
+    def tearDown(self):
+        self.bus.shutdown_stages()
+
+    def test_unconfigured_stage_is_synchronous(self):
+        seen = []
+        self.bus.subscribe("t", lambda topic, p: seen.append(p), stage="parse")
+        self.bus.publish("t", 1)
+        self.assertEqual(seen, [1])
+
+    def test_staged_handler_runs_on_worker_in_order(self):
+        seen, threads = [], set()
+        def handler(topic, p):
+            seen.append(p)
+            threads.add(threading.current_thread().name)
+
+        self.bus.subscribe("t", handler, stage="parse")
+        self.bus.configure_stage("parse", workers=1, queue_size=10, batch_size=4)
+        for i in range(100):
+            self.bus.publish("t", i)
+
+        self.assertTrue(self.bus.drain(timeout=5))
+        self.assertEqual(seen, list(range(100)))
+        self.assertEqual(threads, {"stage-parse-0"})
+        stats = self.bus.stats()['stages']['parse']
+        self.assertEqual(stats['processed'], 100)
+        self.assertLessEqual(stats['max_depth'], 10)
+
+    def test_full_queue_blocks_publisher(self):
+        release = threading.Event()
+        self.bus.subscribe("t", lambda topic, p: release.wait(5), stage="slow")
+        self.bus.configure_stage("slow", workers=1, queue_size=2)
+
+        publisher = threading.Thread(target=lambda: [self.bus.publish("t", i) for i in range(5)])
+        publisher.start()
+        publisher.join(timeout=0.3)
+        self.assertTrue(publisher.is_alive()) # Waiting on the full queue
+
+        release.set()
+        publisher.join(timeout=5)
+        self.assertTrue(self.bus.drain(timeout=5))
+        self.assertGreater(self.bus.stats()['stages']['slow']['blocked'], 0)
+
+    def test_drain_covers_downstream_stages(self):
+        seen = []
+        self.bus.subscribe("a", lambda topic, p: self.bus.publish("b", p * 2), stage="first")
+        self.bus.subscribe("b", lambda topic, p: seen.append(p), stage="second")
+        self.bus.configure_stage("first", workers=1, batch_size=8)
+        self.bus.configure_stage("second", workers=1, batch_size=8)
+        for i in range(50):
+            self.bus.publish("a", i)
+
+        self.assertTrue(self.bus.drain(timeout=5))
+        self.assertEqual(seen, [i * 2 for i in range(50)])
+
+    def test_partitioned_stage_keeps_per_key_order(self):
+        seen, threads = {}, {}
+        lock = threading.Lock()
+        def handler(topic, p):
+            key, i = p
+            with lock:
+                seen.setdefault(key, []).append(i)
+                threads.setdefault(key, set()).add(threading.current_thread().name)
+
+        self.bus.subscribe("t", handler, stage="correlate")
+        self.bus.configure_stage("correlate", workers=3, queue_size=30, batch_size=4,
+                                 partition_by=lambda p: p[0])
+        for i in range(300):
+            self.bus.publish("t", (f"c{i % 3}", i))
+
+        self.assertTrue(self.bus.drain(timeout=5))
+        for k in range(3):
+            self.assertEqual(seen[f"c{k}"], list(range(k, 300, 3)))
+            self.assertEqual(len(threads[f"c{k}"]), 1)
+        self.assertEqual(len(set().union(*threads.values())), 3) # Three keys, three workers
+        stats = self.bus.stats()['stages']['correlate']
+        self.assertEqual((stats['partitions'], stats['capacity'], stats['processed']), (3, 30, 300))
+
+    def test_handler_errors_do_not_stop_worker(self):
+        seen = []
+        def handler(topic, p):
+            if p == 0:
+                raise ValueError("bad")
+            seen.append(p)
+
+        self.bus.subscribe("t", handler, stage="parse")
+        self.bus.configure_stage("parse", workers=1)
+        for i in range(3):
+            self.bus.publish("t", i)
+        self.assertTrue(self.bus.drain(timeout=5))
+        self.assertEqual(seen, [1, 2])
+
+    def test_subscribed_stages(self):
+        self.bus.subscribe("t", lambda topic, p: None, stage="parse")
+        self.bus.subscribe("t", lambda topic, p: None)
+        self.assertEqual(self.bus.subscribed_stages(), {"parse"})
+
+    def test_shutdown_reports_dropped_events(self):
+        release = threading.Event()
+        self.bus.subscribe("t", lambda topic, p: release.wait(5), stage="slow")
+        self.bus.configure_stage("slow", workers=1, queue_size=10)
+        for i in range(5):
+            self.bus.publish("t", i)
+        try:
+            final = self.bus.shutdown_stages(timeout=0.2)['slow']
+        finally:
+            release.set()
+        self.assertEqual((final['alive'], final['dropped']), (1, 4)) # One in the handler, four queued
+        self.assertEqual(self.bus.stats()['stages'], {})
+
+class FakeML:
+    def __init__(self, bus):
+        self.bus = bus
+        self.window = [1] # An open window
+        self.closed_with_stages = None
+
+    def _close_window(self):
+        self.closed_with_stages = dict(self.bus.stats()['stages'])
+
+class TestSupervisorShutdown(unittest.TestCase):
+    def shutdown(self, handler):
+        bus = EventBus()
+        bus.subscribe("event.unified", handler, stage="ml")
+        bus.configure_stage("ml", workers=1)
+        sup = PipelineSupervisor({'pipeline': {'drain_timeout_sec': 0.2}})
+        sup.ml = FakeML(bus)
+        sup.checkpoints = mock.Mock()
+        for i in range(3):
+            bus.publish("event.unified", i)
+        with mock.patch("ontap_intelligence.supervisor.bus", bus), \
+                mock.patch.object(sup, "checkpoint") as checkpoint:
+            sup.shutdown()
+        return sup.ml, checkpoint
+
+    def test_last_window_is_closed_after_the_ml_workers_stop(self):
+        seen = []
+        ml, checkpoint = self.shutdown(lambda topic, p: seen.append(p))
+        self.assertEqual(seen, [0, 1, 2])
+        self.assertEqual(ml.closed_with_stages, {}) # No worker left to race on the window
+        checkpoint.assert_called_once()
+
+    def test_stuck_ml_stage_skips_the_window_and_the_checkpoint(self):
+        release = threading.Event()
+        try:
+            ml, checkpoint = self.shutdown(lambda topic, p: release.wait(5))
+        finally:
+            release.set()
+        self.assertIsNone(ml.closed_with_stages)
+        checkpoint.assert_not_called() # A restart re-reads the dropped lines
+
+    def test_sharded_checkpoint_is_taken_before_the_shards_stop(self):
+        sup = PipelineSupervisor({'pipeline': {'drain_timeout_sec': 0.2}})
+        sup.checkpoints = mock.Mock()
+        calls = mock.Mock()
+        sup.sharded = calls.sharded
+        sup.sharded.stats.return_value = {'shards': [], 'windows_scored': 0, 'late_partials': 0}
+        with mock.patch("ontap_intelligence.supervisor.bus", EventBus()), \
+                mock.patch.object(sup, "checkpoint", calls.checkpoint):
+            sup.shutdown()
+        self.assertEqual(calls.mock_calls[:2], [mock.call.checkpoint(0.2, final=True),
+                                                mock.call.sharded.shutdown(0.2)])
+        calls.checkpoint.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+"""
+test_state.py
+
+Unit tests for the topology AssetManager.
+"""
+
+import threading
+import unittest
+from ontap_intelligence.core.state import AssetManager
+
+class TestSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.assets = AssetManager()
+        self.assets.add_or_update_asset("node1", "node")
+        self.assets.add_or_update_asset("aggr1", "aggr", parent_id="node1")
+
+    def test_snapshot_is_immutable_and_versioned(self):
+        snap = self.assets.snapshot()
+        self.assertIs(self.assets.snapshot(), snap) # Unchanged graph: same snapshot
+        held = snap.get_asset("aggr1")
+
+        self.assets.set_asset_health("aggr1", 20.0, "critical")
+        self.assets.add_or_update_asset("vol1", "volume", parent_id="aggr1")
+
+        self.assertEqual(held.status, "ok") # Copy-on-write: held Assets never change
+        self.assertEqual(len(snap), 2)
+        self.assertIsNone(snap.get_asset("vol1"))
+        with self.assertRaises(TypeError):
+            snap.assets["x"] = held
+
+        latest = self.assets.snapshot()
+        self.assertGreater(latest.version, snap.version)
+        self.assertEqual(latest.get_asset("aggr1").status, "critical")
+        self.assertEqual([a.id for a in latest.get_children("aggr1")], ["vol1"])
+
+    def test_change_feed(self):
+        version = self.assets.version
+        self.assets.set_asset_health("aggr1", 50.0, "degraded")
+        self.assets.set_asset_health("aggr1", 50.0, "degraded") # No-op: not a change
+        self.assets.add_or_update_asset("vol1", "volume")
+
+        changes = self.assets.changes_since(version)
+        self.assertEqual([(c.kind, c.asset.id) for c in changes], [('upsert', "aggr1"), ('upsert', "vol1")])
+        self.assertEqual(changes[-1].version, self.assets.version)
+        self.assertEqual(self.assets.changes_since(self.assets.version), [])
+
+    def test_change_feed_overflow_requires_resync(self):
+        assets = AssetManager(change_log_size=10)
+        for i in range(50):
+            assets.add_or_update_asset(f"vol{i}", "volume")
+        self.assertIsNone(assets.changes_since(0))
+        self.assertEqual(len(assets.changes_since(assets.version - 10)), 10)
+
+class TestIndexes(unittest.TestCase):
+    def setUp(self):
+        self.assets = AssetManager()
+        add = self.assets.add_or_update_asset
+        add("aggr1", "aggr", parent_id="node1")
+        add("aggr2", "aggr", parent_id="node2")
+        add("vol1", "volume", parent_id="node1", keep_parent=True) # First seen under its node (wafl.scan.start)...
+        add("vol1", "volume", parent_id="aggr1") # ...then under its aggregate
+        add("qtree1", "qtree", parent_id="vol1")
+
+    @staticmethod
+    def ids(assets):
+        return sorted(a.id for a in assets)
+
+    def test_reparenting_moves_the_child(self):
+        self.assertEqual(self.ids(self.assets.get_children("node1")), ["aggr1"])
+        self.assertEqual(self.ids(self.assets.get_children("aggr1")), ["vol1"])
+
+        self.assets.add_or_update_asset("vol1", "volume", parent_id="aggr2") # Volume move
+        self.assertEqual(self.assets.get_children("aggr1"), [])
+        self.assertEqual(self.assets.node_of("qtree1"), "node2")
+        self.assertEqual(self.ids(self.assets.get_by_node("node1")), ["aggr1"])
+        self.assertEqual(self.ids(self.assets.get_by_node("node2")), ["aggr2", "qtree1", "vol1"])
+
+    def test_queries(self):
+        self.assertEqual([a.id for a in self.assets.get_ancestors("qtree1")], ["vol1", "aggr1"])
+        self.assertEqual(self.ids(self.assets.get_descendants("node1")), ["aggr1", "qtree1", "vol1"])
+        self.assertEqual(self.ids(self.assets.get_by_type("aggr")), ["aggr1", "aggr2"])
+        self.assertEqual(self.assets.node_of("vol1"), "node1")
+
+        snap = self.assets.snapshot()
+        self.assertEqual([a.id for a in snap.get_ancestors("qtree1")], ["vol1", "aggr1"])
+        self.assertEqual(self.ids(snap.get_descendants("node1")), ["aggr1", "qtree1", "vol1"])
+        self.assertEqual(self.ids(snap.get_by_type("aggr")), ["aggr1", "aggr2"])
+
+    def test_node_asset_joins_its_subtree(self):
+        self.assets.add_or_update_asset("node1", "node", parent_id="cluster1")
+        self.assertEqual(self.assets.node_of("qtree1"), "cluster1")
+        self.assertEqual(self.ids(self.assets.get_by_node("cluster1")), ["aggr1", "node1", "qtree1", "vol1"])
+        self.assertNotIn("node1", self.assets.by_node)
+
+    def test_fallback_parent_keeps_the_aggregate(self):
+        self.assets.add_or_update_asset("vol1", "volume", parent_id="node1", keep_parent=True) # wafl.scan.start
+        self.assertEqual(self.assets.get_asset("vol1").parent_id, "aggr1")
+        self.assertEqual(self.ids(self.assets.get_children("aggr1")), ["vol1"])
+        self.assertEqual(self.ids(self.assets.get_children("node1")), ["aggr1"])
+
+        self.assets.add_or_update_asset("vol2", "volume", parent_id="node2", keep_parent=True) # New: linked to its node
+        self.assertEqual(self.assets.get_asset("vol2").parent_id, "node2")
+        self.assets.add_or_update_asset("vol2", "volume", parent_id="aggr2") # Aggregate learned later
+        self.assertEqual(self.assets.get_asset("vol2").parent_id, "aggr2")
+
+    def test_cycles_are_rejected(self):
+        self.assets.add_or_update_asset("aggr1", "aggr", parent_id="qtree1")
+        self.assertEqual(self.assets.get_asset("aggr1").parent_id, "node1")
+        self.assets.add_or_update_asset("node1", "node", parent_id="vol1") # Named as a parent before it existed
+        self.assertIsNone(self.assets.get_asset("node1").parent_id)
+
+    def test_load_assets_rebuilds_indexes(self):
+        restored = AssetManager()
+        restored.load_assets(self.assets.snapshot().assets.values())
+        for query in ("get_children", "get_descendants", "get_by_node"):
+            self.assertEqual(self.ids(getattr(restored, query)("node1")),
+                             self.ids(getattr(self.assets, query)("node1")))
+        self.assertEqual(restored.node_of("qtree1"), "node1")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestEviction(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.assets = AssetManager(clock=self.clock)
+        self.evicted = []
+        self.assets.add_eviction_listener(lambda assets: self.evicted.extend(a.id for a in assets))
+
+    def test_ttl_per_type_by_last_seen(self):
+        self.assets.configure(ttl_by_type={'lif': 100}, sweep_interval=10)
+        self.assets.add_or_update_asset("lif1", "lif", parent_id="node1")
+        self.assets.add_or_update_asset("lif2", "lif", parent_id="node1")
+        self.assets.add_or_update_asset("aggr1", "aggr", parent_id="node1")
+        self.clock.now += 60
+        self.assets.add_or_update_asset("lif2", "lif", parent_id="node1") # Seen again
+        self.clock.now += 60
+
+        version = self.assets.version
+        self.assertEqual([a.id for a in self.assets.evict_expired()], ["lif1"])
+        self.assertEqual(self.evicted, ["lif1"])
+        self.assertIsNone(self.assets.get_asset("lif1"))
+        self.assertEqual(sorted(a.id for a in self.assets.get_children("node1")), ["aggr1", "lif2"])
+        self.assertEqual(sorted(a.id for a in self.assets.get_by_node("node1")), ["aggr1", "lif2"])
+        self.assertEqual([(c.kind, c.asset.id) for c in self.assets.changes_since(version)], [('remove', "lif1")])
+
+        self.clock.now += 1000 # aggr has no TTL
+        self.assets.add_or_update_asset("lif3", "lif") # Write path triggers the sweep
+        self.assertEqual(self.evicted, ["lif1", "lif2"])
+        self.assertIsNotNone(self.assets.get_asset("aggr1"))
+
+    def test_parents_of_live_assets_are_kept(self):
+        self.assets.configure(ttl_by_type={'aggr': 100, 'volume': 500}, sweep_interval=0)
+        self.assets.add_or_update_asset("aggr1", "aggr", parent_id="node1")
+        self.assets.add_or_update_asset("vol1", "volume", parent_id="aggr1")
+        self.clock.now += 200
+        self.assets.evict_expired()
+        self.assertIsNotNone(self.assets.get_asset("aggr1"))
+        self.clock.now += 400
+        self.assets.evict_expired()
+        self.assertEqual(self.evicted, ["vol1"])
+        self.clock.now += 101
+        self.assets.evict_expired()
+        self.assertEqual(self.evicted, ["vol1", "aggr1"])
+
+    def test_lru_cap(self):
+        self.assets.configure(max_assets=3)
+        for i in range(3):
+            self.assets.add_or_update_asset(f"lif{i}", "lif")
+            self.clock.now += 1
+        self.assets.add_or_update_asset("lif0", "lif") # Now the most recent
+        self.assets.add_or_update_asset("vol0", "volume")
+        self.assertEqual(self.evicted, ["lif1"])
+        self.assertEqual(len(self.assets.assets), 3)
+        self.assertEqual(self.assets.stats()['evicted'], 1)
+
+class TestConcurrency(unittest.TestCase):
+    def test_concurrent_writers_and_readers(self):
+        assets = AssetManager()
+        errors = []
+        stop = threading.Event()
+
+        def write(w):
+            for i in range(2000):
+                assets.add_or_update_asset(f"vol{w}-{i}", "volume", parent_id=f"aggr{w}")
+                assets.set_asset_health(f"vol{w}-{i}", 50.0, "degraded")
+
+        def read():
+            seen = 0
+            try:
+                while not stop.is_set():
+                    snap = assets.snapshot()
+                    self.assertGreaterEqual(snap.version, seen)
+                    seen = snap.version
+                    sum(1 for a in snap.assets.values() if a.status == "degraded")
+                    snap.get_children("aggr0")
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        writers = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+        for t in readers + writers:
+            t.start()
+        for t in writers:
+            t.join()
+        stop.set()
+        for t in readers:
+            t.join()
+
+        self.assertEqual(errors, [])
+        snap = assets.snapshot()
+        self.assertEqual(len(snap), 8000)
+        self.assertEqual(len(snap.get_children("aggr3")), 2000)
+        self.assertEqual(snap.version, 4 * 2000 * 2) # create + health per volume
+
+if __name__ == '__main__':
+    unittest.main()
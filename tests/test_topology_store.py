@@ -0,0 +1,98 @@
+"""
+test_topology_store.py
+
+Unit tests for the SQLite topology store.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from ontap_intelligence.core.state import AssetManager
+from ontap_intelligence.core.topology_store import SCHEMA_VERSION, TopologyStore
+
+class TestTopologyStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "topology.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def store(self, assets):
+        store = TopologyStore(self.path, assets=assets, flush_interval=3600)
+        store.load()
+        return store
+
+    def test_warm_start_restores_graph_and_relations(self):
+        assets = AssetManager()
+        store = self.store(assets)
+        assets.add_or_update_asset("aggr1", "aggr", parent_id="node1")
+        assets.add_or_update_asset("vol1", "volume", parent_id="aggr1")
+        assets.set_asset_health("vol1", 40.0, "critical")
+        store.close()
+
+        restored = AssetManager()
+        self.assertEqual(self.store(restored).load(), 2)
+        self.assertEqual(restored.assets, assets.assets)
+        self.assertEqual([a.id for a in restored.get_descendants("node1")], ["aggr1", "vol1"])
+
+    def test_flush_writes_only_changes(self):
+        assets = AssetManager()
+        store = self.store(assets)
+        for i in range(100):
+            assets.add_or_update_asset(f"vol{i}", "volume", parent_id="aggr1")
+        self.assertEqual(store.flush(), 100)
+        self.assertEqual(store.flush(), 0)
+
+        assets.set_asset_health("vol3", 10.0, "critical")
+        assets.set_asset_health("vol3", 20.0, "critical")
+        assets.configure(max_assets=99)
+        assets.add_or_update_asset("vol3", "volume", parent_id="aggr1") # vol0 is now least recently seen
+        self.assertEqual(store.flush(), 2) # vol3 once (latest value), vol0 deleted
+        store.close()
+
+        restored = AssetManager()
+        self.store(restored)
+        self.assertEqual(len(restored.assets), 99)
+        self.assertIsNone(restored.get_asset("vol0"))
+        self.assertEqual(restored.get_asset("vol3").health_score, 20.0)
+
+    def test_bare_ids_from_before_clusters_are_qualified(self):
+        db = sqlite3.connect(self.path) # A version-0 database: ids without their cluster
+        db.execute("CREATE TABLE assets (id TEXT PRIMARY KEY, type TEXT NOT NULL, parent_id TEXT, "
+                   "health_score REAL NOT NULL, status TEXT NOT NULL)")
+        db.executemany("INSERT INTO assets VALUES (?, ?, ?, 100.0, 'ok')", [
+            ("aggr1", "aggr", "ontap-cluster-01-01"),
+            ("vol1", "volume", "aggr1"),
+            ("qtree1", "qtree", "vol1"),
+            ("mc-b:aggr1", "aggr", "mc-b-01"), # Written after qualification, before versioning
+            ("lif9", "lif", None), # No node: no cluster
+        ])
+        db.commit()
+        db.close()
+
+        assets = AssetManager()
+        self.assertEqual(self.store(assets).load(), 4)
+        self.assertEqual(sorted(assets.assets), ["mc-b:aggr1", "ontap-cluster-01:aggr1",
+                                                 "ontap-cluster-01:qtree1", "ontap-cluster-01:vol1"])
+        self.assertEqual(assets.get_asset("ontap-cluster-01:vol1").parent_id, "ontap-cluster-01:aggr1")
+        self.assertEqual(assets.node_of("ontap-cluster-01:qtree1"), "ontap-cluster-01-01")
+
+        reopened = AssetManager() # Upgraded once
+        store = self.store(reopened)
+        self.assertEqual(reopened.assets, assets.assets)
+        self.assertEqual(store._db.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+
+    def test_falling_behind_change_log_resyncs(self):
+        assets = AssetManager(change_log_size=10)
+        store = self.store(assets)
+        for i in range(50):
+            assets.add_or_update_asset(f"lif{i}", "lif")
+        self.assertEqual(store.flush(), 50)
+        self.assertEqual(store.resyncs, 1)
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()